@@ -6,7 +6,7 @@ from dotenv import load_dotenv
 # Загружаем переменные окружения до импорта других модулей
 load_dotenv()
 
-from extensions import db, socketio
+from extensions import db, socketio, wire, encryption
 from config import ProductionConfig, DevelopmentConfig
 
 
@@ -71,6 +71,56 @@ def create_app() -> Flask:
 
     socketio.init_app(app, **socketio_kwargs)
 
+    # Формат кадров: MessagePack для клиентов, которые его запросили, иначе JSON
+    wire.init_app(app)
+
+    # Водяные знаки исходящих очередей: сброс кадров и отключение медленных клиентов
+    from services.backpressure import outbound_guard
+    outbound_guard.init_app(app)
+
+    # Бюджет SQL-запросов на запрос/событие и лог медленных запросов (считает metrics)
+    from services.query_budget import query_budget
+    query_budget.init_app(app)
+
+    # Гистограммы событий, маршрутов и SQL; экспорт на /metrics
+    from services.metrics import metrics
+    metrics.init_app(app, socketio)
+
+    # Версионированные ключи шифрования сообщений в БД (включается MESSAGE_ENCRYPTION_AT_REST)
+    encryption.init_app(app)
+
+    # Ограничение частоты событий Socket.IO (в памяти процесса или в Redis)
+    from services.rate_limit import rate_limiter
+    rate_limiter.init_app(app)
+
+    # Хеширование кодовых слов в пуле потоков с ограничением параллельности
+    from services.codeword_hasher import codeword_hasher
+    codeword_hasher.init_app(app)
+
+    # Хранилище файлов по SHA-256, загрузка по частям с докачкой и превью изображений
+    from services.file_store import file_store
+    from services.chunked_upload import chunked_uploads
+    from services.thumbnails import thumbnails
+    file_store.init_app(app)
+    chunked_uploads.init_app(app)
+    thumbnails.init_app(app)
+
+    # Пакетная запись сообщений (включается MESSAGE_WRITE_BEHIND)
+    from services.message_writer import message_writer
+    message_writer.init_app(app)
+
+    # Кэш последних сообщений групп (включается MESSAGE_CACHE_ENABLED)
+    from services.message_cache import message_cache
+    message_cache.init_app(app)
+
+    # Онлайн-статус пользователей с пакетной записью last_seen/is_online
+    from services.presence import presence
+    presence.init_app(app)
+
+    # Рассылка новых сообщений (микро-пакеты при SOCKETIO_BATCH_FANOUT)
+    from services.fanout import fanout
+    fanout.init_app(app)
+
     # --- ProxyFix для работы за обратным прокси (Render/Nginx/Cloudflare) ---
     app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_port=1)
 
@@ -78,6 +128,7 @@ def create_app() -> Flask:
     with app.app_context():
         # Модели
         from models.message import Message
+        from models.upload import UploadSession, StoredFile
         try:
             from models.user import User, Group, user_groups
         except ImportError as e:
@@ -92,6 +143,8 @@ def create_app() -> Flask:
             ("routes.upload", "bp_upload"),
             ("routes.auth", "bp_auth"),
             ("routes.groups", "bp_groups"),
+            ("routes.search", "bp_search"),
+            ("routes.files", "bp_files"),
         ]:
             try:
                 module = __import__(route_path, fromlist=[bp_name])
@@ -112,6 +165,19 @@ def create_app() -> Flask:
         except Exception as e:
             print(f"⚠️ Database creation warning: {e}")
 
+        # --- Полнотекстовый индекс сообщений ---
+        from services.search_index import search_index
+        search_index.init_app(app)
+        if search_index.auto_install:
+            try:
+                search_index.install()
+            except Exception as e:
+                print(f"⚠️ Search index warning: {e}")
+
+        # Незавершённая ротация ключей продолжается в фоне
+        from services.key_rotation import key_rotation
+        key_rotation.init_app(app)
+
     return app
 
 
@@ -125,6 +191,7 @@ def check_authentication():
     
     # Всегда разрешаем доступ к этим маршрутам
     if (current_path.startswith('/static/') or
+        current_path.startswith('/files/') or
         current_path in ['/', '/health', '/api/user/check'] or
         current_path.startswith('/auth/')):
         return
@@ -148,10 +215,27 @@ def index():
 @app.route("/health")
 def health():
     """Health check для мониторинга"""
+    from services.message_cache import message_cache
+    from services.codeword_hasher import codeword_hasher
+    from services.thumbnails import thumbnails
+    from services.rate_limit import rate_limiter
+    from services.backpressure import outbound_guard
+    from services.query_budget import query_budget
+    from services.message_writer import message_writer
+    from services.group_directory import group_directory
+
     return jsonify({
         "status": "ok", 
         "environment": os.getenv("FLASK_ENV", "development"),
-        "database": "connected" if db.engine else "disconnected"
+        "database": "connected" if db.engine else "disconnected",
+        "message_writer": message_writer.stats(),
+        "group_directory": group_directory.stats(),
+        "message_cache": message_cache.stats(),
+        "codeword_hasher": codeword_hasher.stats(),
+        "thumbnails": thumbnails.stats(),
+        "rate_limit": rate_limiter.stats(),
+        "backpressure": outbound_guard.stats(),
+        "query_budget": query_budget.stats()
     })
 
 
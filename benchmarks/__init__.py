@@ -0,0 +1 @@
+# Бенчмарки (запуск из корня репозитория: python -m benchmarks.<имя>)
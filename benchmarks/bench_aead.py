@@ -0,0 +1,60 @@
+"""
+bench_aead.py — шифрование сообщений в БД: Fernet против версионированного AEAD
+(AES-GCM, ChaCha20-Poly1305). Размер хранимого текста и скорость на сообщениях разной длины.
+Запуск:
+    python -m benchmarks.bench_aead [--count 20000]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+
+from cryptography.fernet import Fernet
+
+from benchmarks.common import timed, print_rows
+from utils.aead import AeadEngine, Keyring
+
+
+def make_engine(algorithm):
+    engine = AeadEngine(Keyring(os.path.join(tempfile.mkdtemp(prefix="chat-bench-"), "keyring.json")))
+    engine.keyring.add_key(algorithm)
+    return engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=20_000)
+    args = parser.parse_args()
+
+    rnd = random.Random(42)
+    alphabet = "абвгдеёжзийклмнопрстуфхцчшщыьэюя abcdefghijklmnopqrstuvwxyz 0123456789"
+    fernet = Fernet(Fernet.generate_key())
+    engines = {name: make_engine(name) for name in ("aes-gcm", "chacha20-poly1305")}
+
+    for length in (32, 256, 2000):
+        texts = ["".join(rnd.choice(alphabet) for _ in range(length)) for _ in range(args.count)]
+        plain_bytes = sum(len(t.encode()) for t in texts) / args.count
+        rows = []
+
+        tokens, seconds = timed(lambda: [fernet.encrypt(t.encode()).decode() for t in texts])
+        _, dec_seconds = timed(lambda: [fernet.decrypt(t.encode()) for t in tokens])
+        stored = sum(len(t) for t in tokens) / args.count
+        rows.append(("fernet: stored bytes / overhead", f"{stored:,.0f} / +{stored - plain_bytes:,.0f}"))
+        rows.append(("fernet: encrypt / decrypt msg/s",
+                     f"{args.count / seconds:,.0f} / {args.count / dec_seconds:,.0f}"))
+
+        for name, engine in engines.items():
+            tokens, seconds = timed(lambda: [engine.encrypt(t) for t in texts])
+            _, dec_seconds = timed(lambda: [engine.decrypt(t) for t in tokens])
+            assert engine.decrypt(tokens[0]) == texts[0]
+            stored = sum(len(t) for t in tokens) / args.count
+            rows.append((f"{name}: stored bytes / overhead", f"{stored:,.0f} / +{stored - plain_bytes:,.0f}"))
+            rows.append((f"{name}: encrypt / decrypt msg/s",
+                         f"{args.count / seconds:,.0f} / {args.count / dec_seconds:,.0f}"))
+
+        print_rows(f"{args.count:,} messages of {length} chars ({plain_bytes:,.0f} UTF-8 bytes)", rows)
+
+
+if __name__ == "__main__":
+    main()
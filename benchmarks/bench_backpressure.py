@@ -0,0 +1,78 @@
+"""
+bench_backpressure.py — память воркера при смешанном качестве сетей клиентов.
+Рассылка в комнату из --clients соединений, часть которых (--slow) вычитывает
+очередь в --slow-rate раз медленнее, чем идут кадры. Сравниваем суммарный объём
+исходящих очередей без ограничения и с outbound_guard, а также цену проверки на пакет.
+Запуск:
+    python -m benchmarks.bench_backpressure [--clients 200] [--slow 0.2] [--messages 5000]
+"""
+
+import argparse
+import time
+
+import socketio
+from engineio.socket import Socket
+
+from benchmarks.common import print_rows
+from services.backpressure import OutboundGuard
+
+
+def run(guard, clients, slow_share, messages, slow_rate, size):
+    """Возвращает (пиковый объём очередей в байтах, секунды на рассылку)"""
+    server = socketio.Server(async_mode="threading")
+    eio = server.eio
+    if guard is not None:
+        guard.attach(eio)
+    sockets = []
+    for n in range(clients):
+        sid = f"c{n}"
+        eio.sockets[sid] = sock = Socket(eio, sid)
+        server.manager.connect(sid, "/")
+        server.enter_room(server.manager.sid_from_eio_sid(sid, "/"), "room")
+        sockets.append((sock, n < clients * slow_share))
+
+    body = {"group_id": 1, "messages": [{"content": "x" * size}]}
+    peak, started = 0, time.perf_counter()
+    for i in range(messages):
+        server.emit("new_messages", body, to="room")
+        if i % 5 == 0:
+            server.emit("presence", {"online": ["user"] * 10, "offline": []}, to="room")
+        for sock, slow in sockets:
+            # Быстрый клиент вычитывает всё, медленный — раз в slow_rate кадров
+            reads = 1 if slow and i % slow_rate == 0 else (0 if slow else sock.queue.qsize())
+            for _ in range(min(reads, sock.queue.qsize())):
+                sock.queue.get()
+                sock.queue.task_done()
+        if i % 100 == 0:
+            if guard is not None:
+                guard.check()
+            peak = max(peak, sum(OutboundGuard._queued_bytes(sock.queue) for sock, _ in sockets))
+    return peak, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--slow", type=float, default=0.2)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--slow-rate", type=int, default=4)
+    parser.add_argument("--size", type=int, default=300)
+    args = parser.parse_args()
+
+    guard = OutboundGuard()
+    guard.high_watermark, guard.low_watermark, guard.max_bytes = 256 * 1024, 64 * 1024, 1024 * 1024
+    guard.evict_after = 3600.0  # отключения считаем отдельно: здесь важна граница памяти
+
+    rows = []
+    for name, current in (("unbounded", None), ("outbound_guard", guard)):
+        peak, seconds = run(current, args.clients, args.slow, args.messages, args.slow_rate, args.size)
+        rows.append((f"{name}: peak queued, MB", f"{peak / 1024 / 1024:,.1f}"))
+        rows.append((f"{name}: µs per recipient packet", f"{seconds / (args.messages * 1.2 * args.clients) * 1e6:.2f}"))
+    stats = guard.stats()
+    rows.append(("dropped / collapsed / resyncs", f"{stats['dropped']:,} / {stats['collapsed']:,} / {stats['resyncs']}"))
+
+    print_rows(f"{args.clients} clients ({args.slow:.0%} slow), {args.messages} messages", rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+bench_crypto.py — расшифровка страниц истории по 1000 сообщений.
+Сравнивает прежний путь (новый Fernet и лишний base64 на каждое сообщение),
+кэшированный шифр и пакетный decrypt_many. Под eventlet дополнительно меряет,
+насколько пакет блокирует хаб: соседний greenlet тикает каждую миллисекунду.
+Запуск:
+    python -m benchmarks.bench_crypto [--page 1000] [--pages 20]
+"""
+
+import eventlet
+eventlet.monkey_patch()
+
+import argparse
+import base64
+import random
+import time
+
+from cryptography.fernet import Fernet
+
+from benchmarks.common import timed, print_rows
+from utils import crypto
+
+
+def legacy_decrypt(token, key):
+    """Поведение до кэширования: Fernet на каждый вызов и двойной base64"""
+    return Fernet(key.encode()).decrypt(base64.urlsafe_b64decode(token.encode())).decode()
+
+
+def build_page(size, key):
+    rnd = random.Random(42)
+    words = ["привет", "ok", "сегодня", "deploy", "🔥", "через час", "lol"]
+    texts = [" ".join(rnd.choice(words) for _ in range(rnd.randint(2, 40))) for _ in range(size)]
+    tokens = crypto.encrypt_many(texts, key)
+    legacy = [base64.urlsafe_b64encode(token.encode()).decode() for token in tokens]
+    return texts, tokens, legacy
+
+
+def max_hub_stall(fn, pages):
+    """Выполняет fn pages раз в greenlet'е, возвращает (секунды, наибольшую паузу тикера в мс)"""
+    gaps = []
+    running = True
+
+    def ticker():
+        last = time.perf_counter()
+        while running:
+            eventlet.sleep(0.001)
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+
+    tick = eventlet.spawn(ticker)
+    eventlet.sleep(0)
+    started = time.perf_counter()
+    for _ in range(pages):
+        fn()
+        eventlet.sleep(0)
+    elapsed = time.perf_counter() - started
+    running = False
+    tick.wait()
+    return elapsed, max(gaps) * 1000 if gaps else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--page", type=int, default=1000)
+    parser.add_argument("--pages", type=int, default=20)
+    args = parser.parse_args()
+
+    key = crypto.generate_key()
+    texts, tokens, legacy = build_page(args.page, key)
+    total = args.page * args.pages
+    rows = []
+
+    def rate(seconds):
+        return f"{total / seconds:,.0f} msg/s"
+
+    _, seconds = timed(lambda: [[legacy_decrypt(t, key) for t in legacy] for _ in range(args.pages)])
+    rows.append(("legacy: Fernet per call + double base64", rate(seconds)))
+
+    _, seconds = timed(lambda: [[crypto.decrypt_message(t, key) for t in tokens] for _ in range(args.pages)])
+    rows.append(("decrypt_message (cached cipher)", rate(seconds)))
+
+    _, seconds = timed(lambda: [crypto.decrypt_many(legacy, key) for _ in range(args.pages)])
+    rows.append(("decrypt_many, legacy tokens", rate(seconds)))
+
+    assert crypto.decrypt_many(tokens, key) == texts
+
+    threshold = crypto.TPOOL_BATCH_THRESHOLD
+    crypto.TPOOL_BATCH_THRESHOLD = args.page + 1
+    seconds, stall = max_hub_stall(lambda: crypto.decrypt_many(tokens, key), args.pages)
+    rows.append(("decrypt_many in hub", rate(seconds)))
+    rows.append(("  max hub stall, ms", f"{stall:.1f}"))
+
+    crypto.TPOOL_BATCH_THRESHOLD = threshold
+    seconds, stall = max_hub_stall(lambda: crypto.decrypt_many(tokens, key), args.pages)
+    rows.append(("decrypt_many via tpool", rate(seconds)))
+    rows.append(("  max hub stall, ms", f"{stall:.1f}"))
+
+    _, seconds = timed(lambda: [crypto.encrypt_many(texts, key) for _ in range(args.pages)])
+    rows.append(("encrypt_many via tpool", rate(seconds)))
+
+    print_rows(f"Fernet, {args.pages} pages x {args.page} messages", rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+bench_fanout.py — стоимость рассылки сообщений в «горячую» комнату:
+по кадру new_message на сообщение против микро-пакетов new_messages.
+Запуск:
+    python -m benchmarks.bench_fanout [--clients 50] [--messages 2000] [--window-ms 15]
+"""
+
+import argparse
+import time
+
+from benchmarks.common import make_app, print_rows
+
+
+def _run(fanout, socketio, clients, room, count, rate):
+    """Публикует count сообщений с заданной частотой и ждёт доставки"""
+    for client in clients:
+        client.get_received()
+
+    interval = 1.0 / rate
+    started = time.perf_counter()
+    for i in range(count):
+        fanout.publish(room, {"text": f"message {i}", "group_id": room})
+        # Отдаём управление хабу, как между событиями реальных клиентов
+        socketio.sleep(interval)
+    fanout.flush_all()
+    socketio.sleep(fanout.window * 2)
+    elapsed = time.perf_counter() - started - count * interval
+
+    frames = delivered = 0
+    for client in clients:
+        for packet in client.get_received():
+            frames += 1
+            if packet["name"] == "new_messages":
+                delivered += len(packet["args"][0]["messages"])
+            else:
+                delivered += 1
+    return elapsed, frames, delivered
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--rate", type=int, default=1000, help="сообщений в секунду в комнату")
+    parser.add_argument("--window-ms", type=int, default=15)
+    args = parser.parse_args()
+
+    app = make_app()
+    from extensions import socketio
+    from services.fanout import RoomFanout
+
+    room = "bench-room"
+    clients = [socketio.test_client(app) for _ in range(args.clients)]
+    for client in clients:
+        client.emit("join_group", {"group_id": room})
+
+    fanout = RoomFanout()
+    fanout.init_app(app)
+    fanout.window = args.window_ms / 1000
+
+    rows = []
+    for batching in (False, True):
+        fanout.batching = batching
+        fanout.frames_sent = 0
+        elapsed, frames, delivered = _run(fanout, socketio, clients, room, args.messages, args.rate)
+        label = f"batched ({args.window_ms} ms)" if batching else "per message"
+        rows += [
+            (f"{label}: server frames", f"{fanout.frames_sent:,}"),
+            (f"{label}: packets delivered", f"{frames:,}"),
+            (f"{label}: messages delivered", f"{delivered:,}"),
+            (f"{label}: fan-out cost, µs/message", f"{elapsed / args.messages * 1e6:,.1f}"),
+        ]
+
+    print_rows(f"fan-out to {args.clients} clients, {args.messages} messages at {args.rate}/s", rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""
+bench_load.py — нагрузочный тест Socket.IO: сколько выдерживает воркер.
+Поднимает --workers процессов сервера (приложение app.create_app() на локальной БД,
+по умолчанию временный SQLite) и --client-procs процессов с клиентами python-socketio.
+Клиенты (их пользователи создаются заранее) расходятся по --groups группам и делают
+user_connected → join_group → send_message с частотой --rate в секунду. Группа g
+обслуживается воркером g % workers, поэтому комнаты не пересекают процессы и Redis
+не нужен — всё работает офлайн на одной машине.
+
+Задержка «отправка → получение» считается у каждого получателя: отправитель кладёт
+в текст time.monotonic(), а эти часы в Linux общие для всех процессов. В отчёте —
+p50/p95/p99, отправленные и доставленные сообщения в секунду, потери и RSS каждого
+воркера (из /proc). Результат сохраняется в JSON; с --baseline печатается сравнение.
+Нужен клиент: pip install "python-socketio[client]".
+Запуск:
+    python -m benchmarks.bench_load [--clients 50] [--groups 5] [--workers 1] [--seconds 10]
+        [--rate 1] [--output load.json] [--baseline baseline.json] [--env MESSAGE_WRITE_BEHIND=true]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from benchmarks.common import percentile, print_rows, serve, servers
+
+_TEXT_PREFIX = "bench"
+
+
+# --- Воркеры ---
+class RssSampler(threading.Thread):
+    """Пиковый и последний RSS процессов воркеров (VmRSS из /proc/<pid>/status)"""
+
+    def __init__(self, pids, interval=0.5):
+        super().__init__(daemon=True)
+        self.pids = pids
+        self.interval = interval
+        self.peak = {pid: 0 for pid in pids}
+        self.last = {pid: 0 for pid in pids}
+        self.running = True
+
+    @staticmethod
+    def rss_kb(pid):
+        try:
+            with open(f"/proc/{pid}/status") as status:
+                for line in status:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1])
+        except OSError:
+            pass
+        return 0
+
+    def run(self):
+        while self.running:
+            for pid in self.pids:
+                rss = self.rss_kb(pid)
+                self.last[pid] = rss or self.last[pid]
+                self.peak[pid] = max(self.peak[pid], rss)
+            time.sleep(self.interval)
+
+
+def seed(clients, groups):
+    """Создаёт пользователей клиентов и группы; печатает id групп"""
+    from app import app
+    from extensions import db
+    from models.message import Group
+    from models.user import User
+
+    with app.app_context():
+        db.session.add_all(
+            User(uuid=user_uuid(number), username=f"load{number}", codeword_hash="")
+            for number in range(clients)
+        )
+        created = [Group(name=f"load-{n}") for n in range(groups)]
+        db.session.add_all(created)
+        db.session.commit()
+        print(json.dumps([group.id for group in created]))
+
+
+def user_uuid(number):
+    return f"00000000-0000-4000-8000-{number:012d}"
+
+
+# --- Клиенты ---
+def drive(spec):
+    """
+    Процесс клиентов: spec — JSON с портами, клиентами [(номер, группа)], start_at/stop_at.
+    Печатает в stdout одну JSON-строку с задержками и счётчиками.
+    """
+    import eventlet
+    eventlet.monkey_patch()
+    import socketio
+
+    spec = json.loads(spec)
+    ports, start_at, stop_at = spec["ports"], spec["start_at"], spec["stop_at"]
+    latencies, sent_by_group = [], {}
+    counters = {"received": 0, "rate_limited": 0, "errors": 0, "connect_failures": 0}
+
+    def on_message(payload):
+        text = payload.get("text") or ""
+        if text.startswith(_TEXT_PREFIX):
+            latencies.append((time.monotonic() - float(text.rsplit("|", 1)[1])) * 1000)
+            counters["received"] += 1
+
+    def run_client(number, group_id):
+        client = socketio.Client(reconnection=False)
+        client.on("new_message", on_message)
+        client.on("new_messages", lambda frame: [on_message(m) for m in frame.get("messages", [])])
+        client.on("rate_limited", lambda _: counters.__setitem__("rate_limited", counters["rate_limited"] + 1))
+        client.on("error", lambda _: counters.__setitem__("errors", counters["errors"] + 1))
+        uuid = user_uuid(number)
+        try:
+            client.connect(
+                f"http://127.0.0.1:{ports[group_id % len(ports)]}", auth={"uuid": uuid}, transports=["websocket"]
+            )
+        except Exception:
+            counters["connect_failures"] += 1
+            return
+        client.emit("user_connected", {"username": f"load{number}", "uuid": uuid})
+        client.emit("join_group", {"group_id": group_id})
+
+        interval = 1.0 / spec["rate"]
+        # Клиенты начинают вразнобой, чтобы не слать сообщения одной волной
+        eventlet.sleep(max(0.0, start_at - time.monotonic()) + interval * (number % 97) / 97)
+        seq = 0
+        while time.monotonic() < stop_at:
+            client.emit("send_message", {
+                "text": f"{_TEXT_PREFIX}|{number}|{seq}|{time.monotonic():.6f}",
+                "group_id": group_id,
+                "uuid": uuid,
+                "sender": f"load{number}",
+            })
+            sent_by_group[group_id] = sent_by_group.get(group_id, 0) + 1
+            seq += 1
+            eventlet.sleep(interval)
+        eventlet.sleep(max(0.0, stop_at + spec["drain"] - time.monotonic()))
+        client.disconnect()
+
+    pool = eventlet.GreenPool(len(spec["clients"]) + 1)
+    for number, group_id in spec["clients"]:
+        pool.spawn(run_client, number, group_id)
+    pool.waitall()
+    print(json.dumps({
+        "latencies": [round(value, 3) for value in latencies],
+        "sent_by_group": sent_by_group,
+        **counters,
+    }))
+
+
+# --- Отчёт ---
+def compare(result, baseline):
+    """Строки сравнения с прошлым прогоном: метрика, было → стало (изменение)"""
+    rows = []
+    differs = sorted(
+        key for key in set(result["config"]) | set(baseline.get("config", {}))
+        if result["config"].get(key) != baseline.get("config", {}).get(key)
+    )
+    if differs:
+        rows.append(("baseline config differs in", ", ".join(differs)))
+    metrics = [("latency p50, ms", ("latency_ms", "p50")), ("latency p95, ms", ("latency_ms", "p95")),
+               ("latency p99, ms", ("latency_ms", "p99")), ("delivered/s", ("delivered_per_sec",)),
+               ("sent/s", ("sent_per_sec",)), ("peak RSS total, MB", ("rss_mb_peak_total",))]
+    for name, path in metrics:
+        old, new = baseline, result
+        for key in path:
+            old, new = (old or {}).get(key), (new or {}).get(key)
+        if old is None or new is None:
+            continue
+        change = f" ({(new - old) / old * 100:+.1f}%)" if old else ""
+        rows.append((f"vs baseline: {name}", f"{old} → {new}{change}"))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--groups", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--client-procs", type=int, default=1)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--rate", type=float, default=1.0, help="сообщений в секунду от клиента")
+    parser.add_argument("--warmup", type=float, default=None, help="секунд на подключение клиентов")
+    parser.add_argument("--drain", type=float, default=2.0, help="секунд ожидания доставки после отправки")
+    parser.add_argument("--port", type=int, default=5600, help="порт первого воркера")
+    parser.add_argument("--database-url", default=None, help="по умолчанию временный SQLite")
+    parser.add_argument("--env", action="append", default=[], help="KEY=VALUE для воркеров")
+    parser.add_argument("--output", default=None, help="куда сохранить JSON")
+    parser.add_argument("--baseline", default=None, help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--serve", type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--drive", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--seed", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve is not None:
+        return serve(args.serve)
+    if args.seed is not None:
+        return seed(*(int(value) for value in args.seed.split(":")))
+    if args.drive is not None:
+        return drive(args.drive)
+
+    database_url = args.database_url or "sqlite:///{}".format(
+        os.path.join(tempfile.mkdtemp(prefix="chat-load-"), "load.db")
+    )
+    env = dict(os.environ, DATABASE_URL=database_url, SECRET_KEY="bench-load")
+    env.update(item.split("=", 1) for item in args.env)
+
+    # Пользователи и группы создаются до старта воркеров (схему создаёт create_app при импорте app)
+    seeded = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_load", "--seed", f"{args.clients}:{args.groups}"],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    group_ids = json.loads(seeded.stdout.strip().splitlines()[-1])
+
+    ports = [args.port + n for n in range(args.workers)]
+    assignments = [(number, group_ids[number % len(group_ids)]) for number in range(args.clients)]
+    with servers("benchmarks.bench_load", ports, env) as workers:
+        sampler = RssSampler([worker.pid for worker in workers])
+        sampler.start()
+        try:
+            warmup = args.warmup if args.warmup is not None else 2.0 + args.clients * 0.02
+            start_at = time.monotonic() + warmup
+            stop_at = start_at + args.seconds
+            drivers = []
+            for proc in range(args.client_procs):
+                spec = json.dumps({
+                    "ports": ports, "clients": assignments[proc::args.client_procs], "rate": args.rate,
+                    "start_at": start_at, "stop_at": stop_at, "drain": args.drain,
+                })
+                drivers.append(subprocess.Popen(
+                    [sys.executable, "-m", "benchmarks.bench_load", "--drive", spec],
+                    env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+                ))
+            reports = [json.loads(driver.communicate()[0].strip().splitlines()[-1]) for driver in drivers]
+        finally:
+            sampler.running = False
+
+    latencies = sorted(value for report in reports for value in report["latencies"])
+    sent_by_group = {}
+    for report in reports:
+        for group_id, count in report["sent_by_group"].items():
+            sent_by_group[int(group_id)] = sent_by_group.get(int(group_id), 0) + count
+    members = {group_id: sum(1 for _, g in assignments if g == group_id) for group_id in group_ids}
+    expected = sum(count * members[group_id] for group_id, count in sent_by_group.items())
+    sent = sum(sent_by_group.values())
+    delivered = sum(report["received"] for report in reports)
+
+    result = {
+        "benchmark": "bench_load",
+        "timestamp": datetime.utcnow().isoformat(),
+        "config": {
+            "clients": args.clients, "groups": args.groups, "workers": args.workers,
+            "client_procs": args.client_procs, "seconds": args.seconds, "rate": args.rate,
+            "database": database_url.split(":", 1)[0], "env": args.env,
+        },
+        "latency_ms": {
+            "p50": percentile(latencies, 0.50), "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99), "max": round(latencies[-1], 2) if latencies else None,
+            "mean": round(sum(latencies) / len(latencies), 2) if latencies else None,
+        },
+        "sent": sent,
+        "delivered": delivered,
+        "expected_deliveries": expected,
+        "lost": max(0, expected - delivered),
+        "sent_per_sec": round(sent / args.seconds, 1),
+        "delivered_per_sec": round(delivered / args.seconds, 1),
+        "rate_limited": sum(report["rate_limited"] for report in reports),
+        "errors": sum(report["errors"] for report in reports),
+        "connect_failures": sum(report["connect_failures"] for report in reports),
+        "workers": [
+            {"port": port, "rss_mb_peak": round(sampler.peak[worker.pid] / 1024, 1),
+             "rss_mb_end": round(sampler.last[worker.pid] / 1024, 1)}
+            for port, worker in zip(ports, workers)
+        ],
+    }
+    result["rss_mb_peak_total"] = round(sum(w["rss_mb_peak"] for w in result["workers"]), 1)
+
+    latency = result["latency_ms"]
+    rows = [
+        ("latency p50 / p95 / p99, ms", f"{latency['p50']} / {latency['p95']} / {latency['p99']}"),
+        ("sent / delivered per second", f"{result['sent_per_sec']:,} / {result['delivered_per_sec']:,}"),
+        ("delivered / expected (lost)", f"{delivered:,} / {expected:,} ({result['lost']:,})"),
+        ("rate_limited / errors / connect failures",
+         f"{result['rate_limited']} / {result['errors']} / {result['connect_failures']}"),
+    ]
+    rows += [(f"worker :{w['port']} RSS peak / end, MB", f"{w['rss_mb_peak']} / {w['rss_mb_end']}")
+             for w in result["workers"]]
+    if args.baseline:
+        with open(args.baseline) as f:
+            rows += compare(result, json.load(f))
+    print_rows(f"{args.clients} clients in {args.groups} groups, {args.workers} worker(s), "
+               f"{args.rate} msg/s each for {args.seconds:g} s", rows)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
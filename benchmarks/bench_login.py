@@ -0,0 +1,69 @@
+"""
+bench_login.py — «шторм» входов: влияние проверки кодовых слов на остальной трафик.
+Соседний greenlet тикает каждую миллисекунду (как обработчик чата); считаем, насколько
+он опаздывает, когда PBKDF2 выполняется прямо в хабе и когда — через codeword_hasher.
+Запуск:
+    python -m benchmarks.bench_login [--logins 200] [--concurrency 4]
+"""
+
+import eventlet
+eventlet.monkey_patch()
+
+import argparse
+import time
+
+from benchmarks.common import print_rows
+from services.codeword_hasher import CodewordHasher
+from utils.crypto import hash_codeword, verify_codeword
+
+
+def storm(verify, hashed, logins):
+    """Запускает logins проверок параллельно; возвращает (секунды, p99 и max опоздания тика в мс)"""
+    lags = []
+    running = True
+
+    def ticker():
+        while running:
+            started = time.perf_counter()
+            eventlet.sleep(0.001)
+            lags.append((time.perf_counter() - started - 0.001) * 1000)
+
+    tick = eventlet.spawn(ticker)
+    eventlet.sleep(0.01)
+    started = time.perf_counter()
+    pool = eventlet.GreenPool(logins)
+    for _ in range(logins):
+        pool.spawn(verify, "codeword", hashed)
+    pool.waitall()
+    elapsed = time.perf_counter() - started
+    running = False
+    tick.wait()
+    lags.sort()
+    return elapsed, lags[int(len(lags) * 0.99) - 1], lags[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    hashed = hash_codeword("codeword")
+    hasher = CodewordHasher()
+    hasher.concurrency = args.concurrency
+    hasher.max_pending = args.logins
+    hasher._slots = eventlet.semaphore.BoundedSemaphore(args.concurrency)
+
+    rows = []
+    for name, verify in (("inline in hub", verify_codeword), ("codeword_hasher", hasher.verify)):
+        seconds, p99, worst = storm(verify, hashed, args.logins)
+        rows.append((f"{name}: logins/s", f"{args.logins / seconds:,.0f}"))
+        rows.append((f"{name}: hub lag p99 / max, ms", f"{p99:.1f} / {worst:.1f}"))
+    stats = hasher.stats()
+    rows.append(("codeword_hasher: peak queue / avg wait ms", f"{stats['peak_queue_depth']} / {stats['avg_wait_ms']}"))
+
+    print_rows(f"{args.logins} concurrent logins, PBKDF2 x{hasher.iterations:,}", rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+bench_metrics.py — цена инструментирования services/metrics.py.
+Меряет добавку на одно событие Socket.IO (metrics.track вокруг пустого обработчика в
+контексте запроса, как его создаёт Flask-SocketIO), на HTTP-запрос (хуки before/after/
+teardown), на SQL-запрос (слушатели курсора на отдельном SQLite в памяти) и время
+ответа /metrics при заданном числе событий и маршрутов.
+Запуск:
+    python -m benchmarks.bench_metrics [--rounds 200000]
+"""
+
+import argparse
+import time
+
+from benchmarks.common import make_app, print_rows
+
+
+def per_call(fn, rounds):
+    """Микросекунды на вызов fn()"""
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - started) / rounds * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=200_000)
+    parser.add_argument("--series", type=int, default=50, help="событий и маршрутов в /metrics")
+    args = parser.parse_args()
+
+    app = make_app()
+    from sqlalchemy import create_engine, event
+    from services.metrics import Metrics, metrics
+
+    rows = []
+
+    # --- Событие Socket.IO ---
+    bench = Metrics()
+
+    def handler(data=None):
+        return None
+
+    tracked = bench.track("bench_event")(handler)
+    with app.test_request_context("/socket.io/"):
+        bare = per_call(lambda: handler({}), args.rounds)
+        wrapped = per_call(lambda: tracked({}), args.rounds)
+    rows.append(("socket event: bare handler, µs", f"{bare:.2f}"))
+    rows.append(("socket event: with metrics.track, µs", f"{wrapped:.2f}"))
+    rows.append(("socket event: overhead, µs", f"{wrapped - bare:.2f}"))
+
+    # --- HTTP-запрос: хуки без самого маршрута ---
+    with app.test_request_context("/api/groups"):
+        from flask import request
+        request.url_rule = next(rule for rule in app.url_map.iter_rules() if rule.rule == "/api/groups")
+        response = app.response_class("")
+
+        def hooks():
+            bench._before_request()
+            bench._after_request(response)
+            bench._teardown_request()
+
+        rows.append(("http request: hooks, µs", f"{per_call(hooks, args.rounds):.2f}"))
+
+    # --- SQL-запрос ---
+    engine = create_engine("sqlite://")
+    with engine.connect() as conn:
+        rounds = max(1, args.rounds // 10)
+        plain = per_call(lambda: conn.exec_driver_sql("SELECT 1").scalar(), rounds)
+        event.listen(engine, "before_cursor_execute", bench._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", bench._after_cursor_execute)
+        with app.test_request_context("/"):
+            bench._begin_unit("http", "bench")
+            listened = per_call(lambda: conn.exec_driver_sql("SELECT 1").scalar(), rounds)
+    rows.append(("sql query: SELECT 1 plain / instrumented, µs", f"{plain:.2f} / {listened:.2f}"))
+    rows.append(("sql query: overhead, µs", f"{listened - plain:.2f}"))
+
+    # --- Экспорт ---
+    for n in range(args.series):
+        for value in (0.001, 0.01, 0.2):
+            metrics.event_seconds.observe(value, (f"event_{n}",))
+            metrics.request_seconds.observe(value, ("GET", f"/route/{n}"))
+            metrics.unit_queries.observe(n % 7, ("http", f"/route/{n}"))
+    with app.app_context():
+        metrics.render()
+        started = time.perf_counter()
+        body = metrics.render()
+        render_ms = (time.perf_counter() - started) * 1000
+    rows.append((f"/metrics render ({args.series} events + routes), ms", f"{render_ms:.2f}"))
+    rows.append(("/metrics size, KB", f"{len(body) / 1024:.1f}"))
+
+    print_rows(f"metrics overhead, {args.rounds:,} rounds", rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+bench_rate_limit.py — «шумный сосед» в одном воркере: p99 обычных клиентов при флуде.
+Обработчик события занимает хаб на --work-ms (как commit и рассылка). Один клиент шлёт
+события без пауз, остальные — раз в 50 мс; сравниваем задержку обычных клиентов без
+ограничения и с rate_limiter, а также стоимость самой проверки.
+Запуск:
+    python -m benchmarks.bench_rate_limit [--clients 20] [--seconds 3] [--redis-url redis://...]
+"""
+
+import eventlet
+eventlet.monkey_patch()
+
+import argparse
+import time
+
+from benchmarks.common import print_rows
+from services.rate_limit import RateLimiter, redis
+
+
+def busy(seconds):
+    """Работа обработчика без отдачи управления хабу"""
+    until = time.perf_counter() + seconds
+    while time.perf_counter() < until:
+        pass
+
+
+def scenario(limiter, clients, seconds, work):
+    """Возвращает (p50, p99 задержки обычных клиентов в мс, обработано событий флудера)"""
+    latencies, flooded = [], [0]
+    deadline = time.perf_counter() + seconds
+
+    def handle(sid):
+        if limiter is not None and limiter.hit("send_message", sid, sid):
+            return False
+        busy(work)
+        return True
+
+    def flooder():
+        while time.perf_counter() < deadline:
+            if handle("flooder"):
+                flooded[0] += 1
+            eventlet.sleep(0)
+
+    def client(n):
+        eventlet.sleep(0.05 * n / clients)  # клиенты не приходят все разом
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            eventlet.sleep(0)  # событие ждёт своей очереди в хабе
+            handle(f"client-{n}")
+            latencies.append((time.perf_counter() - started) * 1000)
+            eventlet.sleep(0.05)
+
+    pool = eventlet.GreenPool()
+    pool.spawn(flooder)
+    for n in range(clients):
+        pool.spawn(client, n)
+    pool.waitall()
+    latencies.sort()
+    return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99) - 1], flooded[0]
+
+
+def check_cost(limiter, rounds=100_000):
+    """Микросекунды на проверку: разрешённую и отклонённую"""
+    limiter.limits["open"], limiter.limits["closed"] = (1e9, 1e9), (1e-9, 1)
+    limiter.hit("closed", "sid", "user")
+    results = []
+    for event in ("open", "closed"):
+        started = time.perf_counter()
+        for _ in range(rounds):
+            limiter.hit(event, "sid", "user")
+        results.append((time.perf_counter() - started) / rounds * 1e6)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--work-ms", type=float, default=2.0)
+    parser.add_argument("--redis-url", default=None)
+    args = parser.parse_args()
+    work = args.work_ms / 1000
+
+    rows = []
+    for name, limiter in (("no limit", None), ("rate_limiter", RateLimiter())):
+        p50, p99, flooded = scenario(limiter, args.clients, args.seconds, work)
+        rows.append((f"{name}: client p50 / p99, ms", f"{p50:.1f} / {p99:.1f}"))
+        rows.append((f"{name}: flooder events handled", f"{flooded:,}"))
+
+    allowed, rejected = check_cost(RateLimiter())
+    rows.append(("memory: µs per allowed / rejected check", f"{allowed:.2f} / {rejected:.2f}"))
+    if args.redis_url and redis is not None:
+        limiter = RateLimiter()
+        limiter.use_redis(redis.Redis.from_url(args.redis_url))
+        allowed, rejected = check_cost(limiter, rounds=5_000)
+        rows.append(("redis: µs per allowed / rejected check", f"{allowed:.0f} / {rejected:.0f}"))
+
+    print_rows(f"1 flooder + {args.clients} clients, {args.work_ms} ms per event", rows)
+
+
+if __name__ == "__main__":
+    main()
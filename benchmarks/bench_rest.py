@@ -0,0 +1,277 @@
+"""
+bench_rest.py — REST-эндпоинты на большой БД: пропускная способность, задержка и SQL.
+Заполняет БД в масштабе --scale (large: 10k пользователей, 5k групп, 10M сообщений)
+генератором seed_data (горячие группы, степенной закон авторов) и меряет /api/groups,
+/api/groups/<uuid>, /auth/join, /auth/me и /api/user/check дважды: через тестовый клиент Flask (только стоимость приложения) и
+через настоящий WSGI-сервер — отдельный процесс с socketio.run под eventlet, как в
+продакшене; запросы идут по keep-alive из --concurrency потоков.
+
+Для каждого запроса считается число SQL-запросов (заголовок X-Query-Count, который
+добавляет только этот бенчмарк): N+1 в routes/groups.py виден как рост этого числа
+вместе с числом участников группы. Заполненную БД можно переиспользовать: с
+--database-url данные создаются, только если их ещё нет.
+Запуск:
+    python -m benchmarks.bench_rest [--scale small|large] [--seconds 3] [--concurrency 4]
+        [--database-url sqlite:////tmp/rest.db] [--output rest.json]
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from benchmarks.common import make_app, percentile, print_rows, serve, servers
+
+# Масштаб: (пользователей, групп, сообщений)
+SCALES = {
+    "small": (1_000, 500, 100_000),
+    "large": (10_000, 5_000, 10_000_000),
+}
+CODEWORD = "bench-codeword"
+
+
+# --- Данные ---
+def seed(app, users, groups, messages, seed_value):
+    """Заполняет БД генератором seed_data (пакетная загрузка); уже заполненную не трогает"""
+    from sqlalchemy import func, select
+    from extensions import db
+    from models.user import User
+    from seed_data import TABLES
+    from services.bulk_loader import BulkLoader
+    from utils.crypto import hash_codeword
+    from utils.synthetic import SyntheticChat
+
+    with app.app_context():
+        present = db.session.scalar(select(func.count()).select_from(User))
+        db.session.remove()
+        if present:
+            if present != users:
+                raise SystemExit(f"в БД уже {present} пользователей, а нужно {users} — возьмите другую БД")
+            return False
+
+        started = time.perf_counter()
+        # Одно кодовое слово на всех: PBKDF2 считается один раз
+        chat = SyntheticChat(users, groups, messages, seed=seed_value, codeword_hash=hash_codeword(CODEWORD))
+        with BulkLoader() as loader:
+            for name, rows in chat.tables():
+                loader.load(TABLES[name], rows)
+        print(f"seeded in {time.perf_counter() - started:.0f} s", file=sys.stderr)
+        return True
+
+
+def pick_targets(app, rng):
+    """Пользователь для входа и две группы: самая большая и типичная (медиана по размеру)"""
+    from models.message import Group
+    from models.user import User
+
+    with app.app_context():
+        sizes = Group.query.order_by(Group.member_count.desc()).with_entities(Group.uuid, Group.member_count).all()
+        login = User.query.order_by(User.id).offset(rng.randrange(User.query.count())).first()
+        return login.uuid, sizes[0], sizes[len(sizes) // 2]
+
+
+def count_queries(app):
+    """Считает SQL-запросы каждого HTTP-запроса и отдаёт их в заголовке X-Query-Count"""
+    from flask import g, has_app_context
+    from sqlalchemy import event
+    from extensions import db
+
+    def on_execute(*_):
+        if has_app_context():
+            g.bench_queries = g.get("bench_queries", 0) + 1
+
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", on_execute)
+
+    @app.after_request
+    def add_query_count(response):
+        response.headers["X-Query-Count"] = str(g.get("bench_queries", 0))
+        return response
+
+
+def endpoints(login_uuid, largest, typical):
+    """(название, метод, путь, тело) замеряемых запросов"""
+    login = {"uuid": login_uuid, "codeword": CODEWORD}
+    return [
+        ("GET /api/groups", "GET", "/api/groups", None),
+        ("GET /api/groups/<uuid> (largest)", "GET", f"/api/groups/{largest}", None),
+        ("GET /api/groups/<uuid> (typical)", "GET", f"/api/groups/{typical}", None),
+        ("POST /auth/join", "POST", "/auth/join", login),
+        ("GET /auth/me", "GET", "/auth/me", None),
+        ("GET /api/user/check", "GET", "/api/user/check", None),
+    ], login
+
+
+# --- Замеры ---
+class Sample:
+    """Задержки и число SQL-запросов одного эндпоинта"""
+
+    def __init__(self):
+        self.latencies, self.queries, self.errors, self.bytes = [], [], 0, 0
+        self.seconds = 0.0
+
+    def add(self, status, elapsed, queries, size):
+        if status >= 400:
+            self.errors += 1
+        self.latencies.append(elapsed * 1000)
+        self.queries.append(queries)
+        self.bytes = size
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+        return {
+            "requests": count,
+            "requests_per_sec": round(count / self.seconds, 1) if self.seconds else None,
+            "p50_ms": percentile(latencies, 0.50),
+            "p95_ms": percentile(latencies, 0.95),
+            "p99_ms": percentile(latencies, 0.99),
+            "queries_per_request": round(sum(self.queries) / count, 2) if count else None,
+            "queries_max": max(self.queries) if count else None,
+            "response_kb": round(self.bytes / 1024, 1),
+            "errors": self.errors,
+        }
+
+
+def run_test_client(app, targets, login, seconds, limit):
+    """Последовательные запросы через app.test_client() — без сети и сервера"""
+    client = app.test_client()
+    client.post("/auth/join", json=login)
+    results = {}
+    for name, method, path, body in targets:
+        sample = Sample()
+        deadline = time.perf_counter() + seconds
+        started = time.perf_counter()
+        while time.perf_counter() < deadline and len(sample.latencies) < limit:
+            before = time.perf_counter()
+            response = client.open(path, method=method, json=body)
+            data = response.get_data()
+            sample.add(response.status_code, time.perf_counter() - before,
+                       int(response.headers.get("X-Query-Count", 0)), len(data))
+        sample.seconds = time.perf_counter() - started
+        results[name] = sample.summary()
+    return results
+
+
+def run_server(port, targets, login, seconds, limit, concurrency):
+    """Запросы к серверу по HTTP/1.1 keep-alive из concurrency потоков, у каждого своя сессия"""
+    def open_session():
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        connection.request("POST", "/auth/join", json.dumps(login), {"Content-Type": "application/json"})
+        response = connection.getresponse()
+        response.read()
+        cookie = (response.getheader("Set-Cookie") or "").split(";", 1)[0]
+        return connection, {"Cookie": cookie, "Content-Type": "application/json"}
+
+    sessions = [open_session() for _ in range(concurrency)]
+    results = {}
+    for name, method, path, body in targets:
+        sample, lock = Sample(), threading.Lock()
+        payload = json.dumps(body) if body is not None else None
+        deadline = time.perf_counter() + seconds
+
+        def worker(connection, headers):
+            while time.perf_counter() < deadline:
+                with lock:
+                    if len(sample.latencies) >= limit:
+                        return
+                before = time.perf_counter()
+                connection.request(method, path, payload, headers)
+                response = connection.getresponse()
+                data = response.read()
+                elapsed = time.perf_counter() - before
+                with lock:
+                    sample.add(response.status, elapsed, int(response.getheader("X-Query-Count", 0)), len(data))
+
+        threads = [threading.Thread(target=worker, args=session) for session in sessions]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        sample.seconds = time.perf_counter() - started
+        results[name] = sample.summary()
+    for connection, _ in sessions:
+        connection.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--users", type=int, default=None)
+    parser.add_argument("--groups", type=int, default=None)
+    parser.add_argument("--messages", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=42, help="seed генератора данных")
+    parser.add_argument("--seconds", type=float, default=3.0, help="на эндпоинт в каждом режиме")
+    parser.add_argument("--requests", type=int, default=5_000, help="не больше запросов на эндпоинт")
+    parser.add_argument("--concurrency", type=int, default=4, help="соединений к серверу")
+    parser.add_argument("--port", type=int, default=5650)
+    parser.add_argument("--database-url", default=None, help="по умолчанию временный SQLite")
+    parser.add_argument("--mode", choices=("both", "test-client", "server"), default="both")
+    parser.add_argument("--output", default=None, help="куда сохранить JSON")
+    parser.add_argument("--serve", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    database_url = args.database_url or "sqlite:///{}".format(
+        os.path.join(tempfile.mkdtemp(prefix="chat-rest-"), "rest.db")
+    )
+    if args.serve is not None:
+        return serve(args.serve, database_url, prepare=count_queries)
+
+    users, groups, messages = SCALES[args.scale]
+    users, groups, messages = args.users or users, args.groups or groups, args.messages or messages
+    rng = random.Random(args.seed)
+
+    # Проверки кодовых слов — в полную силу, как в продакшене
+    app = make_app(database_url, SECRET_KEY="bench-rest")
+    seeded = seed(app, users, groups, messages, args.seed)
+    count_queries(app)
+    login_uuid, largest, typical = pick_targets(app, rng)
+    targets, login = endpoints(login_uuid, largest[0], typical[0])
+
+    results = {}
+    if args.mode in ("both", "test-client"):
+        results["test_client"] = run_test_client(app, targets, login, args.seconds, args.requests)
+    if args.mode in ("both", "server"):
+        env = dict(os.environ, DATABASE_URL=database_url, SECRET_KEY="bench-rest")
+        with servers("benchmarks.bench_rest", [args.port], env, ("--database-url", database_url)):
+            results["server"] = run_server(args.port, targets, login, args.seconds, args.requests,
+                                           args.concurrency)
+
+    report = {
+        "benchmark": "bench_rest",
+        "timestamp": datetime.utcnow().isoformat(),
+        "config": {
+            "users": users, "groups": groups, "messages": messages, "seed": args.seed,
+            "concurrency": args.concurrency, "seconds": args.seconds,
+            "database": database_url.split(":", 1)[0], "seeded_now": seeded,
+            "largest_group_members": largest[1], "typical_group_members": typical[1],
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+
+    for mode, endpoints_results in results.items():
+        rows = []
+        for name, summary in endpoints_results.items():
+            rows.append((name, f"{summary['requests_per_sec']:,} req/s"))
+            rows.append(("  p50 / p95 / p99, ms", f"{summary['p50_ms']} / {summary['p95_ms']} / {summary['p99_ms']}"))
+            rows.append(("  SQL queries per request (max)", f"{summary['queries_per_request']} ({summary['queries_max']})"))
+            if summary["errors"]:
+                rows.append(("  errors", summary["errors"]))
+        title = (f"{mode}: {users:,} users, {groups:,} groups, {messages:,} messages; "
+                 f"groups of {largest[1]} and {typical[1]} members")
+        print_rows(title, rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+bench_search.py — полнотекстовый поиск на большой таблице messages:
+индекс (FTS5 / tsvector) против LIKE-сканирования.
+Запуск:
+    python -m benchmarks.bench_search [--messages 1000000] [--groups 100] [--database-url ...]
+"""
+
+import argparse
+import itertools
+import random
+import time
+import uuid
+from datetime import datetime
+
+from benchmarks.common import make_app, seed_user_and_group, timed, print_rows
+
+
+def _vocabulary(size, rnd):
+    letters = "абвгдежзиклмнопрстуфхцчшэюяabcdefghijklmnopqrstuvwxyz"
+    return ["".join(rnd.choice(letters) for _ in range(rnd.randint(3, 9))) for _ in range(size)]
+
+
+def seed_messages(app, count, groups, rnd):
+    """Вставляет count сообщений пачками (индекс обновляется триггерами на вставке)"""
+    from sqlalchemy import insert
+    from extensions import db
+    from models.message import Message, Group
+
+    user_id, first_group = seed_user_and_group(app, username="search_bench", group_name="search_0")
+    with app.app_context():
+        extra = [Group(name=f"search_{i}") for i in range(1, groups)]
+        db.session.add_all(extra)
+        db.session.commit()
+        group_ids = [first_group] + [g.id for g in extra]
+
+    words = _vocabulary(20_000, rnd)
+    # Распределение слов с длинным хвостом: часть слов частые, большинство — редкие
+    cum_weights = list(itertools.accumulate(1 / (i + 1) for i in range(len(words))))
+    now = datetime.utcnow()
+
+    batch_size = 20_000
+    with app.app_context():
+        for start in range(0, count, batch_size):
+            rows = []
+            for _ in range(min(batch_size, count - start)):
+                rows.append({
+                    "uuid": str(uuid.uuid4()),
+                    "content": " ".join(rnd.choices(words, cum_weights=cum_weights, k=rnd.randint(3, 25))),
+                    "message_type": "text",
+                    "is_encrypted": False,
+                    "created_at": now,
+                    "user_id": user_id,
+                    "group_id": rnd.choice(group_ids),
+                })
+            db.session.execute(insert(Message), rows)
+            db.session.commit()
+    return user_id, group_ids, words
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    return ordered[len(ordered) // 2], ordered[int(len(ordered) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--groups", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    rnd = random.Random(7)
+    app = make_app(args.database_url)
+    from extensions import db
+    from sqlalchemy import text
+    from services.search_index import search_index
+
+    (user_id, group_ids, words), seed_time = timed(seed_messages, app, args.messages, args.groups, rnd)
+
+    common_terms = words[:20]
+    rare_terms = words[5_000:5_020]
+    rows = [("seed + incremental indexing, msg/s", f"{args.messages / seed_time:,.0f}")]
+
+    with app.app_context():
+        _, backfill_time = timed(search_index.backfill)
+        rows.append(("full backfill (rebuild), s", f"{backfill_time:.1f}"))
+
+        cases = [
+            ("common word", lambda: rnd.choice(common_terms), None),
+            ("rare word", lambda: rnd.choice(rare_terms), None),
+            ("two words", lambda: f"{rnd.choice(common_terms)} {rnd.choice(rare_terms)}", None),
+            ("prefix", lambda: rnd.choice(rare_terms)[:3], None),
+            ("rare word in one group", lambda: rnd.choice(rare_terms), rnd.choice(group_ids)),
+        ]
+        for name, make_query, group_id in cases:
+            samples = []
+            for _ in range(args.queries):
+                query = make_query()
+                started = time.perf_counter()
+                search_index.search(query, user_id, group_id=group_id, limit=20)
+                samples.append((time.perf_counter() - started) * 1000)
+            p50, p95 = percentiles(samples)
+            rows.append((f"index: {name}, p50 / p95 ms", f"{p50:.2f} / {p95:.2f}"))
+
+        like_samples = []
+        for _ in range(min(args.queries, 5)):
+            term = rnd.choice(rare_terms)
+            started = time.perf_counter()
+            db.session.execute(
+                text("SELECT id FROM messages WHERE content LIKE :pattern ORDER BY id DESC LIMIT 20"),
+                {"pattern": f"%{term}%"},
+            ).all()
+            like_samples.append((time.perf_counter() - started) * 1000)
+        p50, p95 = percentiles(like_samples)
+        rows.append(("LIKE scan: rare word, p50 / p95 ms", f"{p50:.2f} / {p95:.2f}"))
+
+    print_rows(f"message search over {args.messages:,} messages in {args.groups} groups", rows)
+
+
+if __name__ == "__main__":
+    main()
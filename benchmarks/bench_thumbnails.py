@@ -0,0 +1,69 @@
+"""
+bench_thumbnails.py — превью изображений: время создания и экономия трафика.
+Генерирует «фотографии» (шум и градиент, JPEG), считает превью в одном процессе и в
+пуле процессов и сравнивает объём страницы истории из изображений, если клиент
+загружает оригиналы и если — превью из Message.to_dict().
+Запуск:
+    python -m benchmarks.bench_thumbnails [--images 40] [--width 1920] [--workers 2]
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.common import print_rows
+from utils.images import Image, make_thumbnail
+
+
+def make_photo(path, width, height, seed):
+    """JPEG, похожий на фотографию по сжимаемости: детали фрактала и немного шума"""
+    extent = (-2.0 + seed * 0.01, -1.2, 0.8, 1.2)
+    detail = Image.effect_mandelbrot((width, height), extent, 100).convert("RGB")
+    noise = Image.effect_noise((width, height), 20).convert("RGB")
+    Image.blend(detail, noise, 0.15).save(path, "JPEG", quality=88)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--images", type=int, default=40)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--size", type=int, default=320)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+    height = args.width * 3 // 4
+
+    with tempfile.TemporaryDirectory() as root:
+        sources = [os.path.join(root, f"{i}.jpg") for i in range(args.images)]
+        for i, path in enumerate(sources):
+            make_photo(path, args.width, height, i)
+        targets = [f"{path}.t{args.size}.webp" for path in sources]
+
+        started = time.perf_counter()
+        for source, target in zip(sources, targets):
+            make_thumbnail(source, target, args.size)
+        inline = time.perf_counter() - started
+
+        with ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            pool.submit(int).result()  # запуск процессов не считаем
+            started = time.perf_counter()
+            list(pool.map(make_thumbnail, sources, targets, [args.size] * args.images))
+            pooled = time.perf_counter() - started
+
+        originals = sum(os.path.getsize(path) for path in sources)
+        previews = sum(os.path.getsize(path) for path in targets)
+
+    rows = [
+        ("one process: ms per image", f"{inline / args.images * 1000:.1f}"),
+        (f"pool x{args.workers}: images/s", f"{args.images / pooled:,.1f}"),
+        ("page of originals, KB", f"{originals / 1024:,.0f}"),
+        ("page of thumbnails, KB", f"{previews / 1024:,.0f}"),
+        ("bytes saved", f"{(1 - previews / originals) * 100:.1f}%"),
+    ]
+    print_rows(f"{args.images} images {args.width}x{height} → WebP {args.size}px", rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+bench_wire.py — размер и время кодирования страниц истории: JSON против MessagePack.
+Страница собирается так же, как chat_history (Message.to_dict + Message.pack_page).
+Запуск:
+    python -m benchmarks.bench_wire [--page 500] [--authors 20] [--repeat 200]
+"""
+
+import argparse
+import json
+import random
+import uuid
+from datetime import datetime, timedelta
+
+from benchmarks.common import timed, print_rows
+
+
+def build_page(size, authors):
+    """Реалистичная страница истории: короткие и длинные сообщения, несколько авторов"""
+    from models.message import Message
+
+    users = [{
+        "uuid": str(uuid.uuid4()),
+        "username": f"user_{i}",
+        "is_online": i % 3 == 0,
+        "last_seen": (datetime(2024, 1, 1) + timedelta(minutes=i)).isoformat(),
+    } for i in range(authors)]
+
+    rnd = random.Random(42)
+    started = datetime(2024, 1, 1)
+    entries = []
+    for i in range(size):
+        text = " ".join(rnd.choice(["привет", "ok", "сегодня", "deploy", "🔥", "через час", "lol"])
+                        for _ in range(rnd.randint(2, 40)))
+        entries.append({
+            "id": 100_000 + i,
+            "uuid": str(uuid.uuid4()),
+            "content": text,
+            "is_encrypted": False,
+            "message_type": "text",
+            "file_url": None,
+            "file_name": None,
+            "created_at": (started + timedelta(seconds=i * 7)).isoformat(),
+            "user": rnd.choice(users),
+            "group_id": 1,
+        })
+
+    messages, users_map = Message.pack_page(entries)
+    return {"group_id": 1, "messages": messages, "users": users_map, "next_cursor": 100_000, "has_more": True}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--page", type=int, default=500)
+    parser.add_argument("--authors", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    from extensions import wire, msgpack
+    if msgpack is None:
+        raise SystemExit("msgpack не установлен: pip install msgpack")
+
+    payload = build_page(args.page, args.authors)
+
+    def encode_json():
+        for _ in range(args.repeat):
+            data = json.dumps(payload, separators=(",", ":"))
+        return data
+
+    def encode_msgpack():
+        for _ in range(args.repeat):
+            data = wire.encode(payload)
+        return data
+
+    json_data, json_time = timed(encode_json)
+    mp_data, mp_time = timed(encode_msgpack)
+    json_size = len(json_data.encode())
+
+    print_rows(f"chat_history page of {args.page} messages, {args.authors} authors", [
+        ("JSON size, bytes", f"{json_size:,}"),
+        ("MessagePack size, bytes", f"{len(mp_data):,} ({len(mp_data) / json_size:.0%} of JSON)"),
+        ("JSON encode, µs/page", f"{json_time / args.repeat * 1e6:,.0f}"),
+        ("MessagePack encode (incl. epoch timestamps), µs/page", f"{mp_time / args.repeat * 1e6:,.0f}"),
+    ])
+
+
+if __name__ == "__main__":
+    main()
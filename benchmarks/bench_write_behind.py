@@ -0,0 +1,72 @@
+"""
+bench_write_behind.py — пропускная способность записи сообщений:
+commit на каждое сообщение (текущий путь send_message) против пакетной записи MessageWriter.
+Запуск:
+    python -m benchmarks.bench_write_behind [--messages 5000] [--batch 500]
+"""
+
+import argparse
+import uuid
+from datetime import datetime
+
+from benchmarks.common import make_app, seed_user_and_group, timed, print_rows
+
+
+def _row(user_id, group_id, i):
+    return {
+        "uuid": str(uuid.uuid4()),
+        "group_id": group_id,
+        "user_id": user_id,
+        "content": f"benchmark message {i}",
+        "message_type": "text",
+        "created_at": datetime.utcnow(),
+    }
+
+
+def run_commit_per_message(app, user_id, group_id, count):
+    from extensions import db
+    from models.message import Message
+
+    with app.app_context():
+        for i in range(count):
+            db.session.add(Message(**_row(user_id, group_id, i)))
+            db.session.commit()
+
+
+def run_write_behind(app, user_id, group_id, count, batch_size):
+    from services.message_writer import MessageWriter
+
+    writer = MessageWriter()
+    writer.init_app(app)
+    writer.batch_size = batch_size
+
+    saved = []
+    for i in range(count):
+        # Фоновую задачу не запускаем — сбрасываем очередь вручную
+        writer._queue.append((_row(user_id, group_id, i), lambda row, message_id: saved.append(message_id)))
+    writer.flush_all()
+    assert len(saved) == count and all(saved), "не все сообщения подтверждены"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    app = make_app(args.database_url)
+    user_id, group_id = seed_user_and_group(app)
+
+    _, sync_time = timed(run_commit_per_message, app, user_id, group_id, args.messages)
+    _, batch_time = timed(run_write_behind, app, user_id, group_id, args.messages, args.batch)
+
+    print_rows(f"send_message persistence, {args.messages} messages", [
+        ("commit per message, msg/s", f"{args.messages / sync_time:,.0f}"),
+        (f"write-behind (batch={args.batch}), msg/s", f"{args.messages / batch_time:,.0f}"),
+        ("speedup", f"x{sync_time / batch_time:.1f}"),
+    ])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+common.py — общие помощники бенчмарков: приложение на временной БД, заготовки данных,
+процессы сервера под eventlet и перцентили.
+"""
+
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from contextlib import contextmanager
+
+
+def make_app(database_url=None, **config):
+    """
+    Поднимает приложение на отдельной БД (по умолчанию — временный SQLite-файл).
+    DATABASE_URL нужно выставить до импорта app: модуль создаёт приложение при импорте.
+    """
+    if database_url is None:
+        tmp_dir = tempfile.mkdtemp(prefix="chat-bench-")
+        database_url = f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}"
+    os.environ["DATABASE_URL"] = database_url
+
+    from app import app
+
+    app.config.update(config)
+    return app
+
+
+def seed_user_and_group(app, username="bench_user", group_name="bench_group"):
+    """Создаёт пользователя и группу, возвращает (user_id, group_id)"""
+    from extensions import db
+    from models.user import User
+    from models.message import Group
+
+    with app.app_context():
+        user = User(username=username, codeword_hash="")
+        group = Group(name=group_name)
+        db.session.add_all([user, group])
+        db.session.commit()
+        return user.id, group.id
+
+
+def timed(fn, *args, **kwargs):
+    """Выполняет fn и возвращает (результат, секунды)"""
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def percentile(values, share):
+    """Перцентиль share (0.95) отсортированного списка, округлённый до сотых"""
+    if not values:
+        return None
+    return round(values[max(0, math.ceil(share * len(values)) - 1)], 2)
+
+
+# --- Сервер в отдельном процессе ---
+def serve(port, database_url=None, prepare=None):
+    """
+    Тело процесса сервера: приложение под eventlet, как socketio.run в app.py.
+    БД — database_url или DATABASE_URL из окружения; prepare(app) вызывается до старта.
+    """
+    import eventlet
+    eventlet.monkey_patch()
+
+    from extensions import socketio
+
+    app = make_app(database_url or os.environ.get("DATABASE_URL"))
+    if prepare is not None:
+        prepare(app)
+    socketio.run(app, host="127.0.0.1", port=port, debug=False, use_reloader=False, log_output=False)
+
+
+def wait_ready(port, timeout=60):
+    """Ждёт, пока сервер на port ответит 200 на /health"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"сервер на порту {port} не запустился за {timeout} с")
+
+
+@contextmanager
+def servers(module, ports, env, args=()):
+    """
+    Запускает `python -m module --serve <port> *args` на каждом порту, ждёт готовности
+    и отдаёт список процессов; на выходе процессы завершаются.
+    """
+    processes = [
+        subprocess.Popen([sys.executable, "-m", module, "--serve", str(port), *args],
+                         env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        for port in ports
+    ]
+    try:
+        for port in ports:
+            wait_ready(port)
+        yield processes
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+def print_rows(title, rows):
+    """Печатает таблицу результатов"""
+    print(f"\n{title}\n" + "-" * 72)
+    for name, value in rows:
+        print(f"{name:48s} {value}")
+    print("-" * 72)
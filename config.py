@@ -21,6 +21,18 @@ class Config:
     INSTANCE_FOLDER = os.path.join(os.getcwd(), "instance")
     UPLOAD_FOLDER = os.path.join(INSTANCE_FOLDER, "uploads")
     MAX_CONTENT_LENGTH = 25 * 1024 * 1024  # 25 МБ
+    # Загрузка по частям (/upload/sessions): файл целиком может быть больше MAX_CONTENT_LENGTH
+    UPLOAD_MAX_FILE_SIZE = int(os.getenv("UPLOAD_MAX_FILE_SIZE", 1024 * 1024 * 1024))  # 1 ГБ
+    UPLOAD_MAX_CHUNK_SIZE = 8 * 1024 * 1024  # не больше MAX_CONTENT_LENGTH
+    UPLOAD_SESSION_TTL_HOURS = 24  # незавершённые загрузки старше удаляются
+    # Отдача /files/...: wsgi (wsgi.file_wrapper/sendfile), x-accel (nginx) или x-sendfile
+    FILES_SENDFILE_MODE = os.getenv("FILES_SENDFILE_MODE", "wsgi")
+    FILES_ACCEL_PREFIX = os.getenv("FILES_ACCEL_PREFIX", "/protected-uploads/")
+    # Превью изображений в WebP (нужен Pillow): считаются в пуле процессов после загрузки
+    THUMBNAILS_ENABLED = os.getenv("THUMBNAILS_ENABLED", "true").lower() == "true"
+    THUMBNAIL_MAX_SIZE = int(os.getenv("THUMBNAIL_MAX_SIZE", 320))  # сторона квадрата, px
+    THUMBNAIL_QUALITY = 75
+    THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", 2))
 
     ALLOWED_EXTENSIONS = {
         "png", "jpg", "jpeg", "gif", "mp4", "pdf", "zip", "txt",
@@ -30,11 +42,61 @@ class Config:
     # --- SocketIO ---
     SOCKETIO_ASYNC_MODE = "eventlet"  # подходит для продакшена
     SOCKETIO_CORS_ALLOWED_ORIGINS = "*"
+    # auto — MessagePack для клиентов с auth={"codec": "msgpack"}, json — только JSON
+    SOCKETIO_WIRE_FORMAT = os.getenv("SOCKETIO_WIRE_FORMAT", "auto")
+    # Микро-пакеты new_messages для комнат с высоким трафиком
+    SOCKETIO_BATCH_FANOUT = os.getenv("SOCKETIO_BATCH_FANOUT", "false").lower() == "true"
+    SOCKETIO_BATCH_WINDOW_MS = int(os.getenv("SOCKETIO_BATCH_WINDOW_MS", 15))
+    SOCKETIO_BATCH_MAX_MESSAGES = int(os.getenv("SOCKETIO_BATCH_MAX_MESSAGES", 50))
 
     # --- Шифрование сообщений ---
-    CRYPTO_ALGORITHM = "fernet"
+    # Алгоритм новых ключей: aes-gcm / chacha20-poly1305 / fernet
+    CRYPTO_ALGORITHM = os.getenv("CRYPTO_ALGORITHM", "aes-gcm")
+    # Шифрование текста сообщений в БД версионированным ключом (см. rotate_keys.py)
+    MESSAGE_ENCRYPTION_AT_REST = os.getenv("MESSAGE_ENCRYPTION_AT_REST", "false").lower() == "true"
+    CRYPTO_KEYRING_PATH = os.getenv("CRYPTO_KEYRING_PATH")  # по умолчанию instance/keyring.json
+    # Как часто запись сообщения проверяет, не сменил ли keyring другой процесс (stat файла)
+    CRYPTO_KEYRING_REFRESH_SECONDS = float(os.getenv("CRYPTO_KEYRING_REFRESH_SECONDS", 1))
+    CRYPTO_ROTATION_BATCH_SIZE = int(os.getenv("CRYPTO_ROTATION_BATCH_SIZE", 500))
+    CRYPTO_ROTATION_PAUSE_MS = int(os.getenv("CRYPTO_ROTATION_PAUSE_MS", 50))
+    # Выведенный ключ удаляется из keyring не раньше, чем через столько часов
+    CRYPTO_KEY_RETIRE_GRACE_HOURS = float(os.getenv("CRYPTO_KEY_RETIRE_GRACE_HOURS", 24))
+    # Продолжать прерванную ротацию в фоне при старте процесса
+    CRYPTO_ROTATION_RESUME = os.getenv("CRYPTO_ROTATION_RESUME", "true").lower() == "true"
     E2E_ENABLED = True  # флаг для включения end-to-end шифрования
 
+    # --- Хеширование кодовых слов (PBKDF2 в пуле потоков, см. services/codeword_hasher.py) ---
+    CODEWORD_HASH_ITERATIONS = int(os.getenv("CODEWORD_HASH_ITERATIONS", 100_000))
+    CODEWORD_HASH_CONCURRENCY = int(os.getenv("CODEWORD_HASH_CONCURRENCY", 4))
+    CODEWORD_HASH_MAX_PENDING = int(os.getenv("CODEWORD_HASH_MAX_PENDING", 64))  # больше — 503
+
+    # --- Ограничение частоты Socket.IO-событий (token bucket, см. services/rate_limit.py) ---
+    RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory / redis
+    RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", os.getenv("REDIS_URL"))
+    # Переопределение лимитов: "send_message=5:20,create_group=0.2:3" (токенов/с:ёмкость)
+    RATE_LIMITS = os.getenv("RATE_LIMITS", "")
+    RATE_LIMIT_MAX_BUCKETS = 100_000  # вёдер в памяти процесса, старые вытесняются
+
+    # --- Исходящая очередь медленных соединений (см. services/backpressure.py) ---
+    BACKPRESSURE_ENABLED = os.getenv("BACKPRESSURE_ENABLED", "true").lower() == "true"
+    BACKPRESSURE_HIGH_WATERMARK = int(os.getenv("BACKPRESSURE_HIGH_WATERMARK", 1024 * 1024))  # байт
+    BACKPRESSURE_LOW_WATERMARK = int(os.getenv("BACKPRESSURE_LOW_WATERMARK", 256 * 1024))
+    BACKPRESSURE_MAX_BYTES = int(os.getenv("BACKPRESSURE_MAX_BYTES", 4 * 1024 * 1024))  # больше — отключение
+    BACKPRESSURE_EVICT_SECONDS = float(os.getenv("BACKPRESSURE_EVICT_SECONDS", 10))
+    BACKPRESSURE_MIN_PACKETS = 32  # меньше пакетов в очереди — объём не считаем
+    BACKPRESSURE_CHECK_INTERVAL_MS = 500
+
+    # --- Метрики Prometheus на /metrics (см. services/metrics.py) ---
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")  # если задан — нужен заголовок Authorization: Bearer, иначе только localhost
+
+    # --- Бюджет SQL-запросов и лог медленных запросов (см. services/query_budget.py) ---
+    SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 100))  # 0 — не логировать
+    QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "log")  # off / log / raise
+    QUERY_BUDGET_DEFAULT = int(os.getenv("QUERY_BUDGET_DEFAULT", 20))  # 0 — без общего бюджета
+    QUERY_BUDGETS = os.getenv("QUERY_BUDGETS", "")  # "send_message=3,GET /api/groups=2"
+
     # --- Облачное хранилище (опционально) ---
     CLOUDINARY_CLOUD_NAME = os.getenv("CLOUDINARY_CLOUD_NAME", "")
     CLOUDINARY_API_KEY = os.getenv("CLOUDINARY_API_KEY", "")
@@ -43,7 +105,25 @@ class Config:
     # --- Ограничения и параметры чата ---
     MAX_GROUP_MEMBERS = 50
     DEFAULT_GROUP_NAME = "Общий чат"
-    MESSAGE_HISTORY_LIMIT = 1000
+    MESSAGE_HISTORY_LIMIT = 1000  # максимальный размер одной страницы истории
+    CHAT_HISTORY_PAGE_SIZE = 50  # сообщений в chat_history при входе в группу
+    CHAT_RESYNC_MAX_GAP = 500  # больше пропущенных при переподключении — только последняя страница
+
+    # --- Отложенная запись сообщений (write-behind) ---
+    MESSAGE_WRITE_BEHIND = os.getenv("MESSAGE_WRITE_BEHIND", "false").lower() == "true"
+    MESSAGE_FLUSH_INTERVAL_MS = int(os.getenv("MESSAGE_FLUSH_INTERVAL_MS", 50))
+    MESSAGE_FLUSH_BATCH_SIZE = int(os.getenv("MESSAGE_FLUSH_BATCH_SIZE", 500))
+
+    # --- Кэш последних сообщений (в памяти процесса, для одного воркера) ---
+    MESSAGE_CACHE_ENABLED = os.getenv("MESSAGE_CACHE_ENABLED", "false").lower() == "true"
+    MESSAGE_CACHE_PER_GROUP = int(os.getenv("MESSAGE_CACHE_PER_GROUP", 200))
+    MESSAGE_CACHE_MAX_BYTES = int(os.getenv("MESSAGE_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+
+    # --- Полнотекстовый поиск (FTS5 / tsvector создаются при старте; для больших БД — search_backfill.py) ---
+    SEARCH_INDEX_AUTO_INSTALL = os.getenv("SEARCH_INDEX_AUTO_INSTALL", "true").lower() == "true"
+
+    # --- Онлайн-статус (пакетная запись last_seen/is_online, секунды) ---
+    PRESENCE_FLUSH_INTERVAL = float(os.getenv("PRESENCE_FLUSH_INTERVAL", 5))
     MESSAGE_MAX_LENGTH = 2000
 
 
@@ -52,6 +132,7 @@ class DevelopmentConfig(Config):
     """Конфигурация для локальной разработки."""
     DEBUG = True
     TESTING = False
+    QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "raise")
 
 
 class ProductionConfig(Config):
@@ -76,6 +157,7 @@ class ProductionConfig(Config):
 class TestingConfig(Config):
     """Конфигурация для unit-тестов."""
     TESTING = True
+    QUERY_BUDGET_MODE = "raise"
     SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
 
 
@@ -0,0 +1,123 @@
+"""
+dedupe_uploads.py — перенос старых загрузок (static/uploads/<uuid>.<ext>) в хранилище
+по SHA-256 с удалением дубликатов. Ссылки в messages.file_url переписываются на новые
+адреса (/files/...), messages.file_id и stored_files.ref_count пересчитываются.
+Перенесённые файлы закрепляются (stored_files.pinned): на старые загрузки могли ссылаться
+не только сообщения, и ref_count не знает обо всех ссылках.
+С --collect-garbage удаляются файлы хранилища, на которые не ссылается ни одно сообщение
+и которые загружены раньше --older-than часов назад, кроме закреплённых (запускать
+периодически, например из cron).
+Запуск:
+    python dedupe_uploads.py [--dry-run]
+    python dedupe_uploads.py --collect-garbage [--older-than 24] [--dry-run]
+"""
+
+import argparse
+import os
+from datetime import timedelta
+from sqlalchemy import text, update
+from extensions import db
+from models.message import Message
+from models.upload import UploadSession
+from services.file_store import file_store, file_sha256
+
+LEGACY_URL_PREFIX = "/static/uploads"
+
+
+def dedupe(dry_run):
+    """Переносит старые загрузки в хранилище (в контексте приложения)"""
+    root = file_store.root
+    legacy = sorted(
+        name for name in os.listdir(root)
+        if os.path.isfile(os.path.join(root, name)) and not name.startswith(".")
+    )
+    print(f"📁 {root}: старых файлов {len(legacy)}")
+
+    seen, moved, duplicates, saved_bytes = {}, 0, 0, 0
+    for name in legacy:
+        path = os.path.join(root, name)
+        digest = file_sha256(path)
+        size = os.path.getsize(path)
+        old_url = f"{LEGACY_URL_PREFIX}/{name}"
+
+        if digest in seen or file_store.find(digest) is not None:
+            duplicates += 1
+            saved_bytes += size
+        else:
+            moved += 1
+        seen.setdefault(digest, []).append(old_url)
+        if dry_run:
+            continue
+
+        ext = name.rsplit(".", 1)[1].lower() if "." in name else ""
+        stored, _ = file_store.adopt(path, ext, digest, size)
+        # Ссылки на старый файл вне messages не видны — сборщик мусора его не удалит
+        stored.pinned = True
+        new_url = file_store.url_for(stored)
+        db.session.execute(
+            update(Message).where(Message.file_url == old_url)
+            .values(file_url=new_url, file_id=stored.id)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.execute(
+            update(UploadSession).where(UploadSession.file_url == old_url)
+            .values(file_url=new_url)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+    if not dry_run:
+        # Ссылки на файлы хранилища в виде статики (/static/uploads/ab/cd/...) — на /files/
+        offset = len(LEGACY_URL_PREFIX) + 2
+        for table in ("messages", "upload_sessions"):
+            db.session.execute(text(
+                f"UPDATE {table} SET file_url = :prefix || substr(file_url, {offset}) "
+                f"WHERE file_url LIKE :pattern"
+            ), {"prefix": file_store.url_prefix + "/", "pattern": f"{LEGACY_URL_PREFIX}/__/__/%"})
+
+        # Сообщения со ссылкой на файл хранилища, но без file_id — связываем по пути,
+        # иначе их файлы остались бы без ссылок для сборщика мусора
+        db.session.execute(text(
+            "UPDATE messages SET file_id = (SELECT stored_files.id FROM stored_files "
+            "WHERE :prefix || stored_files.path = messages.file_url) "
+            "WHERE file_id IS NULL AND file_url LIKE :pattern"
+        ), {"prefix": file_store.url_prefix + "/", "pattern": file_store.url_prefix + "/%"})
+
+        # Счётчики ссылок — по фактическим сообщениям
+        db.session.execute(text(
+            "UPDATE stored_files SET ref_count = "
+            "(SELECT COUNT(*) FROM messages WHERE messages.file_id = stored_files.id)"
+        ))
+        db.session.commit()
+
+    prefix = "🔎 Будет" if dry_run else "✅"
+    print(f"{prefix} перенесено: {moved}, дубликатов удалено: {duplicates}, "
+          f"освобождено {saved_bytes / 1024 / 1024:.1f} МБ")
+
+
+def collect_garbage(older_than_hours, dry_run):
+    """Удаляет файлы хранилища без ссылок (в контексте приложения)"""
+    older_than = timedelta(hours=older_than_hours)
+    if dry_run:
+        print(f"🔎 Будет удалено файлов без ссылок: {file_store.garbage(older_than).count()}")
+        return
+    removed = file_store.collect_garbage(older_than)
+    print(f"✅ Удалено файлов без ссылок: {removed}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move legacy uploads into the content-addressed store")
+    parser.add_argument("--dry-run", action="store_true", help="только посчитать, ничего не менять")
+    parser.add_argument("--collect-garbage", action="store_true",
+                        help="удалить файлы хранилища, на которые не ссылается ни одно сообщение")
+    parser.add_argument("--older-than", type=float, default=24,
+                        help="с --collect-garbage: не трогать файлы моложе стольких часов (по умолчанию 24)")
+    args = parser.parse_args()
+
+    from app import app
+
+    with app.app_context():
+        if args.collect_garbage:
+            collect_garbage(args.older_than, args.dry_run)
+        else:
+            dedupe(args.dry_run)
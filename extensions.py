@@ -1,7 +1,16 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_socketio import SocketIO
 from cryptography.fernet import Fernet
+from datetime import datetime, timedelta, timezone
 import os
+import time
+from utils.crypto import get_cipher, decrypt_message, encrypt_many, decrypt_many
+from utils.aead import AeadEngine, Keyring
+
+try:
+    import msgpack
+except ImportError:  # MessagePack необязателен — без него все клиенты получают JSON
+    msgpack = None
 
 # --- База данных ---
 db = SQLAlchemy()
@@ -15,7 +24,126 @@ socketio = SocketIO(
     ping_interval=25,
 )
 
+# --- Формат кадров Socket.IO (JSON или MessagePack для каждого соединения) ---
+class WireCodec:
+    """
+    Согласование формата полезной нагрузки с клиентом.
+    Клиент, передавший auth={"codec": "msgpack"} при подключении, получает тяжёлые
+    события (chat_history, group_list, new_message...) бинарным вложением MessagePack
+    с временем в миллисекундах Unix; остальные — обычный JSON.
+    Формат соединения знает только его воркер, поэтому рассылки идут через комнаты
+    (они общие для воркеров при REDIS_URL): MessagePack-клиенты группы — в комнате
+    <группа>#msgpack, а для рассылки всем каждое соединение входит в wire#json или
+    wire#msgpack.
+    """
+
+    TIMESTAMP_FIELDS = frozenset({"created_at", "last_seen", "timestamp"})
+    ROOM_SUFFIX = "#msgpack"
+    JSON_ROOM = "wire#json"
+    MSGPACK_ROOM = "wire#msgpack"
+
+    def __init__(self):
+        self.allow_msgpack = False
+        self._msgpack_sids = set()
+
+    def init_app(self, app):
+        """SOCKETIO_WIRE_FORMAT: auto — согласовывать с клиентом, json — только JSON"""
+        wire_format = app.config.get("SOCKETIO_WIRE_FORMAT", "auto")
+        self.allow_msgpack = wire_format == "auto" and msgpack is not None
+
+    def negotiate(self, sid, requested):
+        """Запоминает формат соединения и возвращает выбранный ("msgpack" или "json")"""
+        if requested == "msgpack" and self.allow_msgpack:
+            self._msgpack_sids.add(sid)
+            socketio.server.enter_room(sid, self.MSGPACK_ROOM, namespace="/")
+            return "msgpack"
+        self._msgpack_sids.discard(sid)
+        socketio.server.enter_room(sid, self.JSON_ROOM, namespace="/")
+        return "json"
+
+    def forget(self, sid):
+        self._msgpack_sids.discard(sid)
+
+    def uses_msgpack(self, sid):
+        return sid in self._msgpack_sids
+
+    def room(self, sid, room):
+        """Комната группы для соединения: MessagePack-клиенты живут в отдельной"""
+        return f"{room}{self.ROOM_SUFFIX}" if sid in self._msgpack_sids else room
+
+    def encode(self, payload):
+        """Кодирует полезную нагрузку в MessagePack (ISO-время → миллисекунды Unix)"""
+        return msgpack.packb(_epoch(payload), use_bin_type=True)
+
+    def for_sid(self, sid, payload):
+        """Нагрузка в формате, согласованном с соединением"""
+        return self.encode(payload) if sid in self._msgpack_sids else payload
+
+    def emit_to_room(self, event, payload, room):
+        """
+        Рассылка в комнату группы: JSON и, если MessagePack разрешён, в её #msgpack-комнату —
+        всегда, а не по локальным клиентам: они могут быть подключены к другому воркеру
+        """
+        socketio.emit(event, payload, to=room)
+        if self.allow_msgpack:
+            socketio.emit(event, self.encode(payload), to=f"{room}{self.ROOM_SUFFIX}")
+
+    def broadcast(self, event, payload):
+        """Рассылка всем подключённым с учётом формата каждого соединения (на всех воркерах)"""
+        if not self.allow_msgpack:
+            socketio.emit(event, payload)
+            return
+        socketio.emit(event, payload, to=self.JSON_ROOM)
+        socketio.emit(event, self.encode(payload), to=self.MSGPACK_ROOM)
+
+
+# Поля со временем и поля, в которых лежат вложенные объекты кадров
+_TIMESTAMP_FIELDS = WireCodec.TIMESTAMP_FIELDS
+_NESTED_FIELDS = frozenset({"messages", "user", "groups"})
+_MAPPING_FIELDS = frozenset({"users"})  # uuid → пользователь (Message.pack_page)
+_EPOCH = datetime(1970, 1, 1)
+_MILLISECOND = timedelta(milliseconds=1)
+
+
+def _epoch(value):
+    """Копия кадра, в которой время заменено миллисекундами Unix (обходятся только известные поля)"""
+    if type(value) is list:
+        return [_epoch(item) for item in value]
+    if type(value) is not dict:
+        return value
+    result = dict(value)
+    for key in _TIMESTAMP_FIELDS.intersection(result):
+        result[key] = _to_millis(result[key])
+    for key in _NESTED_FIELDS.intersection(result):
+        result[key] = _epoch(result[key])
+    for key in _MAPPING_FIELDS.intersection(result):
+        result[key] = {item_key: _epoch(item) for item_key, item in result[key].items()}
+    return result
+
+
+def _to_millis(value):
+    """ISO-строка или datetime (UTC без пояса, как в БД) → миллисекунды Unix"""
+    if type(value) is str:
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return value
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return (value - _EPOCH) // _MILLISECOND
+    return value
+
+
+wire = WireCodec()
+
+
 # --- E2E Encryption (end-to-end) ---
+DECRYPT_ERROR_TEXT = "[Ошибка расшифровки]"
+# Значение Message.encryption_key у сообщений, зашифрованных на сервере: "at-rest:v<версия>"
+AT_REST_PREFIX = "at-rest:v"
+
+
 class EncryptionManager:
     """Менеджер шифрования для сообщений и файлов."""
 
@@ -32,7 +160,26 @@ class EncryptionManager:
             with open(self.key_path, "rb") as f:
                 key = f.read()
 
-        self.cipher = Fernet(key)
+        self.key = key
+        self.cipher = get_cipher(key)
+
+        # Версионированные ключи для шифрования сообщений в БД (MESSAGE_ENCRYPTION_AT_REST)
+        self.at_rest = False
+        self.algorithm = "aes-gcm"
+        self.refresh_interval = 1.0
+        self._next_refresh = 0.0
+        self.engine = AeadEngine(Keyring(os.path.join(os.path.dirname(self.key_path), "keyring.json")))
+
+    def init_app(self, app):
+        """Читает настройки; при включённом at-rest шифровании создаёт первый ключ"""
+        self.at_rest = app.config.get("MESSAGE_ENCRYPTION_AT_REST", False)
+        self.algorithm = app.config.get("CRYPTO_ALGORITHM", "aes-gcm")
+        self.refresh_interval = app.config.get("CRYPTO_KEYRING_REFRESH_SECONDS", 1.0)
+        keyring_path = app.config.get("CRYPTO_KEYRING_PATH")
+        if keyring_path:
+            self.engine = AeadEngine(Keyring(keyring_path))
+        if self.at_rest and self.engine.keyring.active is None:
+            self.engine.keyring.add_key(self.algorithm)
 
     def encrypt(self, data: str) -> str:
         """Шифрует строку и возвращает base64-текст."""
@@ -41,9 +188,54 @@ class EncryptionManager:
     def decrypt(self, token: str) -> str:
         """Расшифровывает строку, если возможно."""
         try:
-            return self.cipher.decrypt(token.encode()).decode()
+            if token.startswith(("gAAAAA", "Z0FBQUFB")):
+                # Токен Fernet (в том числе старый, с двойным base64)
+                return decrypt_message(token, self.key)
+            return self.engine.decrypt(token)
         except Exception:
-            return "[Ошибка расшифровки]"
+            return DECRYPT_ERROR_TEXT
+
+    def encrypt_many(self, items) -> list:
+        """Шифрует пакет строк (большой пакет — в пуле потоков)."""
+        return encrypt_many(items, self.key)
+
+    def decrypt_many(self, tokens) -> list:
+        """Расшифровывает пакет токенов; ошибочные заменяются текстом-заглушкой."""
+        return decrypt_many(tokens, self.key, default=DECRYPT_ERROR_TEXT)
+
+    # --- Шифрование сообщений в БД ---
+    @staticmethod
+    def is_at_rest(encryption_key) -> bool:
+        return bool(encryption_key) and encryption_key.startswith(AT_REST_PREFIX)
+
+    def key_tag(self, version=None) -> str:
+        return f"{AT_REST_PREFIX}{self.engine.keyring.active if version is None else version}"
+
+    def seal(self, text: str) -> dict:
+        """Колонки content/is_encrypted/encryption_key для новой строки messages"""
+        if not self.at_rest:
+            return {"content": text, "is_encrypted": False, "encryption_key": None}
+        # Ротация в другом процессе могла сменить активную версию; stat файла — не чаще
+        # раза в CRYPTO_KEYRING_REFRESH_SECONDS (старый ключ читается весь льготный период)
+        now = time.monotonic()
+        if now >= self._next_refresh:
+            self._next_refresh = now + self.refresh_interval
+            self.engine.keyring.refresh()
+        version = self.engine.keyring.active
+        return {
+            "content": self.engine.encrypt(text, version),
+            "is_encrypted": True,
+            "encryption_key": self.key_tag(version),
+        }
+
+    def open(self, token: str) -> str:
+        try:
+            return self.engine.decrypt(token)
+        except Exception:
+            return DECRYPT_ERROR_TEXT
+
+    def open_many(self, tokens) -> list:
+        return self.engine.decrypt_many(tokens, default=DECRYPT_ERROR_TEXT)
 
 
 # Инициализируем менеджер при запуске приложения
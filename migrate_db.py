@@ -1,9 +1,9 @@
 import os
 import sqlite3
-from app import create_app
+from sqlalchemy import inspect, text
+from app import app
 from extensions import db
 
-app = create_app()
 
 def migrate_database():
     with app.app_context():
@@ -113,5 +113,68 @@ def migrate_database():
                 except:
                     print("⚠️ Не удалось восстановить резервную копию")
 
+
+def apply_schema_updates():
+    """
+    Добавляет новые колонки и индексы в существующие таблицы
+    (db.create_all создаёт только отсутствующие таблицы). Работает и с SQLite, и с PostgreSQL.
+    """
+    with app.app_context():
+        inspector = inspect(db.engine)
+        tables = inspector.get_table_names()
+
+        with db.engine.begin() as conn:
+            # Составной индекс для keyset-пагинации истории
+            if 'messages' in tables:
+                conn.execute(text(
+                    'CREATE INDEX IF NOT EXISTS ix_messages_group_id_id ON messages (group_id, id)'
+                ))
+                print("✅ Индекс ix_messages_group_id_id проверен/создан")
+
+            # Хеш кодового слова в формате pbkdf2_sha256$... длиннее 64 символов
+            # (SQLite длину VARCHAR не проверяет)
+            if 'users' in tables and db.engine.dialect.name == 'postgresql':
+                conn.execute(text('ALTER TABLE users ALTER COLUMN codeword_hash TYPE VARCHAR(255)'))
+                print("✅ users.codeword_hash расширена до 255 символов")
+
+            # Ссылка сообщения на файл в контентно-адресуемом хранилище
+            if 'messages' in tables:
+                message_columns = [c['name'] for c in inspector.get_columns('messages')]
+                if 'file_id' not in message_columns:
+                    conn.execute(text(
+                        'ALTER TABLE messages ADD COLUMN file_id INTEGER REFERENCES stored_files(id)'
+                    ))
+                    print("✅ Добавлена колонка messages.file_id")
+
+            # Размеры изображения и превью файла в хранилище
+            if 'stored_files' in tables:
+                stored_columns = [c['name'] for c in inspector.get_columns('stored_files')]
+                for column, column_type in (('width', 'INTEGER'), ('height', 'INTEGER'),
+                                            ('thumbnail_path', 'VARCHAR(500)')):
+                    if column not in stored_columns:
+                        conn.execute(text(f'ALTER TABLE stored_files ADD COLUMN {column} {column_type}'))
+                        print(f"✅ Добавлена колонка stored_files.{column}")
+                if 'pinned' not in stored_columns:
+                    conn.execute(text(
+                        'ALTER TABLE stored_files ADD COLUMN pinned BOOLEAN NOT NULL DEFAULT FALSE'
+                    ))
+                    print("✅ Добавлена колонка stored_files.pinned")
+
+            # Денормализованный счётчик участников группы
+            if 'groups' in tables:
+                group_columns = [c['name'] for c in inspector.get_columns('groups')]
+                if 'member_count' not in group_columns:
+                    print("🔄 Добавляем колонку groups.member_count...")
+                    conn.execute(text(
+                        'ALTER TABLE groups ADD COLUMN member_count INTEGER NOT NULL DEFAULT 0'
+                    ))
+                    conn.execute(text(
+                        'UPDATE groups SET member_count = '
+                        '(SELECT COUNT(*) FROM user_groups WHERE user_groups.group_id = groups.id)'
+                    ))
+                    print("✅ groups.member_count заполнена")
+
+
 if __name__ == '__main__':
-    migrate_database()
\ No newline at end of file
+    migrate_database()
+    apply_schema_updates()
\ No newline at end of file
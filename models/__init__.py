@@ -2,5 +2,6 @@ from extensions import db
 
 from .user import User
 from .message import Message
+from .upload import UploadSession, StoredFile
 
-__all__ = ['db', 'User', 'Message']
\ No newline at end of file
+__all__ = ['db', 'User', 'Message', 'UploadSession', 'StoredFile']
\ No newline at end of file
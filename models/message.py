@@ -1,4 +1,5 @@
-from extensions import db
+from extensions import db, encryption
+from sqlalchemy.orm import joinedload
 import uuid
 from datetime import datetime
 
@@ -15,17 +16,25 @@ user_groups = db.Table(
 class Message(db.Model):
     """Модель сообщения с поддержкой E2E и файлов"""
     __tablename__ = 'messages'
+    __table_args__ = (
+        # Keyset-пагинация истории: WHERE group_id = ? AND id < ? ORDER BY id DESC
+        db.Index('ix_messages_group_id_id', 'group_id', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     uuid = db.Column(db.String(36), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
 
     content = db.Column(db.Text, nullable=False)  # Текст (возможно зашифрован)
     is_encrypted = db.Column(db.Boolean, default=False)
-    encryption_key = db.Column(db.String(500), nullable=True)  # Хранится только при необходимости
+    # Хранится только при необходимости; "at-rest:v<N>" — зашифровано на сервере ключом версии N
+    encryption_key = db.Column(db.String(500), nullable=True)
 
     message_type = db.Column(db.String(20), default='text')  # text / image / file / system
     file_url = db.Column(db.String(500), nullable=True)
     file_name = db.Column(db.String(255), nullable=True)
+    # Файл в хранилище (services/file_store.py); по нему ведётся StoredFile.ref_count
+    file_id = db.Column(db.Integer, db.ForeignKey('stored_files.id', ondelete='SET NULL'), nullable=True)
+    file = db.relationship('StoredFile', lazy='select')
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -34,19 +43,97 @@ class Message(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     group_id = db.Column(db.Integer, db.ForeignKey('groups.id', ondelete='CASCADE'), nullable=True)
 
-    def to_dict(self):
-        """Подготовка к JSON-ответу"""
-        return {
+    def to_dict(self, author=None):
+        """Подготовка к JSON-ответу (author — уже загруженный автор, чтобы не делать запрос)"""
+        if author is None and hasattr(self, 'author'):
+            author = self.author
+        content, is_encrypted = self.content, self.is_encrypted
+        if encryption.is_at_rest(self.encryption_key):
+            # Шифрование на сервере прозрачно для клиента (в отличие от E2E)
+            content = getattr(self, '_plaintext', None) or encryption.open(content)
+            is_encrypted = False
+        entry = {
+            'id': self.id,
             'uuid': self.uuid,
-            'content': self.content,
-            'is_encrypted': self.is_encrypted,
+            'content': content,
+            'is_encrypted': is_encrypted,
             'message_type': self.message_type,
             'file_url': self.file_url,
             'file_name': self.file_name,
             'created_at': self.created_at.isoformat(),
-            'user': self.author.to_dict() if hasattr(self, 'author') and self.author else None,
+            'user': author.to_dict() if author else None,
             'group_id': self.group_id
         }
+        # Превью и размеры — только у изображений, для которых превью уже готово
+        stored = self.file if self.file_id else None
+        if stored is not None and stored.thumbnail_path:
+            entry['thumbnail_url'] = f"/files/{stored.thumbnail_path}"
+            entry['width'] = stored.width
+            entry['height'] = stored.height
+        return entry
+
+    @classmethod
+    def history_page(cls, group_id, before_id=None, limit=50):
+        """
+        Страница истории группы (keyset-пагинация по (group_id, id)).
+        Возвращает (сообщения по возрастанию id, курсор для более старых или None).
+        """
+        # Авторов и файлы подтягиваем тем же запросом, иначе to_dict() делает lazy load на каждую строку
+        query = cls.query.options(joinedload(cls.author), joinedload(cls.file)).filter(cls.group_id == group_id)
+        if before_id is not None:
+            query = query.filter(cls.id < before_id)
+
+        # Берём на одну строку больше, чтобы узнать, есть ли ещё история
+        rows = query.order_by(cls.id.desc()).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        rows.reverse()
+
+        next_cursor = rows[0].id if has_more and rows else None
+        cls.open_rows(rows)
+        return rows, next_cursor
+
+    @classmethod
+    def history_since(cls, group_id, after_id, limit=500):
+        """
+        Сообщения группы новее after_id (догрузка после переподключения).
+        Возвращает (сообщения по возрастанию id, есть ли ещё более новые сверх limit).
+        """
+        rows = (
+            cls.query.options(joinedload(cls.author), joinedload(cls.file))
+            .filter(cls.group_id == group_id, cls.id > after_id)
+            .order_by(cls.id.asc())
+            .limit(limit + 1)
+            .all()
+        )
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        cls.open_rows(rows)
+        return rows, has_more
+
+    @staticmethod
+    def open_rows(rows):
+        """Расшифровывает сообщения, зашифрованные на сервере, одним пакетом (для to_dict)"""
+        sealed = [row for row in rows if encryption.is_at_rest(row.encryption_key)]
+        if sealed:
+            for row, text in zip(sealed, encryption.open_many([row.content for row in sealed])):
+                row._plaintext = text
+
+    @staticmethod
+    def pack_page(entries):
+        """
+        Упаковка страницы сериализованных сообщений: авторы выносятся в общий словарь
+        users (uuid → пользователь), в сообщении остаётся только user_uuid.
+        """
+        messages, users = [], {}
+        for entry in entries:
+            packed = dict(entry)
+            user = packed.pop('user', None)
+            packed['user_uuid'] = user['uuid'] if user else None
+            if user and user['uuid'] not in users:
+                users[user['uuid']] = user
+            messages.append(packed)
+        return messages, users
 
     def __repr__(self):
         return f"<Message {self.uuid} (user={self.user_id})>"
@@ -63,6 +150,8 @@ class Group(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     created_by = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'))
     is_private = db.Column(db.Boolean, default=False)
+    # Денормализованный счётчик: поддерживается в routes/groups.py при входе/выходе
+    member_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     messages = db.relationship(
         'Message',
@@ -79,13 +168,15 @@ class Group(db.Model):
     )
 
     def to_dict(self):
+        # id — ключ группы в Socket.IO-событиях (join_group, sync_groups, send_message)
         return {
+            'id': self.id,
             'uuid': self.uuid,
             'name': self.name,
             'description': self.description,
             'created_at': self.created_at.isoformat(),
             'is_private': self.is_private,
-            'member_count': self.members.count() if hasattr(self.members, 'count') else len(self.members)
+            'member_count': self.member_count or 0
         }
 
     def __repr__(self):
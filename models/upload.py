@@ -0,0 +1,63 @@
+from extensions import db
+import uuid
+from datetime import datetime
+
+
+class UploadSession(db.Model):
+    """Сессия загрузки файла по частям: сколько байт уже принято и куда они пишутся"""
+    __tablename__ = 'upload_sessions'
+
+    id = db.Column(db.Integer, primary_key=True)
+    uuid = db.Column(db.String(36), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
+
+    filename = db.Column(db.String(255), nullable=False)  # исходное имя файла
+    size = db.Column(db.BigInteger, nullable=False)       # ожидаемый размер в байтах
+    received = db.Column(db.BigInteger, nullable=False, default=0)  # подтверждённое смещение
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending / complete
+    file_url = db.Column(db.String(500), nullable=True)  # после завершения
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=True)
+
+    @property
+    def extension(self):
+        return self.filename.rsplit('.', 1)[1].lower() if '.' in self.filename else ''
+
+    def to_dict(self):
+        """Подготовка к JSON-ответу"""
+        return {
+            'upload_id': self.uuid,
+            'filename': self.filename,
+            'size': self.size,
+            'offset': self.received,
+            'status': self.status,
+            'url': self.file_url,
+        }
+
+    def __repr__(self):
+        return f"<UploadSession {self.uuid} {self.received}/{self.size}>"
+
+
+class StoredFile(db.Model):
+    """Файл в контентно-адресуемом хранилище: один экземпляр на SHA-256 содержимого"""
+    __tablename__ = 'stored_files'
+
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), unique=True, nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    path = db.Column(db.String(500), nullable=False)  # относительно корня хранилища: ab/cd/<sha256>.<ext>
+    # Денормализованный счётчик сообщений с этим файлом: поддерживается services/file_store.py
+    ref_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Перенесён из старых плоских загрузок (dedupe_uploads.py): на него могут ссылаться
+    # сообщения и страницы, которые ref_count не видит, — сборщик мусора его не трогает
+    pinned = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    # Для изображений: размеры оригинала и превью в WebP (заполняет services/thumbnails.py)
+    width = db.Column(db.Integer, nullable=True)
+    height = db.Column(db.Integer, nullable=True)
+    thumbnail_path = db.Column(db.String(500), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<StoredFile {self.sha256[:12]} refs={self.ref_count}>"
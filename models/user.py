@@ -1,7 +1,7 @@
 from extensions import db
 import uuid
 from datetime import datetime
-import hashlib
+from utils.crypto import hash_codeword, verify_codeword
 
 
 class User(db.Model):
@@ -12,7 +12,7 @@ class User(db.Model):
     uuid = db.Column(db.String(36), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
     
     # Храним хеш кодового слова для безопасности
-    codeword_hash = db.Column(db.String(64), nullable=False)  # SHA256 hash
+    codeword_hash = db.Column(db.String(255), nullable=False)  # pbkdf2_sha256$итерации$соль$хеш
     username = db.Column(db.String(50), nullable=False, unique=True)
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -47,12 +47,12 @@ class User(db.Model):
         return data
 
     def set_codeword(self, codeword):
-        """Установить хеш кодового слова"""
-        self.codeword_hash = hashlib.sha256(codeword.encode()).hexdigest()
+        """Установить хеш кодового слова (синхронно; в обработчиках — services.codeword_hasher)"""
+        self.codeword_hash = hash_codeword(codeword)
 
     def check_codeword(self, codeword):
-        """Проверить кодовое слово"""
-        return self.codeword_hash == hashlib.sha256(codeword.encode()).hexdigest()
+        """Проверить кодовое слово (понимает и старый несолёный SHA-256)"""
+        return verify_codeword(codeword, self.codeword_hash)
 
     def touch(self):
         """Обновить активность пользователя"""
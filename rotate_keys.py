@@ -0,0 +1,53 @@
+"""
+rotate_keys.py — ротация ключа шифрования сообщений в БД.
+Создаёт новую активную версию ключа и перешифровывает старые сообщения порциями;
+работающие процессы подхватывают новую версию из keyring без перезапуска.
+Запуск:
+    python rotate_keys.py [--algorithm chacha20-poly1305] [--chunk 500]
+    python rotate_keys.py --resume   # только доделать прерванную перешифровку
+"""
+
+import argparse
+import os
+import time
+
+# Перешифровкой занимается сам скрипт, фоновое продолжение при старте не нужно
+os.environ["CRYPTO_ROTATION_RESUME"] = "false"
+
+from app import app
+from extensions import encryption
+from services.key_rotation import key_rotation
+
+
+def rotate(algorithm, chunk_size, resume):
+    key_rotation.batch_size = chunk_size
+    key_rotation.pause = 0
+
+    keyring = encryption.engine.keyring
+    if resume:
+        if keyring.active is None:
+            print("❌ В keyring нет ключей")
+            return
+    else:
+        version = keyring.add_key(algorithm or app.config.get("CRYPTO_ALGORITHM", "aes-gcm"))
+        print(f"🔑 Активная версия ключа: {version} ({keyring.algorithm(version)})")
+
+    started = time.time()
+
+    def progress(done, last_id):
+        print(f"  … перешифровано {done:,} (до id {last_id:,})")
+
+    total = key_rotation.reencrypt(progress=progress)
+    print(f"✅ Перешифровано сообщений: {total:,} за {time.time() - started:.1f}s, "
+          f"версии ключей: {keyring.versions()}")
+    if key_rotation.failed:
+        print(f"⚠️ Не удалось расшифровать: {key_rotation.failed}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rotate the at-rest message encryption key")
+    parser.add_argument("--algorithm", choices=["aes-gcm", "chacha20-poly1305", "fernet"], default=None)
+    parser.add_argument("--chunk", type=int, default=500, help="строк в одной транзакции")
+    parser.add_argument("--resume", action="store_true", help="не создавать новый ключ")
+    args = parser.parse_args()
+    rotate(args.algorithm, args.chunk, args.resume)
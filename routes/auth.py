@@ -1,8 +1,10 @@
 from flask import Blueprint, request, jsonify, session, render_template
 from extensions import db
 from models.user import User
+from services.socket_identity import socket_registry
+from services.presence import presence
+from services.codeword_hasher import codeword_hasher, HasherBusy
 import uuid
-import hashlib
 
 bp_auth = Blueprint("auth", __name__, url_prefix="/auth")
 
@@ -40,20 +42,34 @@ def join_chat():
             if not user:
                 return jsonify({"success": False, "error": "Пользователь не найден"}), 404
             
-            # Проверяем кодовое слово через метод модели
-            if not user.check_codeword(codeword):
+            # PBKDF2 считается в пуле потоков — остальные соединения не ждут
+            if not codeword_hasher.verify(codeword, user.codeword_hash):
                 return jsonify({"success": False, "error": "Неверное кодовое слово"}), 401
 
+            # Хеш старого формата (несолёный SHA-256) заменяем при успешном входе;
+            # пул занят — вход не срываем, хеш обновится при следующем входе
+            if codeword_hasher.needs_rehash(user.codeword_hash):
+                try:
+                    user.codeword_hash = codeword_hasher.hash(codeword)
+                except HasherBusy:
+                    pass
+
             # Обновляем имя пользователя, если предоставлено и оно уникально
+            renamed = False
             if username and username != user.username:
                 existing_user = User.query.filter_by(username=username).first()
                 if existing_user and existing_user.uuid != user_uuid:
                     return jsonify({"success": False, "error": "Имя пользователя уже занято"}), 400
                 user.username = username
+                renamed = True
 
             user.touch()
             db.session.commit()
 
+            # Сокеты пользователя перечитают новое имя при следующем событии
+            if renamed:
+                socket_registry.invalidate_user(user.uuid)
+
             _store_user_session(user)
             return jsonify({
                 "success": True,
@@ -68,8 +84,7 @@ def join_chat():
             return jsonify({"success": False, "error": "Имя пользователя уже занято"}), 400
 
         # Создаем нового пользователя
-        new_user = User(username=username)
-        new_user.set_codeword(codeword)  # Устанавливаем хеш кодового слова
+        new_user = User(username=username, codeword_hash=codeword_hasher.hash(codeword))
         new_user.is_online = True
         
         db.session.add(new_user)
@@ -83,6 +98,12 @@ def join_chat():
             "message": "Новый пользователь создан!"
         })
 
+    except HasherBusy:
+        db.session.rollback()
+        response = jsonify({"success": False, "error": "Сервер перегружен, повторите вход позже"})
+        response.headers["Retry-After"] = "1"
+        return response, 503
+
     except Exception as e:
         db.session.rollback()
         return jsonify({"success": False, "error": f"Ошибка сервера: {str(e)}"}), 500
@@ -101,8 +122,8 @@ def get_current_user():
         session.clear()
         return jsonify({"success": False, "error": "Пользователь не найден"}), 404
 
-    user.touch()
-    db.session.commit()
+    # last_seen попадёт в БД со следующим пакетным сбросом presence
+    presence.touch(user)
     return jsonify({"success": True, "user": user.to_dict()})
 
 
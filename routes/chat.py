@@ -1,8 +1,17 @@
-from flask import Blueprint, render_template, request
+from flask import Blueprint, render_template, request, session, current_app
 from flask_socketio import emit, join_room, leave_room
-from extensions import db, socketio
+from extensions import db, socketio, wire, encryption
 from models.message import Message, Group
 from models.user import User
+from services.message_writer import message_writer
+from services.message_cache import message_cache, history_page_size
+from services.socket_identity import socket_registry
+from services.presence import presence
+from services.fanout import fanout
+from services.group_directory import group_directory, group_key
+from services.file_store import file_store
+from services.rate_limit import rate_limiter
+from services.metrics import metrics
 from datetime import datetime
 import uuid
 
@@ -16,24 +25,145 @@ def index():
     return render_template("index.html")
 
 
+# ==========================
+#  ИСТОРИЯ СООБЩЕНИЙ
+# ==========================
+def _history_payload(group_id, entries, next_cursor, **extra):
+    """Кадр истории: страница сообщений, словарь авторов и курсор для подгрузки более старых"""
+    messages, users = Message.pack_page(entries)
+    payload = {
+        "group_id": group_id,
+        "messages": messages,
+        "users": users,
+        "next_cursor": next_cursor,
+        "has_more": next_cursor is not None,
+    }
+    payload.update(extra)
+    return payload
+
+
+def _send_history(group_id, data):
+    """
+    Отправляет chat_history при входе в группу.
+    Если клиент передал last_id (последнее увиденное сообщение), отдаём только
+    пропущенные сообщения (delta=True). Если пропущено больше CHAT_RESYNC_MAX_GAP —
+    последнюю страницу с gap=True: остальное клиент догружает через load_older.
+    """
+    last_id = data.get("last_id")
+    extra = {}
+    if last_id is not None:
+        try:
+            last_id = int(last_id)
+        except (TypeError, ValueError):
+            last_id = None
+
+    if last_id is not None:
+        max_gap = current_app.config.get("CHAT_RESYNC_MAX_GAP", 500)
+        entries, complete = message_cache.history_since(group_id, last_id, max_gap)
+        if complete:
+            emit("chat_history", wire.for_sid(request.sid, _history_payload(
+                group_id, entries, None, delta=True, since_id=last_id
+            )))
+            return
+        extra = {"gap": True, "since_id": last_id}
+
+    # Отдаём только последнюю страницу, остальное — через load_older
+    entries, next_cursor = message_cache.history_page(
+        group_id, limit=history_page_size(data.get("limit"))
+    )
+    emit("chat_history", wire.for_sid(request.sid, _history_payload(group_id, entries, next_cursor, **extra)))
+
+
+def _confirm_saved(sid):
+    """Колбэк write-behind: подтверждает отправителю, что сообщение записано в БД"""
+    def on_saved(row, message_id):
+        if message_id is None:
+            # Строка отброшена писателем: убираем её из кэша истории и сообщаем отправителю
+            message_cache.invalidate(row["group_id"])
+            socketio.emit("message_failed", wire.for_sid(sid, {
+                "message_uuid": row["uuid"],
+                "group_id": row["group_id"],
+            }), to=sid)
+            return
+        message_cache.set_id(row["group_id"], row["uuid"], message_id)
+        socketio.emit("message_saved", wire.for_sid(sid, {
+            "id": message_id,
+            "message_uuid": row["uuid"],
+            "group_id": row["group_id"],
+        }), to=sid)
+    return on_saved
+
+
+def _resolve_identity(user_uuid, username=None):
+    """Пользователь текущего соединения: из реестра по sid или (один раз) из БД"""
+    identity = socket_registry.get(request.sid, user_uuid)
+    if identity is not None:
+        return identity
+
+    user = User.query.filter_by(uuid=user_uuid).first()
+    if not user:
+        if not username:
+            return None
+        user = User(uuid=user_uuid, username=username)
+        db.session.add(user)
+        db.session.commit()
+
+    identity = socket_registry.register(request.sid, user)
+    presence.connect(identity, request.sid)
+    return identity
+
+
 # ==========================
 #  SOCKET.IO ОБРАБОТЧИКИ
 # ==========================
 def init_socket_handlers(socketio, db):
-    """Инициализация всех событий сокета"""
+    """
+    Инициализация всех событий сокета. Каждый обработчик измеряется metrics.track
+    (services/metrics.py), а кроме connect/disconnect — проходит через rate_limiter:
+    лимит события — RATE_LIMITS (services/rate_limit.py).
+    """
 
     # --- Подключение клиента ---
     @socketio.on("connect")
-    def handle_connect():
+    @metrics.track("connect")
+    def handle_connect(auth=None):
         print(f"✅ Client connected: {request.sid}")
-        emit("connected", {"message": "Connected to chat server"})
+
+        auth = auth if isinstance(auth, dict) else {}
+        codec = wire.negotiate(request.sid, auth.get("codec"))
+
+        # Определяем пользователя один раз на всё соединение
+        user_uuid = auth.get("uuid") or session.get("user_uuid")
+        if user_uuid:
+            user = User.query.filter_by(uuid=user_uuid).first()
+            if user:
+                identity = socket_registry.register(request.sid, user)
+                presence.connect(identity, request.sid)
+
+        emit("connected", {"message": "Connected to chat server", "codec": codec})
 
     @socketio.on("disconnect")
+    @metrics.track("disconnect")
     def handle_disconnect():
+        socket_registry.remove(request.sid)
+        presence.disconnect(request.sid)
+        wire.forget(request.sid)
+        rate_limiter.forget(request.sid)
         print(f"⚠️ Client disconnected: {request.sid}")
 
+    # --- Heartbeat клиента (обновляет last_seen) ---
+    @socketio.on("heartbeat")
+    @metrics.track("heartbeat")
+    @rate_limiter.limit("heartbeat")
+    def handle_heartbeat(data=None):
+        identity = socket_registry.get(request.sid)
+        if identity is not None:
+            presence.heartbeat(identity)
+
     # --- Авторизация пользователя ---
     @socketio.on("user_connected")
+    @metrics.track("user_connected")
+    @rate_limiter.limit("user_connected")
     def handle_user_connected(data):
         username = data.get("username")
         user_uuid = data.get("uuid")
@@ -43,18 +173,16 @@ def init_socket_handlers(socketio, db):
             return
 
         # Проверяем или создаем пользователя
-        user = User.query.filter_by(uuid=user_uuid).first()
-        if not user:
-            user = User(uuid=user_uuid, username=username)
-            db.session.add(user)
-            db.session.commit()
+        _resolve_identity(user_uuid, username)
 
         # Отправляем список групп при подключении
         groups = Group.query.all()
-        emit("group_list", [g.to_dict() for g in groups])
+        emit("group_list", wire.for_sid(request.sid, [g.to_dict() for g in groups]))
 
     # --- Создание новой группы ---
     @socketio.on("create_group")
+    @metrics.track("create_group")
+    @rate_limiter.limit("create_group")
     def handle_create_group(data):
         name = data.get("name", "").strip()
         if not name:
@@ -70,68 +198,155 @@ def init_socket_handlers(socketio, db):
         db.session.add(new_group)
         db.session.commit()
 
-        emit("group_created", new_group.to_dict(), broadcast=True)
+        wire.broadcast("group_created", new_group.to_dict())
 
     # --- Присоединение к группе ---
     @socketio.on("join_group")
+    @metrics.track("join_group")
+    @rate_limiter.limit("join_group")
     def handle_join_group(data):
-        group_id = data.get("group_id")
-        if not group_id:
+        # Один ключ группы (int) для комнаты, кэша истории и рассылки — см. group_key
+        group_id = group_key(data.get("group_id"))
+        if group_id is None:
             emit("error", {"error": "Не указан ID группы"})
             return
 
-        join_room(group_id)
+        join_room(wire.room(request.sid, group_id))
         print(f"👥 User {request.sid} joined group {group_id}")
+        _send_history(group_id, data)
+
+    # --- Повторный вход в несколько групп после переподключения ---
+    @socketio.on("sync_groups")
+    @metrics.track("sync_groups")
+    @rate_limiter.limit("sync_groups")
+    def handle_sync_groups(data):
+        """data: {"groups": [{"group_id": ..., "last_id": ...}, ...]}"""
+        groups = data.get("groups") or []
+        if not isinstance(groups, list):
+            emit("error", {"error": "Некорректный список групп"})
+            return
+
+        for item in groups:
+            group_id = group_key(item.get("group_id")) if isinstance(item, dict) else None
+            if group_id is None:
+                continue
+            join_room(wire.room(request.sid, group_id))
+            _send_history(group_id, item)
+
+    # --- Подгрузка более старых сообщений ---
+    @socketio.on("load_older")
+    @metrics.track("load_older")
+    @rate_limiter.limit("load_older")
+    def handle_load_older(data):
+        group_id = group_key(data.get("group_id"))
+        cursor = data.get("cursor")
+        if group_id is None or cursor is None:
+            emit("error", {"error": "Не указан ID группы или курсор"})
+            return
 
-        messages = (
-            Message.query.filter_by(group_id=group_id)
-            .order_by(Message.timestamp.asc())
-            .all()
+        try:
+            before_id = int(cursor)
+        except (TypeError, ValueError):
+            emit("error", {"error": "Некорректный курсор"})
+            return
+
+        messages, next_cursor = message_cache.history_page(
+            group_id, before_id=before_id, limit=history_page_size(data.get("limit"))
         )
-        emit("chat_history", [m.to_dict() for m in messages])
+        emit("older_messages", wire.for_sid(request.sid, _history_payload(group_id, messages, next_cursor)))
 
     # --- Отправка сообщения ---
     @socketio.on("send_message")
+    @metrics.track("send_message")
+    @rate_limiter.limit("send_message")
     def handle_send_message(data):
         text = data.get("text", "").strip()
         group_id = data.get("group_id")
         sender_name = data.get("sender")
         sender_uuid = data.get("uuid")
+        file_url = data.get("file_url")
 
-        if not text or not group_id or not sender_uuid:
+        if (not text and not file_url) or not group_id or not sender_uuid:
             emit("error", {"error": "Неполные данные сообщения"})
             return
 
-        user = User.query.filter_by(uuid=sender_uuid).first()
-        if not user:
-            user = User(uuid=sender_uuid, username=sender_name)
-            db.session.add(user)
-            db.session.commit()
+        # Проверяем до записи: строка с неверной группой при write-behind сломала бы всю пачку.
+        # Существование — по id групп в памяти процесса, без запроса на каждое сообщение
+        group_pk = group_key(group_id)
+        if group_pk is None:
+            emit("error", {"error": "Некорректный ID группы"})
+            return
+        if not group_directory.exists(group_pk):
+            emit("error", {"error": "Группа не найдена"})
+            return
 
-        msg = Message(
-            uuid=str(uuid.uuid4()),
-            group_id=group_id,
-            user_id=user.id,
-            content=text,
-            timestamp=datetime.utcnow()
-        )
-        db.session.add(msg)
-        db.session.commit()
+        user = _resolve_identity(sender_uuid, sender_name)
+        if user is None:
+            emit("error", {"error": "Пользователь не найден"})
+            return
+
+        # Вложение — только файл из хранилища (ссылки считаются в StoredFile.ref_count)
+        stored = file_store.find_by_url(file_url) if file_url else None
+        if file_url and stored is None:
+            emit("error", {"error": "Файл не найден"})
+            return
+
+        row = {
+            "uuid": str(uuid.uuid4()),
+            "group_id": group_pk,
+            "user_id": user.user_id,
+            "message_type": file_store.message_type_for(stored) if stored else "text",
+            "file_id": stored.id if stored else None,
+            "file_url": file_store.url_for(stored) if stored else None,
+            "file_name": ((data.get("file_name") or "").strip()[:255] or None) if stored else None,
+            "created_at": datetime.utcnow(),
+            # content/is_encrypted/encryption_key (при MESSAGE_ENCRYPTION_AT_REST — шифртекст)
+            **encryption.seal(text),
+        }
+
+        msg = Message(**row)
+        msg._plaintext = text
+        msg.file = stored  # to_dict() берёт превью из уже загруженного файла
+        if message_writer.enabled:
+            # Рассылаем сразу, в БД сообщение попадёт со следующей пачкой
+            entry = msg.to_dict(author=user)
+            message_writer.enqueue(row, on_saved=_confirm_saved(request.sid))
+            if stored:
+                file_store.acquire(stored.id)
+                db.session.commit()
+        else:
+            db.session.add(msg)
+            if stored:
+                file_store.acquire(stored.id)
+            db.session.flush()
+            # Сериализуем до commit, пока объекты не истекли
+            entry = msg.to_dict(author=user)
+            db.session.commit()
+        message_id = entry["id"]
+        message_cache.append(group_pk, entry)
 
         payload = {
+            "id": message_id,
+            "message_uuid": row["uuid"],
             "text": text,
+            "message_type": row["message_type"],
+            "file_url": row["file_url"],
+            "file_name": row["file_name"],
+            "thumbnail_url": entry.get("thumbnail_url"),
             "sender": sender_name,
             "uuid": sender_uuid,
-            "group_id": group_id,
-            "timestamp": msg.timestamp.isoformat()
+            "group_id": group_pk,
+            "timestamp": row["created_at"].isoformat()
         }
-        emit("new_message", payload, room=group_id)
+        fanout.publish(group_pk, payload)
 
     # --- Выход из группы ---
     @socketio.on("leave_group")
+    @metrics.track("leave_group")
+    @rate_limiter.limit("leave_group")
     def handle_leave_group(data):
-        group_id = data.get("group_id")
-        if not group_id:
+        group_id = group_key(data.get("group_id"))
+        if group_id is None:
             return
-        leave_room(group_id)
+        leave_room(wire.room(request.sid, group_id))
         print(f"🚪 User {request.sid} left group {group_id}")
@@ -0,0 +1,98 @@
+import mimetypes
+import os
+import re
+from flask import Blueprint, request, abort, current_app, Response
+from werkzeug.utils import send_file
+from services.file_store import file_store
+
+bp_files = Blueprint('files', __name__)
+
+# Адрес файла в хранилище: ab/cd/<sha256>.<ext> — имя и есть хеш содержимого;
+# превью изображения: ab/cd/<sha256>.t<size>.webp
+STORED_PATH_RE = re.compile(
+    r'^([0-9a-f]{2})/([0-9a-f]{2})/(([0-9a-f]{64})(\.t\d{1,4})?(?:\.[a-z0-9]{1,10})?)$'
+)
+# Содержимое по такому адресу никогда не меняется
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# Открываются в браузере (inline) только медиа; SVG — картинка со скриптами, его скачиваем
+INLINE_MIME_PREFIXES = ('image/', 'video/', 'audio/')
+INLINE_MIME_EXCLUDED = {'image/svg+xml'}
+_UNSAFE_NAME_CHARS = re.compile(r'[\x00-\x1f\x7f/\\"]')
+
+
+def _download_name(requested, stored_name):
+    """
+    Имя для Content-Disposition из ?name=: без путей и управляющих символов, с
+    расширением хранимого файла (тип ответа всё равно берётся только из него)
+    """
+    stored_ext = os.path.splitext(stored_name)[1]
+    name = _UNSAFE_NAME_CHARS.sub('_', requested or '').strip(' .')[:200]
+    if not name:
+        return stored_name
+    if os.path.splitext(name)[1].lower() != stored_ext:
+        name += stored_ext
+    return name
+
+
+@bp_files.route('/files/<path:stored_path>', methods=['GET', 'HEAD'])
+def download_file(stored_path):
+    """
+    Отдача файла из хранилища: Range/206, сильный ETag (SHA-256), immutable-кэширование.
+    Тип содержимого — только по расширению хранимого файла; ?name= задаёт лишь имя в
+    Content-Disposition. Всё, кроме изображений, видео и аудио, отдаётся как attachment.
+    Режим FILES_SENDFILE_MODE:
+      wsgi       — полное тело отдаёт сервер через wsgi.file_wrapper (gunicorn — sendfile()),
+                   а Range-ответы Werkzeug читает и отдаёт из Python кусками;
+      x-accel    — заголовок X-Accel-Redirect, файл отдаёт nginx из FILES_ACCEL_PREFIX;
+      x-sendfile — заголовок X-Sendfile (Apache mod_xsendfile, lighttpd).
+    В режимах x-accel и x-sendfile приложение отвечает само только 304, Range — дело прокси.
+    """
+    match = STORED_PATH_RE.match(stored_path)
+    if not match or match.group(1) != match.group(4)[:2] or match.group(2) != match.group(4)[2:4]:
+        abort(404)
+    # У превью свой ETag: тот же хеш оригинала с размером превью
+    digest = match.group(4) + (match.group(5) or '')
+
+    full_path = os.path.join(file_store.root, *stored_path.split('/'))
+    if not os.path.isfile(full_path):
+        abort(404)
+
+    mode = current_app.config.get('FILES_SENDFILE_MODE', 'wsgi')
+    stored_name = match.group(3)
+    download_name = _download_name(request.args.get('name'), stored_name)
+    mimetype = mimetypes.guess_type(stored_name)[0] or 'application/octet-stream'
+    inline = mimetype.startswith(INLINE_MIME_PREFIXES) and mimetype not in INLINE_MIME_EXCLUDED
+    as_attachment = request.args.get('download') == '1' or not inline
+
+    if mode in ('x-accel', 'x-sendfile') and request.if_none_match.contains(digest):
+        response = Response(status=304)
+    elif mode == 'x-accel':
+        response = Response(mimetype=mimetype)
+        response.headers.set(
+            'Content-Disposition', 'attachment' if as_attachment else 'inline', filename=download_name
+        )
+        response.headers['X-Accel-Redirect'] = current_app.config.get(
+            'FILES_ACCEL_PREFIX', '/protected-uploads/'
+        ) + stored_path
+    else:
+        response = send_file(
+            full_path, request.environ,
+            mimetype=mimetype,
+            download_name=download_name,
+            as_attachment=as_attachment,
+            # С X-Sendfile Range обрабатывает прокси: 206 от Werkzeug с пустым телом ему противоречит
+            conditional=(mode != 'x-sendfile'),
+            etag=digest,
+            use_x_sendfile=(mode == 'x-sendfile'),
+            max_age=IMMUTABLE_MAX_AGE,
+        )
+    if response.status_code != 304:
+        # Клиент сразу знает, что перемотка медиа возможна частичными запросами
+        response.accept_ranges = 'bytes'
+
+    response.set_etag(digest)
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    response.cache_control.public = True
+    response.cache_control.max_age = IMMUTABLE_MAX_AGE
+    response.cache_control.immutable = True
+    return response
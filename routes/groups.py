@@ -2,6 +2,10 @@ from flask import Blueprint, request, jsonify, session
 from extensions import db
 from models.user import User
 from models.message import Message, Group
+from services.message_cache import message_cache, history_page_size
+from services.file_store import file_store
+from services.group_directory import group_directory
+from sqlalchemy import func, select
 from datetime import datetime
 import uuid
 
@@ -38,6 +42,30 @@ def get_group(group_uuid):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@bp_groups.route('/api/groups/<uuid:group_uuid>/messages', methods=['GET'])
+def get_group_messages(group_uuid):
+    """История группы постранично: ?before=<курсор>&limit=<размер страницы>"""
+    try:
+        group = Group.query.filter_by(uuid=str(group_uuid)).first()
+        if not group:
+            return jsonify({'error': 'Группа не найдена'}), 404
+
+        before_id = request.args.get('before', type=int)
+        entries, next_cursor = message_cache.history_page(
+            group.id, before_id=before_id, limit=history_page_size(request.args.get('limit'))
+        )
+        messages, users = Message.pack_page(entries)
+        return jsonify({
+            'success': True,
+            'messages': messages,
+            'users': users,
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @bp_groups.route('/api/groups', methods=['POST'])
 def create_group():
     """Создание новой группы"""
@@ -71,6 +99,7 @@ def create_group():
         
         # Добавляем создателя как участника
         new_group.members.append(creator)
+        new_group.member_count = 1
         db.session.commit()
         
         # Системное сообщение о создании группы
@@ -82,6 +111,7 @@ def create_group():
         )
         db.session.add(system_message)
         db.session.commit()
+        message_cache.invalidate(system_message.group_id)
         
         return jsonify({
             'success': True,
@@ -112,6 +142,7 @@ def join_group(group_uuid):
             return jsonify({'message': 'Уже в группе'}), 200
         
         group.members.append(user)
+        group.member_count = Group.member_count + 1
         db.session.commit()
         
         # Системное сообщение о присоединении
@@ -123,6 +154,7 @@ def join_group(group_uuid):
         )
         db.session.add(system_message)
         db.session.commit()
+        message_cache.invalidate(system_message.group_id)
         
         return jsonify({
             'success': True,
@@ -152,6 +184,7 @@ def leave_group(group_uuid):
             return jsonify({'message': 'Пользователь не состоит в группе'}), 400
         
         group.members.remove(user)
+        group.member_count = Group.member_count - 1
         db.session.commit()
         
         # Системное сообщение о выходе
@@ -163,6 +196,7 @@ def leave_group(group_uuid):
         )
         db.session.add(system_message)
         db.session.commit()
+        message_cache.invalidate(system_message.group_id)
         
         return jsonify({
             'success': True,
@@ -191,8 +225,19 @@ def delete_group(group_uuid):
         if group.created_by != user.id:
             return jsonify({'error': 'Только создатель может удалить группу'}), 403
         
+        group_id = group.id
+        # Сообщения удалятся каскадом — вложения теряют ссылки
+        attachments = db.session.execute(
+            select(Message.file_id, func.count())
+            .where(Message.group_id == group_id, Message.file_id.isnot(None))
+            .group_by(Message.file_id)
+        ).all()
+        for file_id, count in attachments:
+            file_store.release(file_id, count)
         db.session.delete(group)
         db.session.commit()
+        message_cache.invalidate(group_id)
+        group_directory.discard(group_id)
         
         return jsonify({
             'success': True,
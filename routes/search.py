@@ -0,0 +1,74 @@
+from flask import Blueprint, request, jsonify, session
+from sqlalchemy.orm import joinedload
+from models.user import User
+from models.message import Message, Group
+from services.search_index import search_index
+
+bp_search = Blueprint('search', __name__)
+
+SEARCH_MAX_PER_PAGE = 50
+
+
+@bp_search.route('/api/search', methods=['GET'])
+def search_messages():
+    """
+    Полнотекстовый поиск по сообщениям.
+    ?q=<запрос>&group=<uuid группы>&page=<номер страницы>&per_page=<размер страницы>
+    """
+    try:
+        user_uuid = session.get('user_uuid')
+        if not user_uuid:
+            return jsonify({'error': 'Не авторизован'}), 401
+
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'error': 'Пустой поисковый запрос'}), 400
+
+        user = User.query.filter_by(uuid=user_uuid).first()
+        if not user:
+            return jsonify({'error': 'Пользователь не найден'}), 404
+
+        group_id = None
+        group_uuid = request.args.get('group')
+        if group_uuid:
+            group = Group.query.filter_by(uuid=group_uuid).first()
+            if not group:
+                return jsonify({'error': 'Группа не найдена'}), 404
+            if group.is_private and not group.members.filter_by(id=user.id).first():
+                return jsonify({'error': 'Нет доступа к группе'}), 403
+            group_id = group.id
+
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', 20, type=int), 1), SEARCH_MAX_PER_PAGE)
+
+        # Берём на одну запись больше, чтобы понять, есть ли следующая страница
+        hits = search_index.search(
+            query, user.id, group_id=group_id, limit=per_page + 1, offset=(page - 1) * per_page
+        )
+        has_more = len(hits) > per_page
+        hits = hits[:per_page]
+
+        # Сообщения с авторами — одним запросом, в порядке релевантности
+        ids = [message_id for message_id, _ in hits]
+        rows = (
+            Message.query.options(joinedload(Message.author), joinedload(Message.file))
+            .filter(Message.id.in_(ids)).all()
+        ) if ids else []
+        by_id = {m.id: m for m in rows}
+        entries = [by_id[message_id].to_dict() for message_id in ids if message_id in by_id]
+        messages, users = Message.pack_page(entries)
+
+        highlights = dict(hits)
+        for message in messages:
+            message['highlight'] = highlights.get(message['id'])
+
+        return jsonify({
+            'success': True,
+            'messages': messages,
+            'users': users,
+            'page': page,
+            'per_page': per_page,
+            'has_more': has_more
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
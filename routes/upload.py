@@ -1,19 +1,44 @@
 import os
-import uuid
-from flask import Blueprint, request, jsonify, current_app
+import re
+from flask import Blueprint, request, jsonify, session
 from werkzeug.utils import secure_filename
+from models.upload import UploadSession
+from services.chunked_upload import chunked_uploads, UploadError
+from services.file_store import file_store
+from services.thumbnails import thumbnails
 
 bp_upload = Blueprint("upload", __name__)
 
-# Настройки
-UPLOAD_FOLDER = "static/uploads"
+# Настройки (файлы хранятся в static/uploads/ab/cd/<sha256>.<ext>, см. services/file_store.py)
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "pdf", "txt", "zip", "mp3", "mp4"}
+CONTENT_RANGE_RE = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
 
 def allowed_file(filename):
     """Проверяем, допустимо ли расширение файла"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def _stored_response(stored, created, status=200):
+    """
+    Ответ о файле в хранилище (повторная загрузка того же содержимого — deduplicated).
+    Для изображения без превью оно ставится в очередь: thumbnail_url появится позже
+    (событие thumbnail_ready и Message.to_dict()).
+    """
+    thumbnails.schedule(stored)
+    return jsonify({
+        "success": True,
+        "url": file_store.url_for(stored),
+        "filename": os.path.basename(stored.path),
+        "sha256": stored.sha256,
+        "size": stored.size,
+        "deduplicated": not created,
+        "thumbnail_url": file_store.thumbnail_url_for(stored),
+        "width": stored.width,
+        "height": stored.height,
+        "message": "Файл успешно загружен"
+    }), status
+
+
 @bp_upload.route("/upload", methods=["POST"])
 def upload_file():
     """Обработчик загрузки файлов"""
@@ -27,24 +52,108 @@ def upload_file():
 
     if file and allowed_file(file.filename):
         ext = file.filename.rsplit('.', 1)[1].lower()
-        safe_name = secure_filename(f"{uuid.uuid4().hex}.{ext}")
+        stored, created = file_store.save_stream(file.stream, ext)
+        return _stored_response(stored, created)
+
+    return jsonify({"error": "Недопустимый формат файла"}), 400
 
-        # Путь к директории загрузок
-        upload_dir = os.path.join(current_app.root_path, UPLOAD_FOLDER)
-        os.makedirs(upload_dir, exist_ok=True)
 
-        # Сохраняем файл
-        file_path = os.path.join(upload_dir, safe_name)
-        file.save(file_path)
+# === Загрузка по частям с докачкой ===
+# POST   /upload/sessions                      {filename, size} → upload_id, offset
+# GET    /upload/sessions/<id>                 текущее подтверждённое смещение
+# PUT    /upload/sessions/<id>                 тело — байты, Content-Range: bytes start-end/size
+# POST   /upload/sessions/<id>/finalize        файл переносится в хранилище
+# DELETE /upload/sessions/<id>                 отмена
 
-        # Генерируем URL (для клиента)
-        file_url = f"/{UPLOAD_FOLDER}/{safe_name}"
+def _upload_error(error):
+    body = {"error": str(error)}
+    if error.session is not None:
+        body["offset"] = error.session.received
+    return jsonify(body), error.status
 
-        return jsonify({
-            "success": True,
-            "url": file_url,
-            "filename": safe_name,
-            "message": "Файл успешно загружен"
-        }), 200
 
-    return jsonify({"error": "Недопустимый формат файла"}), 400
+def _get_session(upload_id):
+    """Сессия загрузки; чужая (другого пользователя) считается несуществующей"""
+    upload = UploadSession.query.filter_by(uuid=upload_id).first()
+    if upload is None or (upload.user_id and upload.user_id != session.get("user_id")):
+        return None
+    return upload
+
+
+@bp_upload.route("/upload/sessions", methods=["POST"])
+def create_upload_session():
+    """Начало загрузки по частям"""
+    data = request.get_json() or {}
+    filename = (data.get("filename") or "").strip()
+    size = data.get("size")
+
+    if not filename or not allowed_file(filename):
+        return jsonify({"error": "Недопустимый формат файла"}), 400
+    if not isinstance(size, int):
+        return jsonify({"error": "Не указан размер файла"}), 400
+
+    try:
+        upload = chunked_uploads.create(secure_filename(filename) or filename, size, session.get("user_id"))
+    except UploadError as e:
+        return _upload_error(e)
+
+    return jsonify({
+        "success": True,
+        **upload.to_dict(),
+        "chunk_size": chunked_uploads.max_chunk_size,
+    }), 201
+
+
+@bp_upload.route("/upload/sessions/<upload_id>", methods=["GET"])
+def get_upload_session(upload_id):
+    """Состояние загрузки — с какого байта продолжать после обрыва"""
+    upload = _get_session(upload_id)
+    if upload is None:
+        return jsonify({"error": "Загрузка не найдена"}), 404
+    return jsonify({"success": True, **upload.to_dict()})
+
+
+@bp_upload.route("/upload/sessions/<upload_id>", methods=["PUT"])
+def put_upload_chunk(upload_id):
+    """Приём очередной части: тело запроса пишется на диск потоком"""
+    upload = _get_session(upload_id)
+    if upload is None:
+        return jsonify({"error": "Загрузка не найдена"}), 404
+
+    match = CONTENT_RANGE_RE.match(request.headers.get("Content-Range", ""))
+    if not match:
+        return jsonify({"error": "Нужен заголовок Content-Range: bytes start-end/size",
+                        "offset": upload.received}), 416
+    start, end, total = (int(value) for value in match.groups())
+
+    try:
+        offset = chunked_uploads.write_chunk(upload, start, end, total, request.stream)
+    except UploadError as e:
+        return _upload_error(e)
+
+    return jsonify({"success": True, "offset": offset, "size": upload.size})
+
+
+@bp_upload.route("/upload/sessions/<upload_id>/finalize", methods=["POST"])
+def finalize_upload(upload_id):
+    """Завершение загрузки: файл переносится на место без копирования"""
+    upload = _get_session(upload_id)
+    if upload is None:
+        return jsonify({"error": "Загрузка не найдена"}), 404
+
+    try:
+        stored, created = chunked_uploads.finalize(upload)
+    except UploadError as e:
+        return _upload_error(e)
+
+    return _stored_response(stored, created)
+
+
+@bp_upload.route("/upload/sessions/<upload_id>", methods=["DELETE"])
+def abort_upload(upload_id):
+    """Отмена загрузки"""
+    upload = _get_session(upload_id)
+    if upload is None:
+        return jsonify({"error": "Загрузка не найдена"}), 404
+    chunked_uploads.abort(upload)
+    return jsonify({"success": True})
@@ -0,0 +1,34 @@
+"""
+search_backfill.py — создание полнотекстового индекса сообщений и индексация существующих строк.
+Запуск:
+    python search_backfill.py [--chunk 10000]
+"""
+
+import argparse
+import time
+from app import app
+from services.search_index import search_index
+
+
+def backfill(chunk_size):
+    with app.app_context():
+        dialect = search_index.install()
+        if dialect is None:
+            print("❌ Полнотекстовый поиск поддерживается только для SQLite и PostgreSQL")
+            return
+
+        print(f"🔎 Индекс ({dialect}) проверен/создан, индексируем сообщения...")
+        started = time.time()
+
+        def progress(done, last):
+            print(f"  … id {done:,} / {last:,}")
+
+        total = search_index.backfill(chunk_size=chunk_size, progress=progress)
+        print(f"✅ Проиндексировано строк: {total:,} за {time.time() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill full-text search index")
+    parser.add_argument("--chunk", type=int, default=10_000, help="строк в одной транзакции (PostgreSQL)")
+    args = parser.parse_args()
+    backfill(args.chunk)
@@ -0,0 +1,161 @@
+"""
+seed_data.py — данные для нагрузочных тестов: генерация, выгрузка и импорт.
+  generate — синтетические пользователи, группы, участие и сообщения (utils/synthetic.py:
+             горячие группы, степенной закон авторов; одинаковый --seed — одинаковые данные).
+             Дописывает в БД после существующих id.
+  export   — выгрузка users, groups, user_groups и messages в каталог, по JSONL-файлу на
+             таблицу (<таблица>.jsonl или .jsonl.gz с --gzip).
+  import   — загрузка такой выгрузки (например, с продакшена) в пустую БД. Сообщения,
+             зашифрованные на сервере, переносятся как есть — нужны те же ключи; ссылки на
+             файлы хранилища (file_id) сбрасываются, file_url остаётся.
+Строки пишутся services/bulk_loader.py пакетами (executemany / COPY) мимо ORM.
+Запуск:
+    python seed_data.py generate --users 10000 --groups 5000 --messages 10000000 [--seed 42]
+    python seed_data.py export DIR [--gzip]
+    python seed_data.py import DIR
+"""
+
+import argparse
+import gzip
+import json
+import os
+import time
+from datetime import datetime
+from sqlalchemy import func, select
+from app import app
+from extensions import db
+from models.message import Group, Message, user_groups
+from models.user import User
+from services.bulk_loader import BulkLoader
+from utils.crypto import hash_codeword
+from utils.synthetic import SyntheticChat
+
+# Таблицы в порядке внешних ключей
+TABLES = {
+    "users": User.__table__,
+    "groups": Group.__table__,
+    "user_groups": user_groups,
+    "messages": Message.__table__,
+}
+
+
+def _progress(table, done):
+    print(f"  … {table}: {done:,}")
+
+
+def _loaded(loader, started):
+    for name, count in loader.loaded.items():
+        print(f"✅ {name}: {count:,}")
+    print(f"⏱️ {time.time() - started:.1f}s")
+
+
+def generate(users, groups, messages, seed, codeword, batch_size):
+    with app.app_context():
+        first_ids = {
+            name: (db.session.scalar(select(func.max(table.c.id))) or 0) + 1
+            for name, table in TABLES.items() if name != "user_groups"
+        }
+        db.session.remove()
+        chat = SyntheticChat(users, groups, messages, seed=seed,
+                             codeword_hash=hash_codeword(codeword), first_ids=first_ids)
+        print(f"🧪 Генерация: {users:,} пользователей, {groups:,} групп, {messages:,} сообщений (seed {seed})")
+        started = time.time()
+        with BulkLoader(batch_size=batch_size, progress=_progress) as loader:
+            for name, rows in chat.tables():
+                loader.load(TABLES[name], rows)
+            print("🔧 Индексы, поиск, счётчики…")
+        _loaded(loader, started)
+
+
+def _open(path, mode):
+    return gzip.open(path, mode + "t", encoding="utf-8") if path.endswith(".gz") else open(path, mode, encoding="utf-8")
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} не сериализуется в JSON")
+
+
+def export(directory, compress):
+    os.makedirs(directory, exist_ok=True)
+    with app.app_context(), db.engine.connect() as conn:
+        for name, table in TABLES.items():
+            path = os.path.join(directory, f"{name}.jsonl" + (".gz" if compress else ""))
+            count = 0
+            # Курсор на стороне сервера (PostgreSQL): таблица не читается в память целиком
+            rows = conn.execution_options(stream_results=True, yield_per=10_000).execute(select(table))
+            with _open(path, "w") as output:
+                for row in rows:
+                    output.write(json.dumps(row._asdict(), ensure_ascii=False, default=_json_default))
+                    output.write("\n")
+                    count += 1
+            print(f"✅ {name}: {count:,} → {path}")
+
+
+def _read_rows(path, table):
+    """Строки JSONL → словари колонок: лишние ключи отбрасываются, даты разбираются"""
+    dates = {column.name for column in table.c if isinstance(column.type, db.DateTime)}
+    with _open(path, "r") as source:
+        for line in source:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            row = {}
+            for column in table.c:
+                value = record.get(column.name)
+                if value is not None and column.name in dates:
+                    value = datetime.fromisoformat(value)
+                row[column.name] = value
+            if table is Message.__table__:
+                row["file_id"] = None  # файлы хранилища не переносятся
+            yield row
+
+
+def import_dump(directory, batch_size):
+    with app.app_context():
+        if db.session.scalar(select(func.count()).select_from(User)):
+            print("❌ Импорт рассчитан на пустую БД (id переносятся как есть)")
+            return
+        db.session.remove()
+        started = time.time()
+        with BulkLoader(batch_size=batch_size, progress=_progress) as loader:
+            for name, table in TABLES.items():
+                path = next((os.path.join(directory, f"{name}{ext}") for ext in (".jsonl", ".jsonl.gz")
+                             if os.path.exists(os.path.join(directory, f"{name}{ext}"))), None)
+                if path is None:
+                    print(f"⚠️ {name}: файла нет, пропускаем")
+                    continue
+                loader.load(table, _read_rows(path, table))
+            print("🔧 Индексы, поиск, счётчики…")
+        _loaded(loader, started)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Synthetic data, JSONL export and bulk import")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = commands.add_parser("generate", help="синтетические данные")
+    generate_parser.add_argument("--users", type=int, default=10_000)
+    generate_parser.add_argument("--groups", type=int, default=5_000)
+    generate_parser.add_argument("--messages", type=int, default=1_000_000)
+    generate_parser.add_argument("--seed", type=int, default=42)
+    generate_parser.add_argument("--codeword", default="load-test", help="кодовое слово всех пользователей")
+
+    export_parser = commands.add_parser("export", help="выгрузка в JSONL")
+    export_parser.add_argument("directory")
+    export_parser.add_argument("--gzip", action="store_true")
+
+    import_parser = commands.add_parser("import", help="загрузка JSONL-выгрузки")
+    import_parser.add_argument("directory")
+
+    for sub in (generate_parser, import_parser):
+        sub.add_argument("--batch", type=int, default=50_000, help="строк в одной пачке/транзакции")
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        generate(args.users, args.groups, args.messages, args.seed, args.codeword, args.batch)
+    elif args.command == "export":
+        export(args.directory, args.gzip)
+    else:
+        import_dump(args.directory, args.batch)
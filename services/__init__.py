@@ -0,0 +1,36 @@
+# Пакет сервисов (фоновые задачи и состояние процесса)
+from .message_writer import message_writer
+from .message_cache import message_cache
+from .socket_identity import socket_registry
+from .presence import presence
+from .fanout import fanout
+from .group_directory import group_directory
+from .search_index import search_index
+from .key_rotation import key_rotation
+from .codeword_hasher import codeword_hasher
+from .file_store import file_store
+from .chunked_upload import chunked_uploads
+from .thumbnails import thumbnails
+from .rate_limit import rate_limiter
+from .backpressure import outbound_guard
+from .query_budget import query_budget
+from .metrics import metrics
+
+__all__ = [
+    'message_writer',
+    'message_cache',
+    'socket_registry',
+    'presence',
+    'fanout',
+    'group_directory',
+    'search_index',
+    'key_rotation',
+    'codeword_hasher',
+    'file_store',
+    'chunked_uploads',
+    'thumbnails',
+    'rate_limiter',
+    'outbound_guard',
+    'query_budget',
+    'metrics',
+]
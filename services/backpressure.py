@@ -0,0 +1,273 @@
+"""
+backpressure.py — ограничение исходящей очереди медленных соединений.
+Engine.IO складывает исходящие пакеты в очередь соединения без ограничений: если сеть
+клиента не успевает, очередь (и память воркера) растёт. Здесь перехватывается
+eio.send_packet: пока в очереди меньше BACKPRESSURE_MIN_PACKETS пакетов, проверка стоит
+одного qsize(). Когда объём очереди выше BACKPRESSURE_HIGH_WATERMARK, соединение
+считается перегруженным:
+  * presence/typing/thumbnail_ready выбрасываются (и новые, и уже стоящие в очереди);
+  * new_message/new_messages тоже выбрасываются, а когда очередь опустится ниже
+    BACKPRESSURE_LOW_WATERMARK, клиенту уходит один кадр resync — он догружает
+    пропущенное через sync_groups с last_id;
+  * остальные кадры (ответы на запросы клиента) доставляются.
+Соединение, которое не разгрузилось за BACKPRESSURE_EVICT_SECONDS или набрало больше
+BACKPRESSURE_MAX_BYTES, отключается, а его очередь освобождается.
+"""
+
+import re
+import time
+from engineio import packet as eio_packet
+from socketio import packet as sio_packet
+from extensions import socketio
+
+# Событие Socket.IO в начале пакета: 2["event" или 5<n>-["event" (n бинарных вложений)
+_EVENT_RE = re.compile(r'^(?:2|5(\d+)-)(?:/[^,]*,)?\d*\["([^"]+)"')
+
+DROP_EVENTS = frozenset({"presence", "typing", "thumbnail_ready"})
+COLLAPSE_EVENTS = frozenset({"new_message", "new_messages"})
+
+
+def _packet_size(pkt):
+    return len(pkt.data) if pkt is not None and pkt.data is not None else 1
+
+
+def _event_of(pkt):
+    """(событие, число бинарных вложений) или (None, 0) для служебных и бинарных пакетов"""
+    if pkt.packet_type != eio_packet.MESSAGE or not isinstance(pkt.data, str):
+        return None, 0
+    match = _EVENT_RE.match(pkt.data)
+    if match is None:
+        return None, 0
+    return match.group(2), int(match.group(1) or 0)
+
+
+class _Congestion:
+    """Состояние перегруженного соединения"""
+
+    __slots__ = ("since", "bytes", "skip", "needs_resync")
+
+    def __init__(self, size):
+        self.since = time.monotonic()
+        self.bytes = size
+        self.skip = 0               # сколько бинарных вложений выброшенного кадра ещё пропустить
+        self.needs_resync = False
+
+
+class OutboundGuard:
+    """Водяные знаки исходящей очереди, политика сброса кадров и отключение медленных клиентов."""
+
+    def __init__(self):
+        self.enabled = False
+        self.min_packets = 32
+        self.high_watermark = 1024 * 1024
+        self.low_watermark = 256 * 1024
+        self.max_bytes = 4 * 1024 * 1024
+        self.evict_after = 10.0
+        self.interval = 0.5
+        self.drop_events = DROP_EVENTS
+        self.collapse_events = COLLAPSE_EVENTS
+
+        self._eio = None
+        self._send = None
+        self._congested = {}  # eio sid → _Congestion
+        self._next_check = {}  # eio sid → длина очереди, при которой снова считать её объём
+        self._task = None
+
+        self.congestions = 0
+        self.dropped = 0
+        self.collapsed = 0
+        self.resyncs = 0
+        self.evictions = 0
+        self.peak_bytes = 0
+
+    def init_app(self, app):
+        """Читает настройки и встраивается в отправку пакетов (после socketio.init_app)"""
+        self.enabled = app.config.get("BACKPRESSURE_ENABLED", True)
+        self.min_packets = app.config.get("BACKPRESSURE_MIN_PACKETS", 32)
+        self.high_watermark = app.config.get("BACKPRESSURE_HIGH_WATERMARK", self.high_watermark)
+        self.low_watermark = app.config.get("BACKPRESSURE_LOW_WATERMARK", self.low_watermark)
+        self.max_bytes = app.config.get("BACKPRESSURE_MAX_BYTES", self.max_bytes)
+        self.evict_after = app.config.get("BACKPRESSURE_EVICT_SECONDS", 10.0)
+        self.interval = app.config.get("BACKPRESSURE_CHECK_INTERVAL_MS", 500) / 1000
+        # socketio.init_app при каждом create_app() создаёт новый сервер — встраиваемся в него
+        if self.enabled:
+            self.attach(socketio.server.eio)
+        else:
+            self.detach()
+
+    def attach(self, eio):
+        """Встраивается в send_packet сервера Engine.IO; прежний сервер получает его обратно"""
+        if self._eio is eio:
+            return
+        self.detach()
+        self._eio = eio
+        self._send = eio.send_packet
+        eio.send_packet = self._send_packet
+
+    def detach(self):
+        """Возвращает серверу исходный send_packet и забывает состояние его соединений"""
+        if self._eio is None:
+            return
+        self._eio.send_packet = self._send
+        self._eio = None
+        self._send = None
+        self._congested.clear()
+        self._next_check.clear()
+
+    # --- Отправка ---
+    def _send_packet(self, eio_sid, pkt):
+        state = self._congested.get(eio_sid)
+        if state is None:
+            socket = self._eio.sockets.get(eio_sid)
+            queue = getattr(socket, "queue", None)
+            length = queue.qsize() if queue is not None else 0
+            if length < self.min_packets:
+                self._next_check.pop(eio_sid, None)
+                return self._send(eio_sid, pkt)
+            if length < self._next_check.get(eio_sid, 0):
+                return self._send(eio_sid, pkt)
+            size = self._queued_bytes(queue)
+            if size < self.high_watermark:
+                # Следующий подсчёт — когда очередь вырастет на четверть: в среднем O(1) на пакет
+                self._next_check[eio_sid] = length + max(self.min_packets, length // 4)
+                if len(self._next_check) > 2 * len(self._eio.sockets) + 1000:
+                    self._next_check = {
+                        sid: mark for sid, mark in self._next_check.items() if sid in self._eio.sockets
+                    }
+                return self._send(eio_sid, pkt)
+            self._next_check.pop(eio_sid, None)
+            state = self._congest(eio_sid, socket, size)
+
+        if state.skip:
+            state.skip -= 1
+            return None
+        event, attachments = _event_of(pkt)
+        if event in self.drop_events:
+            self.dropped += 1
+            state.skip = attachments
+            return None
+        if event in self.collapse_events:
+            self.collapsed += 1
+            state.skip = attachments
+            state.needs_resync = True
+            return None
+
+        self._send(eio_sid, pkt)
+        state.bytes += _packet_size(pkt)
+        if state.bytes > self.max_bytes:
+            self._evict(eio_sid)
+        return None
+
+    def _congest(self, eio_sid, socket, size):
+        """Соединение перешло верхний водяной знак: чистим очередь от сбрасываемых кадров"""
+        self.congestions += 1
+        state = self._congested[eio_sid] = _Congestion(size)
+        if self._purge(socket.queue):
+            state.needs_resync = True
+        state.bytes = self._queued_bytes(socket.queue)
+        self.peak_bytes = max(self.peak_bytes, size)
+        self._ensure_started()
+        return state
+
+    def _purge(self, queue):
+        """Убирает из очереди сбрасываемые кадры с их вложениями; True — если среди них были сообщения"""
+        pending = getattr(queue, "queue", None)
+        if pending is None:
+            return False
+        kept, removed, collapsed, skip = [], 0, False, 0
+        for pkt in pending:
+            if skip:
+                skip -= 1
+                removed += 1
+                continue
+            event, attachments = (None, 0) if pkt is None else _event_of(pkt)
+            if event in self.drop_events or event in self.collapse_events:
+                collapsed = collapsed or event in self.collapse_events
+                skip = attachments
+                removed += 1
+                continue
+            kept.append(pkt)
+        if removed:
+            pending.clear()
+            pending.extend(kept)
+            self._forget_tasks(queue, removed)
+            self.dropped += removed
+        return collapsed
+
+    # --- Проверка перегруженных соединений ---
+    def _ensure_started(self):
+        if self._task is None:
+            self._task = self._eio.start_background_task(self._run)
+
+    def _run(self):
+        while self._congested:
+            self._eio.sleep(self.interval)
+            self.check()
+        self._task = None
+
+    def check(self):
+        """Снимает перегрузку ниже нижнего знака (с resync) и отключает тех, кто не разгрузился"""
+        now = time.monotonic()
+        for eio_sid, state in list(self._congested.items()):
+            socket = self._eio.sockets.get(eio_sid)
+            if socket is None or socket.closed:
+                self._congested.pop(eio_sid, None)
+                continue
+            size = self._queued_bytes(socket.queue)
+            state.bytes = size
+            self.peak_bytes = max(self.peak_bytes, size)
+            if size <= self.low_watermark:
+                del self._congested[eio_sid]
+                if state.needs_resync:
+                    self._send_resync(eio_sid)
+            elif size > self.max_bytes or now - state.since > self.evict_after:
+                self._evict(eio_sid)
+
+    def _send_resync(self, eio_sid):
+        self.resyncs += 1
+        pkt = sio_packet.Packet(sio_packet.EVENT, namespace="/", data=["resync", {"reason": "backpressure"}])
+        self._send(eio_sid, eio_packet.Packet(eio_packet.MESSAGE, data=pkt.encode()))
+
+    def _evict(self, eio_sid):
+        """Отключает медленного клиента, не дожидаясь, пока он вычитает очередь"""
+        self._congested.pop(eio_sid, None)
+        self._next_check.pop(eio_sid, None)
+        socket = self._eio.sockets.pop(eio_sid, None)
+        if socket is None:
+            return
+        self.evictions += 1
+        pending = getattr(socket.queue, "queue", None)
+        if pending:
+            removed = len(pending)
+            pending.clear()
+            self._forget_tasks(socket.queue, removed)
+        # abort: без кадра CLOSE и без queue.join() — клиент его всё равно не вычитает
+        socket.close(wait=False, abort=True)
+
+    # --- Вспомогательное ---
+    @staticmethod
+    def _queued_bytes(queue):
+        pending = getattr(queue, "queue", None)
+        return sum(_packet_size(pkt) for pkt in pending) if pending else 0
+
+    @staticmethod
+    def _forget_tasks(queue, count):
+        """Убранные вручную пакеты отмечаем обработанными, иначе queue.join() не завершится"""
+        if hasattr(queue, "task_done"):
+            for _ in range(count):
+                queue.task_done()
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "congested": len(self._congested),
+            "congestions": self.congestions,
+            "dropped": self.dropped,
+            "collapsed": self.collapsed,
+            "resyncs": self.resyncs,
+            "evictions": self.evictions,
+            "peak_queue_bytes": self.peak_bytes,
+        }
+
+
+outbound_guard = OutboundGuard()
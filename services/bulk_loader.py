@@ -0,0 +1,210 @@
+"""
+bulk_loader.py — загрузка больших объёмов строк мимо ORM (сид-данные, импорт выгрузок).
+db.session.add по строке на десятках миллионов сообщений занимает часы. Здесь строки
+идут пакетами: в SQLite — executemany драйвера с готовыми значениями, в PostgreSQL —
+COPY FROM STDIN (psycopg2), в остальных СУБД — executemany SQLAlchemy Core.
+На время загрузки:
+  * неуникальные индексы загружаемых таблиц удаляются и строятся заново в конце — одна
+    сортировка вместо миллионов вставок в B-дерево;
+  * триггеры полнотекстового индекса отключаются, а индекс перестраивается одним
+    проходом (search_index.backfill);
+  * в SQLite — PRAGMA synchronous=OFF (загрузка и так повторяема с нуля).
+В конце пересчитываются groups.member_count, сдвигаются последовательности id
+(PostgreSQL) и обновляется статистика планировщика. Загрузчик рассчитан на работу без
+живого трафика: пока он открыт, индексов и поискового триггера нет.
+"""
+
+import io
+import time
+from datetime import datetime
+from sqlalchemy import text
+from extensions import db
+from services.search_index import search_index
+
+try:
+    import psycopg2
+except ImportError:  # psycopg2 нужен только для COPY в PostgreSQL
+    psycopg2 = None
+
+_SQLITE_FTS_TRIGGERS = ("messages_fts_insert", "messages_fts_delete", "messages_fts_update")
+_POSTGRES_SEARCH_TRIGGER = "messages_search_vector_trigger"
+
+
+def _copy_value(value):
+    """Значение для COPY в текстовом формате: NULL — \\N, спецсимволы экранируются"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, datetime):
+        return value.isoformat(" ")
+    if isinstance(value, str):
+        return (value.replace("\\", "\\\\").replace("\t", "\\t")
+                .replace("\n", "\\n").replace("\r", "\\r"))
+    return str(value)
+
+
+class BulkLoader:
+    """Пакетная загрузка строк-словарей в таблицы; используется как контекстный менеджер."""
+
+    def __init__(self, batch_size=50_000, progress=None):
+        self.batch_size = batch_size
+        self.progress = progress  # progress(имя таблицы, загружено строк этого вызова load)
+        self.loaded = {}
+        self._conn = None
+        self._dropped_indexes = []
+        self._search_paused = False
+        self._synchronous = None
+
+    @property
+    def dialect(self):
+        return db.engine.dialect.name
+
+    def __enter__(self):
+        self._conn = db.engine.connect()
+        if self.dialect == "sqlite":
+            self._synchronous = self._conn.exec_driver_sql("PRAGMA synchronous").scalar()
+            self._conn.exec_driver_sql("PRAGMA synchronous=OFF")
+        self._pause_search()
+        self._conn.commit()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.finish()
+        finally:
+            if self._synchronous is not None:
+                self._conn.exec_driver_sql(f"PRAGMA synchronous={int(self._synchronous)}")
+            self._conn.close()
+            self._conn = None
+        return False
+
+    # --- Загрузка ---
+    def load(self, table, rows):
+        """Загружает строки (словари колонок) в table пакетами; возвращает их число"""
+        self._drop_indexes(table)
+        total, batch, columns = 0, [], None
+        for row in rows:
+            if columns is None:
+                columns = [table.c[name] for name in row]
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                total += self._write(table, columns, batch)
+                batch = []
+                if self.progress:
+                    self.progress(table.name, total)
+        if batch:
+            total += self._write(table, columns, batch)
+        self.loaded[table.name] = self.loaded.get(table.name, 0) + total
+        return total
+
+    def _write(self, table, columns, batch):
+        if self.dialect == "sqlite":
+            self._write_executemany(table, columns, batch)
+        elif self.dialect == "postgresql" and psycopg2 is not None:
+            self._write_copy(table, columns, batch)
+        else:
+            self._conn.execute(table.insert(), batch)
+        self._conn.commit()
+        return len(batch)
+
+    def _write_executemany(self, table, columns, batch):
+        """executemany драйвера: значения готовит bind_processor колонки (даты, bool)"""
+        dialect = self._conn.dialect
+        processors = [column.type.bind_processor(dialect) for column in columns]
+        names = [column.name for column in columns]
+        statement = "INSERT INTO {} ({}) VALUES ({})".format(
+            dialect.identifier_preparer.format_table(table),
+            ", ".join(dialect.identifier_preparer.quote(name) for name in names),
+            ", ".join("?" * len(names)),
+        )
+        values = [
+            tuple(value if process is None or value is None else process(value)
+                  for value, process in zip((row[name] for name in names), processors))
+            for row in batch
+        ]
+        self._conn.exec_driver_sql(statement, values)
+
+    def _write_copy(self, table, columns, batch):
+        """COPY FROM STDIN в текстовом формате — самый быстрый путь записи в PostgreSQL"""
+        names = [column.name for column in columns]
+        buffer = io.StringIO()
+        for row in batch:
+            buffer.write("\t".join(_copy_value(row[name]) for name in names))
+            buffer.write("\n")
+        buffer.seek(0)
+        preparer = self._conn.dialect.identifier_preparer
+        cursor = self._conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.copy_expert(
+                "COPY {} ({}) FROM STDIN".format(
+                    preparer.format_table(table), ", ".join(preparer.quote(name) for name in names)
+                ),
+                buffer,
+            )
+        finally:
+            cursor.close()
+
+    # --- Индексы и поиск ---
+    def _drop_indexes(self, table):
+        if any(dropped.table is table for dropped in self._dropped_indexes):
+            return
+        for index in table.indexes:
+            if not index.unique:
+                index.drop(self._conn, checkfirst=True)
+                self._dropped_indexes.append(index)
+        self._conn.commit()
+
+    def _pause_search(self):
+        """Снимает триггеры полнотекстового индекса (если он установлен)"""
+        if self.dialect == "sqlite":
+            installed = self._conn.execute(text(
+                "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name = 'messages_fts_insert'"
+            )).scalar()
+            if installed:
+                for trigger in _SQLITE_FTS_TRIGGERS:
+                    self._conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+                self._search_paused = True
+        elif self.dialect == "postgresql":
+            installed = self._conn.execute(text(
+                "SELECT COUNT(*) FROM pg_trigger WHERE tgname = :name"
+            ), {"name": _POSTGRES_SEARCH_TRIGGER}).scalar()
+            if installed:
+                self._conn.exec_driver_sql(f"ALTER TABLE messages DISABLE TRIGGER {_POSTGRES_SEARCH_TRIGGER}")
+                self._search_paused = True
+
+    def finish(self):
+        """Строит индексы, возвращает поиск и пересчитывает производные данные"""
+        started = time.perf_counter()
+        for index in self._dropped_indexes:
+            index.create(self._conn, checkfirst=True)
+        self._dropped_indexes = []
+
+        if "user_groups" in self.loaded:
+            # Один GROUP BY вместо подзапроса на каждую группу (по group_id отдельного индекса нет)
+            self._conn.execute(text(
+                "UPDATE groups SET member_count = counts.total "
+                "FROM (SELECT group_id, COUNT(*) AS total FROM user_groups GROUP BY group_id) AS counts "
+                "WHERE counts.group_id = groups.id"
+            ))
+            self._conn.execute(text(
+                "UPDATE groups SET member_count = 0 WHERE id NOT IN (SELECT group_id FROM user_groups)"
+            ))
+        if self.dialect == "postgresql":
+            for name in self.loaded:
+                if name != "user_groups":
+                    self._conn.execute(text(
+                        f"SELECT setval(pg_get_serial_sequence('{name}', 'id'), "
+                        f"COALESCE((SELECT MAX(id) FROM {name}), 1))"
+                    ))
+            if self._search_paused:
+                self._conn.exec_driver_sql(f"ALTER TABLE messages ENABLE TRIGGER {_POSTGRES_SEARCH_TRIGGER}")
+        self._conn.exec_driver_sql("ANALYZE")
+        self._conn.commit()
+
+        if self._search_paused:
+            # Триггеры — через install(), строки — одним rebuild/диапазонами id
+            search_index.install()
+            search_index.backfill()
+            self._search_paused = False
+        return time.perf_counter() - started
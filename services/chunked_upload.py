@@ -0,0 +1,204 @@
+"""
+chunked_upload.py — загрузка больших файлов по частям с докачкой.
+Части пишутся из потока запроса прямо в файл <partial_dir>/<upload_id>.part блоками
+по UPLOAD_STREAM_BLOCK байт, поэтому память на загрузку не зависит от размера файла.
+Подтверждённое смещение хранится в upload_sessions: после обрыва клиент спрашивает
+offset и продолжает с него. Готовый файл забирает services/file_store.py переименованием
+(без копирования); SHA-256 считается при завершении одним проходом по собранному
+файлу — хранилище раздаёт содержимое по хешу, поэтому хеш не берётся на веру. Под
+eventlet этот проход (до UPLOAD_MAX_FILE_SIZE байт) идёт в потоке tpool: hashlib
+отпускает GIL, и хаб с остальными соединениями не ждёт чтения файла.
+Приём части и сдвиг смещения в БД идут под эксклюзивной блокировкой .part-файла
+(flock): два запроса с одним смещением не пишут в файл одновременно, а устаревший
+повтор видит уже сдвинутое смещение и получает 409, не трогая файл.
+"""
+
+import os
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from extensions import db
+from models.upload import UploadSession
+from services.file_store import file_store, file_sha256
+from utils.crypto import patcher, tpool
+
+try:
+    import fcntl
+except ImportError:  # не POSIX: блокировки нет, параллельные части одной сессии не защищены
+    fcntl = None
+
+
+class UploadError(Exception):
+    """Ошибка протокола загрузки (status — HTTP-код ответа)"""
+
+    def __init__(self, message, status=400, session=None):
+        super().__init__(message)
+        self.status = status
+        self.session = session
+
+
+class ChunkedUploads:
+    """Сессии загрузки: создание, приём диапазонов байт и сборка файла."""
+
+    def __init__(self):
+        self.partial_dir = None
+        self.max_file_size = 1024 * 1024 * 1024
+        self.max_chunk_size = 8 * 1024 * 1024
+        self.block_size = 64 * 1024
+        self.session_ttl = timedelta(hours=24)
+
+    def init_app(self, app):
+        """Читает настройки из конфигурации приложения"""
+        self.partial_dir = os.path.join(app.instance_path, "uploads", "partial")
+        os.makedirs(self.partial_dir, exist_ok=True)
+        self.max_file_size = app.config.get("UPLOAD_MAX_FILE_SIZE", self.max_file_size)
+        self.max_chunk_size = app.config.get("UPLOAD_MAX_CHUNK_SIZE", self.max_chunk_size)
+        self.block_size = app.config.get("UPLOAD_STREAM_BLOCK", self.block_size)
+        self.session_ttl = timedelta(hours=app.config.get("UPLOAD_SESSION_TTL_HOURS", 24))
+
+    def part_path(self, session):
+        return os.path.join(self.partial_dir, f"{session.uuid}.part")
+
+    @contextmanager
+    def _locked_part(self, session):
+        """
+        Открытый .part-файл под эксклюзивной блокировкой. Не ждём (под eventlet ожидание
+        flock остановило бы весь процесс): занято — 409, клиент повторит с offset.
+        После захвата сессия перечитывается — её мог сдвинуть предыдущий владелец.
+        """
+        try:
+            f = open(self.part_path(session), "r+b")
+        except FileNotFoundError:
+            db.session.refresh(session)
+            raise UploadError("Загрузка уже завершена или отменена", 409, session)
+        with f:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    raise UploadError("Часть принимается другим запросом", 409, session)
+            db.session.refresh(session)
+            yield f
+
+    # --- Протокол ---
+    def create(self, filename, size, user_id=None):
+        """Новая сессия; пустой .part-файл создаётся сразу"""
+        if size < 0 or size > self.max_file_size:
+            raise UploadError(f"Размер файла должен быть от 0 до {self.max_file_size} байт", 413)
+        self.purge_expired()
+
+        session = UploadSession(filename=filename, size=size, received=0, user_id=user_id)
+        db.session.add(session)
+        db.session.flush()
+        open(self.part_path(session), "wb").close()
+        db.session.commit()
+        return session
+
+    def write_chunk(self, session, start, end, total, stream):
+        """
+        Пишет байты [start, end] из stream. Принимается только часть, начинающаяся с
+        подтверждённого смещения; на остальные — 409 с текущим offset.
+        Возвращает новое смещение.
+        """
+        if session.status != "pending":
+            raise UploadError("Загрузка уже завершена", 409, session)
+        if total != session.size or start > end or end >= session.size:
+            raise UploadError("Неверный Content-Range", 416, session)
+        length = end - start + 1
+        if length > self.max_chunk_size:
+            raise UploadError(f"Часть больше {self.max_chunk_size} байт", 413, session)
+        with self._locked_part(session) as f:
+            if session.status != "pending":
+                raise UploadError("Загрузка уже завершена", 409, session)
+            if start != session.received:
+                # Клиент должен продолжить с подтверждённого смещения
+                raise UploadError("Смещение не совпадает с принятым", 409, session)
+
+            written = 0
+            # Всё, что лежит после подтверждённого смещения (оборванная часть), перезаписываем
+            f.seek(start)
+            while written < length:
+                block = stream.read(min(self.block_size, length - written))
+                if not block:
+                    break
+                f.write(block)
+                written += len(block)
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+
+            if written != length:
+                raise UploadError("Часть получена не полностью", 400, session)
+
+            # Смещение сдвигается, пока файл ещё заблокирован; условие на старое смещение —
+            # вторая линия защиты (и единственная, где flock нет)
+            result = db.session.execute(
+                update(UploadSession)
+                .where(UploadSession.id == session.id, UploadSession.received == start)
+                .values(received=start + length, updated_at=datetime.utcnow())
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+            db.session.refresh(session)
+            if result.rowcount != 1:
+                raise UploadError("Часть уже принята другим запросом", 409, session)
+        return session.received
+
+    def finalize(self, session):
+        """
+        Отдаёт собранный файл в хранилище и закрывает сессию (повторный вызов безопасен).
+        Возвращает (StoredFile, создан ли новый файл).
+        """
+        if session.status == "complete":
+            return file_store.find_by_url(session.file_url), False
+        with self._locked_part(session):
+            if session.status == "complete":
+                return file_store.find_by_url(session.file_url), False
+            if session.received != session.size:
+                raise UploadError("Файл загружен не полностью", 409, session)
+            # SHA-256 — по самому файлу, пока он заблокирован: изменить его некому
+            path = self.part_path(session)
+            stored, created = file_store.adopt(path, session.extension, _sha256_off_hub(path), session.size)
+
+            session.status = "complete"
+            session.file_url = file_store.url_for(stored)
+            db.session.commit()
+        return stored, created
+
+    def abort(self, session):
+        """Отмена загрузки: удаляет .part-файл и сессию"""
+        try:
+            os.remove(self.part_path(session))
+        except FileNotFoundError:
+            pass
+        db.session.delete(session)
+        db.session.commit()
+
+    def purge_expired(self, limit=50):
+        """Удаляет незавершённые сессии старше UPLOAD_SESSION_TTL_HOURS"""
+        cutoff = datetime.utcnow() - self.session_ttl
+        stale = (
+            UploadSession.query
+            .filter(UploadSession.status == "pending", UploadSession.updated_at < cutoff)
+            .limit(limit)
+            .all()
+        )
+        for session in stale:
+            try:
+                os.remove(self.part_path(session))
+            except FileNotFoundError:
+                pass
+            db.session.delete(session)
+        if stale:
+            db.session.commit()
+        return len(stale)
+
+
+def _sha256_off_hub(path):
+    """SHA-256 файла; под eventlet — в пуле потоков tpool, а не в хабе"""
+    if tpool is not None and patcher.is_monkey_patched("thread"):
+        return tpool.execute(file_sha256, path)
+    return file_sha256(path)
+
+
+chunked_uploads = ChunkedUploads()
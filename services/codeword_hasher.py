@@ -0,0 +1,91 @@
+"""
+codeword_hasher.py — хеширование и проверка кодовых слов вне хаба eventlet.
+PBKDF2 на 100k итераций занимает десятки миллисекунд; выполненный в greenlet'е, он
+останавливает все соединения процесса. Здесь вычисление уходит в поток tpool
+(hashlib отпускает GIL), а семафор ограничивает число одновременных вычислений
+CODEWORD_HASH_CONCURRENCY. Если в очереди больше CODEWORD_HASH_MAX_PENDING запросов,
+новые отклоняются (HasherBusy), а не копятся.
+"""
+
+import threading
+import time
+
+from utils.crypto import (
+    CODEWORD_ITERATIONS, codeword_needs_rehash, hash_codeword, patcher, tpool, verify_codeword,
+)
+
+
+class HasherBusy(Exception):
+    """Очередь на хеширование переполнена — клиенту стоит повторить позже"""
+
+
+class CodewordHasher:
+    """Ограниченный пул для PBKDF2 с метриками очереди."""
+
+    def __init__(self):
+        self.iterations = CODEWORD_ITERATIONS
+        self.concurrency = 4
+        self.max_pending = 64
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+
+        self.waiting = 0        # ждут свободного слота (глубина очереди)
+        self.running = 0        # считаются прямо сейчас
+        self.peak_waiting = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+
+    def init_app(self, app):
+        """Читает настройки из конфигурации приложения"""
+        self.iterations = app.config.get("CODEWORD_HASH_ITERATIONS", CODEWORD_ITERATIONS)
+        self.concurrency = app.config.get("CODEWORD_HASH_CONCURRENCY", 4)
+        self.max_pending = app.config.get("CODEWORD_HASH_MAX_PENDING", 64)
+        # Под monkey_patch это зелёный семафор: ожидание не блокирует хаб
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+
+    def hash(self, codeword):
+        return self._run(hash_codeword, codeword, self.iterations)
+
+    def verify(self, codeword, hashed):
+        return self._run(verify_codeword, codeword, hashed)
+
+    def needs_rehash(self, hashed):
+        return codeword_needs_rehash(hashed, self.iterations)
+
+    def _run(self, fn, *args):
+        if self.waiting >= self.max_pending:
+            self.rejected += 1
+            raise HasherBusy()
+
+        queued = time.perf_counter()
+        self.waiting += 1
+        self.peak_waiting = max(self.peak_waiting, self.waiting)
+        try:
+            self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.wait_seconds += time.perf_counter() - queued
+
+        self.running += 1
+        try:
+            if tpool is not None and patcher.is_monkey_patched("thread"):
+                return tpool.execute(fn, *args)
+            return fn(*args)
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self._slots.release()
+
+    def stats(self):
+        return {
+            "concurrency": self.concurrency,
+            "queue_depth": self.waiting,
+            "running": self.running,
+            "peak_queue_depth": self.peak_waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.wait_seconds / self.completed * 1000, 2) if self.completed else 0.0,
+        }
+
+
+codeword_hasher = CodewordHasher()
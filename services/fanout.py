@@ -0,0 +1,94 @@
+"""
+fanout.py — рассылка новых сообщений в комнаты групп.
+В режиме SOCKETIO_BATCH_FANOUT сообщения «горячей» комнаты копятся до
+SOCKETIO_BATCH_WINDOW_MS миллисекунд (или SOCKETIO_BATCH_MAX_MESSAGES штук) и уходят
+одним кадром new_messages. Комната, в которой давно не было сообщений, получает
+new_message сразу, без задержки.
+"""
+
+import time
+from extensions import socketio, wire
+
+
+class _Batch:
+    __slots__ = ("messages",)
+
+    def __init__(self):
+        self.messages = []
+
+
+class RoomFanout:
+    """Отправка new_message / new_messages с микро-пакетированием по комнатам."""
+
+    def __init__(self):
+        self.batching = False
+        self.window = 0.015
+        self.max_messages = 50
+
+        self._pending = {}     # room -> _Batch
+        self._last_sent = {}   # room -> time.monotonic() последней отправки
+
+        self.frames_sent = 0
+        self.messages_sent = 0
+
+    def init_app(self, app):
+        """Читает настройки из конфигурации приложения"""
+        self.batching = app.config.get("SOCKETIO_BATCH_FANOUT", False)
+        self.window = app.config.get("SOCKETIO_BATCH_WINDOW_MS", 15) / 1000
+        self.max_messages = app.config.get("SOCKETIO_BATCH_MAX_MESSAGES", 50)
+
+    def publish(self, room, payload):
+        """Отправляет сообщение в комнату (сразу или в составе пакета)"""
+        self.messages_sent += 1
+        if not self.batching:
+            self._emit_one(room, payload)
+            return
+
+        batch = self._pending.get(room)
+        if batch is None:
+            now = time.monotonic()
+            # Тихая комната: задержка не нужна
+            if now - self._last_sent.get(room, 0.0) >= self.window:
+                self._last_sent[room] = now
+                self._emit_one(room, payload)
+                return
+            batch = self._pending[room] = _Batch()
+            socketio.start_background_task(self._flush_later, room, batch)
+
+        batch.messages.append(payload)
+        if len(batch.messages) >= self.max_messages:
+            self.flush(room)
+
+    def flush(self, room):
+        """Отправляет накопленный пакет комнаты"""
+        batch = self._pending.pop(room, None)
+        if batch is None or not batch.messages:
+            return
+        self._last_sent[room] = time.monotonic()
+        self.frames_sent += 1
+        wire.emit_to_room("new_messages", {"group_id": room, "messages": batch.messages}, room)
+
+    def flush_all(self):
+        for room in list(self._pending):
+            self.flush(room)
+
+    def _emit_one(self, room, payload):
+        self.frames_sent += 1
+        wire.emit_to_room("new_message", payload, room)
+
+    def _flush_later(self, room, batch):
+        socketio.sleep(self.window)
+        # Пакет мог уйти раньше по размеру — тогда в комнате уже другой
+        if self._pending.get(room) is batch:
+            self.flush(room)
+
+    def stats(self):
+        return {
+            "batching": self.batching,
+            "frames_sent": self.frames_sent,
+            "messages_sent": self.messages_sent,
+            "pending_rooms": len(self._pending),
+        }
+
+
+fanout = RoomFanout()
@@ -0,0 +1,180 @@
+"""
+file_store.py — контентно-адресуемое хранилище загруженных файлов.
+Файл лежит один раз по SHA-256 содержимого: static/uploads/ab/cd/<sha256>.<ext>,
+а отдаётся маршрутом /files/ab/cd/<sha256>.<ext> (routes/files.py).
+Хеш считается во время записи потока, повторная загрузка того же содержимого
+ничего не пишет. Превью изображений (services/thumbnails.py) лежат рядом с
+оригиналом: ab/cd/<sha256>.t<size>.webp. StoredFile.ref_count — сколько сообщений ссылается на файл
+(Message.file_id); файлы без ссылок можно удалить collect_garbage().
+"""
+
+import hashlib
+import os
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models.upload import StoredFile
+
+_BLOCK_SIZE = 64 * 1024
+# Раньше файлы хранилища отдавались как статика — такие ссылки в сообщениях тоже узнаём
+_LEGACY_URL_PREFIX = "/static/uploads/"
+IMAGE_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "webp"}
+
+
+class FileStore:
+    """Хранилище файлов по SHA-256 с подсчётом ссылок."""
+
+    def __init__(self):
+        self.root = None
+        self.url_prefix = "/files"
+        self.tmp_dir = None
+
+    def init_app(self, app):
+        """Корень — static/uploads, временные файлы — рядом с частями загрузок (та же ФС)"""
+        self.root = os.path.join(app.root_path, "static", "uploads")
+        self.tmp_dir = os.path.join(app.instance_path, "uploads", "partial")
+        os.makedirs(self.root, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    # --- Адресация ---
+    @staticmethod
+    def relative_path(digest, ext):
+        name = f"{digest}.{ext}" if ext else digest
+        return f"{digest[:2]}/{digest[2:4]}/{name}"
+
+    @staticmethod
+    def thumbnail_relative_path(stored, size):
+        """Превью лежит рядом с оригиналом: ab/cd/<sha256>.t<size>.webp"""
+        return f"{stored.path.rsplit('/', 1)[0]}/{stored.sha256}.t{size}.webp"
+
+    def full_path(self, stored, relative=None):
+        return os.path.join(self.root, *(relative or stored.path).split("/"))
+
+    def url_for(self, stored):
+        return f"{self.url_prefix}/{stored.path}"
+
+    def thumbnail_url_for(self, stored):
+        return f"{self.url_prefix}/{stored.thumbnail_path}" if stored.thumbnail_path else None
+
+    @staticmethod
+    def message_type_for(stored):
+        """image или file — по расширению файла"""
+        return "image" if stored.path.rsplit(".", 1)[-1].lower() in IMAGE_EXTENSIONS else "file"
+
+    def find(self, digest):
+        return StoredFile.query.filter_by(sha256=digest.lower()).first() if digest else None
+
+    def find_by_url(self, url):
+        """Файл хранилища по URL из сообщения (или None для посторонних ссылок)"""
+        for prefix in (self.url_prefix + "/", _LEGACY_URL_PREFIX):
+            if url and url.startswith(prefix):
+                return StoredFile.query.filter_by(path=url[len(prefix):]).first()
+        return None
+
+    # --- Запись ---
+    def save_stream(self, stream, ext):
+        """
+        Пишет поток во временный файл, считая SHA-256 на лету.
+        Возвращает (StoredFile, создан ли новый файл).
+        """
+        tmp_path = os.path.join(self.tmp_dir, f"{uuid.uuid4().hex}.tmp")
+        digest, size = hashlib.sha256(), 0
+        try:
+            with open(tmp_path, "wb") as f:
+                while True:
+                    block = stream.read(_BLOCK_SIZE)
+                    if not block:
+                        break
+                    digest.update(block)
+                    f.write(block)
+                    size += len(block)
+        except Exception:
+            _remove(tmp_path)
+            raise
+        return self.adopt(tmp_path, ext, digest.hexdigest(), size)
+
+    def adopt(self, path, ext, digest=None, size=None):
+        """
+        Забирает готовый файл в хранилище (переименованием). Если такое содержимое
+        уже есть, файл удаляется. Возвращает (StoredFile, создан ли новый файл).
+        """
+        if digest is None:
+            digest = file_sha256(path)
+        if size is None:
+            size = os.path.getsize(path)
+
+        existing = self.find(digest)
+        if existing is not None and os.path.exists(self.full_path(existing)):
+            _remove(path)
+            return existing, False
+
+        relative = existing.path if existing is not None else self.relative_path(digest, ext)
+        target = os.path.join(self.root, *relative.split("/"))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)
+        if existing is not None:
+            # Строка была, файла не было (удалён вручную) — восстановили
+            return existing, True
+
+        stored = StoredFile(sha256=digest, size=size, path=relative, ref_count=0)
+        db.session.add(stored)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Тот же файл параллельно сохранил другой запрос — содержимое идентично
+            db.session.rollback()
+            return self.find(digest), False
+        return stored, True
+
+    # --- Ссылки из сообщений ---
+    def acquire(self, file_id, count=1):
+        """Ещё count сообщений ссылаются на файл (в текущей транзакции)"""
+        db.session.execute(
+            update(StoredFile)
+            .where(StoredFile.id == file_id)
+            .values(ref_count=StoredFile.ref_count + count)
+            .execution_options(synchronize_session=False)
+        )
+
+    def release(self, file_id, count=1):
+        """Сообщения с файлом удалены (в текущей транзакции)"""
+        self.acquire(file_id, -count)
+
+    def garbage(self, older_than=timedelta(hours=24)):
+        """Запрос файлов без ссылок, загруженных раньше older_than назад (кроме закреплённых)"""
+        cutoff = datetime.utcnow() - older_than
+        return StoredFile.query.filter(
+            StoredFile.ref_count <= 0, StoredFile.created_at < cutoff, StoredFile.pinned.is_(False)
+        )
+
+    def collect_garbage(self, older_than=timedelta(hours=24)):
+        """Удаляет файлы без ссылок, загруженные раньше older_than назад"""
+        orphans = self.garbage(older_than).all()
+        for stored in orphans:
+            _remove(self.full_path(stored))
+            if stored.thumbnail_path:
+                _remove(self.full_path(stored, stored.thumbnail_path))
+            db.session.delete(stored)
+        if orphans:
+            db.session.commit()
+        return len(orphans)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+file_store = FileStore()
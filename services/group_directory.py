@@ -0,0 +1,59 @@
+"""
+group_directory.py — ключ группы в Socket.IO-событиях и id существующих групп в памяти.
+Клиент присылает group_id как число или строку ("7"); group_key приводит его к int,
+чтобы проверка, запись сообщения и комнаты получали одно и то же значение.
+Существование группы проверяется по множеству уже виденных id: запрос к groups —
+только при первом обращении к группе в этом процессе, а не на каждое сообщение.
+Группы удаляются редко; удалённая на другом воркере группа остаётся здесь «известной»,
+и её сообщения отбрасывает писатель (внешний ключ) — см. services/message_writer.py.
+"""
+
+from sqlalchemy import select
+from extensions import db
+from models.message import Group
+
+
+def group_key(value):
+    """group_id из события → int; None, если это не положительное целое"""
+    if isinstance(value, bool):
+        return None
+    try:
+        key = int(value)
+    except (TypeError, ValueError):
+        return None
+    return key if key > 0 else None
+
+
+class GroupDirectory:
+    """Множество id существующих групп, заполняемое по мере обращений."""
+
+    def __init__(self):
+        self._known = set()
+        self.hits = 0
+        self.misses = 0
+
+    def exists(self, group_id):
+        """Есть ли группа; в БД идём только за ещё не виденным id"""
+        if group_id in self._known:
+            self.hits += 1
+            return True
+        self.misses += 1
+        found = db.session.scalar(select(Group.id).where(Group.id == group_id))
+        if found is None:
+            return False
+        self._known.add(group_id)
+        return True
+
+    def discard(self, group_id):
+        """Группа удалена"""
+        self._known.discard(group_id)
+
+    def stats(self):
+        return {
+            "known": len(self._known),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+group_directory = GroupDirectory()
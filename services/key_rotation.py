@@ -0,0 +1,164 @@
+"""
+key_rotation.py — ротация ключей шифрования сообщений в БД.
+Новая версия ключа сразу становится активной (новые сообщения шифруются ею), а старые
+строки перешифровываются в фоне порциями по CRYPTO_ROTATION_BATCH_SIZE. Пока ротация
+идёт, старый ключ остаётся в keyring и читается как обычно — простоя нет. Каждая
+порция — отдельная транзакция с условием на прежнюю версию, поэтому прерванную
+ротацию можно продолжить (или запустить в нескольких процессах) без порчи данных.
+Версия, которой в таблице ничего не зашифровано, сначала только выводится: ключ
+остаётся для расшифровки, потому что строки этой версией могут ещё быть вне таблицы
+(очередь write-behind, воркер, не перечитавший keyring). Из keyring ключ удаляется
+при следующей ротации не раньше CRYPTO_KEY_RETIRE_GRACE_HOURS после вывода и только
+если строк этой версией так и не появилось.
+"""
+
+import time
+from datetime import timedelta
+from sqlalchemy import bindparam, func, select, update
+from extensions import db, socketio, encryption, AT_REST_PREFIX
+from models.message import Message
+
+
+class KeyRotation:
+    """Перешифровка сообщений активным ключом и удаление отработавших версий."""
+
+    def __init__(self):
+        self.app = None
+        self.batch_size = 500
+        self.pause = 0.05
+        self.retire_grace = timedelta(hours=24)
+
+        self.running = False
+        self.reencrypted = 0
+        self.failed = 0
+
+    def init_app(self, app):
+        """Читает настройки; продолжает незавершённую ротацию в фоне"""
+        self.app = app
+        self.batch_size = app.config.get("CRYPTO_ROTATION_BATCH_SIZE", 500)
+        self.pause = app.config.get("CRYPTO_ROTATION_PAUSE_MS", 50) / 1000
+        self.retire_grace = timedelta(hours=app.config.get("CRYPTO_KEY_RETIRE_GRACE_HOURS", 24))
+        resume = app.config.get("CRYPTO_ROTATION_RESUME", True)
+        if resume and encryption.at_rest and self._pending_versions():
+            self.start()
+
+    @staticmethod
+    def _pending_versions():
+        """Неактивные и ещё не выведенные версии — их данные, возможно, не перешифрованы"""
+        keyring = encryption.engine.keyring
+        return [version for version in keyring.versions()
+                if version != keyring.active and version not in keyring.retired]
+
+    def rotate(self, algorithm=None, background=True):
+        """Создаёт новую активную версию ключа и запускает перешифровку"""
+        version = encryption.engine.keyring.add_key(algorithm or encryption.algorithm)
+        if background:
+            self.start()
+        else:
+            self.reencrypt()
+        return version
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            socketio.start_background_task(self.reencrypt)
+
+    def reencrypt(self, progress=None):
+        """Перешифровывает все строки со старыми версиями ключа. Возвращает число строк."""
+        self.running = True
+        keyring = encryption.engine.keyring
+        keyring.refresh()
+        active_tag = encryption.key_tag()
+        statement = (
+            update(Message.__table__)
+            .where(Message.id == bindparam("b_id"), Message.encryption_key == bindparam("b_old"))
+            .values(content=bindparam("b_content"), encryption_key=bindparam("b_new"))
+        )
+        done, last_id = 0, 0
+        try:
+            while True:
+                with self.app.app_context():
+                    rows = db.session.execute(
+                        select(Message.id, Message.content, Message.encryption_key)
+                        .where(
+                            Message.id > last_id,
+                            Message.encryption_key.like(f"{AT_REST_PREFIX}%"),
+                            Message.encryption_key != active_tag,
+                        )
+                        .order_by(Message.id)
+                        .limit(self.batch_size)
+                    ).all()
+                    if not rows:
+                        break
+                    last_id = rows[-1].id
+
+                    params = []
+                    for row in rows:
+                        try:
+                            plaintext = encryption.engine.decrypt(row.content)
+                        except Exception as e:
+                            # Битую строку оставляем как есть, чтобы не потерять данные
+                            self.failed += 1
+                            print(f"⚠️ Key rotation: message {row.id} not decrypted: {e}")
+                            continue
+                        params.append({
+                            "b_id": row.id,
+                            "b_old": row.encryption_key,
+                            "b_content": encryption.engine.encrypt(plaintext, keyring.active),
+                            "b_new": active_tag,
+                        })
+                    if params:
+                        db.session.execute(statement, params)
+                        db.session.commit()
+                    done += len(params)
+                    self.reencrypted += len(params)
+                if progress:
+                    progress(done, last_id)
+                socketio.sleep(self.pause)
+
+            self._retire_unused()
+        finally:
+            self.running = False
+        return done
+
+    def _retire_unused(self):
+        """
+        Выводит неактивные версии, которыми в таблице ничего не зашифровано, и удаляет
+        выведенные раньше льготного периода, если строк ими так и не появилось
+        """
+        keyring = encryption.engine.keyring
+        keyring.refresh()
+        grace_seconds = self.retire_grace.total_seconds()
+        with self.app.app_context():
+            for version in keyring.versions():
+                if version == keyring.active:
+                    continue
+                remaining = db.session.execute(
+                    select(func.count()).select_from(Message)
+                    .where(Message.encryption_key == encryption.key_tag(version))
+                ).scalar()
+                retired_at = keyring.retired.get(version)
+                if remaining:
+                    if retired_at is not None:
+                        # Строки пришли после вывода (например, из очереди) — перешифруем позже
+                        keyring.unretire(version)
+                        print(f"🔑 Key version {version} is still in use ({remaining} rows), kept")
+                elif retired_at is None:
+                    keyring.retire(version)
+                    print(f"🔑 Key version {version} retired (kept for decryption)")
+                elif time.time() - retired_at >= grace_seconds:
+                    keyring.remove(version)
+                    print(f"🔑 Key version {version} removed")
+
+    def stats(self):
+        return {
+            "running": self.running,
+            "active_version": encryption.engine.keyring.active,
+            "versions": encryption.engine.keyring.versions(),
+            "retired": sorted(encryption.engine.keyring.retired),
+            "reencrypted": self.reencrypted,
+            "failed": self.failed,
+        }
+
+
+key_rotation = KeyRotation()
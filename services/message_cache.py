@@ -0,0 +1,248 @@
+"""
+message_cache.py — кэш последних сообщений групп в памяти процесса.
+Для каждой группы хранится кольцевой буфер из MESSAGE_CACHE_PER_GROUP сериализованных
+сообщений; буферы лежат в LRU, который вытесняет группы целиком при превышении
+MESSAGE_CACHE_MAX_BYTES. Кэш локален для процесса — при нескольких воркерах включайте
+его только вместе с одним воркером на инстанс.
+При write-behind хвост группы не кэшируется, пока у неё есть незаписанные сообщения:
+чтение из БД их не видит, а дописать их в уже заполненный буфер потом нечем.
+Группа адресуется ключом group_key (int), как комнаты Socket.IO и очередь писателя.
+"""
+
+import json
+from collections import OrderedDict, deque
+from flask import current_app
+from models.message import Message
+from services.group_directory import group_key
+from services.message_writer import message_writer
+
+
+def history_page_size(requested=None):
+    """Размер страницы истории с учётом ограничений из конфигурации"""
+    default = current_app.config.get("CHAT_HISTORY_PAGE_SIZE", 50)
+    maximum = current_app.config.get("MESSAGE_HISTORY_LIMIT", 1000)
+    try:
+        size = int(requested) if requested else default
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(size, maximum))
+
+
+def _entry_size(entry):
+    """Приблизительный размер сообщения в памяти (по длине JSON)"""
+    return len(json.dumps(entry, ensure_ascii=False, default=str))
+
+
+class _GroupBuffer:
+    """Хвост истории одной группы"""
+
+    __slots__ = ("entries", "sizes", "bytes", "has_older")
+
+    def __init__(self, capacity):
+        self.entries = deque(maxlen=capacity)
+        self.sizes = deque(maxlen=capacity)
+        self.bytes = 0
+        # Есть ли в БД сообщения старше самого старого в буфере
+        self.has_older = False
+
+    def append(self, entry):
+        """Добавляет сообщение; возвращает изменение занятой памяти"""
+        size = _entry_size(entry)
+        delta = size
+        if len(self.entries) == self.entries.maxlen:
+            delta -= self.sizes[0]
+            self.has_older = True
+        self.entries.append(entry)
+        self.sizes.append(size)
+        self.bytes += delta
+        return delta
+
+
+class RecentMessageCache:
+    """LRU буферов последних сообщений со счётчиками попаданий и вытеснений."""
+
+    def __init__(self):
+        self.enabled = False
+        self.per_group = 200
+        self.max_bytes = 32 * 1024 * 1024
+
+        self._groups = OrderedDict()
+        self._generations = {}
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def init_app(self, app):
+        """Читает настройки из конфигурации приложения"""
+        self.enabled = app.config.get("MESSAGE_CACHE_ENABLED", False)
+        self.per_group = app.config.get("MESSAGE_CACHE_PER_GROUP", 200)
+        self.max_bytes = app.config.get("MESSAGE_CACHE_MAX_BYTES", 32 * 1024 * 1024)
+
+    # --- Чтение ---
+    def history_page(self, group_id, before_id=None, limit=50):
+        """
+        Страница истории в формате Message.to_dict(): из кэша, если хвоста хватает,
+        иначе из БД. Возвращает (сообщения по возрастанию id, курсор или None).
+        """
+        if self.enabled:
+            page = self._cached_page(group_id, before_id, limit)
+            if page is not None:
+                self.hits += 1
+                return page
+            self.misses += 1
+
+        if not self.enabled or before_id is not None:
+            messages, next_cursor = Message.history_page(group_id, before_id=before_id, limit=limit)
+            return [m.to_dict() for m in messages], next_cursor
+
+        # Промах по последней странице: читаем сразу весь хвост и кладём его в кэш.
+        # Сообщения, отправленные после этой точки, сдвигают поколение (append), а ещё
+        # не записанные до неё в хвост из БД не попадут — тогда не кэшируем
+        generation = self._generations.get(self._key(group_id), 0)
+        fill = not (message_writer.enabled and message_writer.has_pending(group_id))
+        messages, tail_cursor = Message.history_page(group_id, limit=max(limit, self.per_group))
+        entries = [m.to_dict() for m in messages]
+        if fill:
+            self._fill(group_id, entries, tail_cursor is not None, generation)
+
+        if len(entries) > limit:
+            entries = entries[-limit:]
+            return entries, entries[0]["id"]
+        return entries, tail_cursor
+
+    def history_since(self, group_id, after_id, limit):
+        """
+        Сообщения новее after_id в формате Message.to_dict().
+        Возвращает (сообщения, полный ли это разрыв); False — пропущено больше limit.
+        """
+        if self.enabled:
+            entries = self._cached_since(group_id, after_id)
+            if entries is not None:
+                self.hits += 1
+                if len(entries) > limit:
+                    return [], False
+                return entries, True
+            self.misses += 1
+
+        messages, has_more = Message.history_since(group_id, after_id, limit=limit)
+        if has_more:
+            return [], False
+        return [m.to_dict() for m in messages], True
+
+    def _cached_since(self, group_id, after_id):
+        key = self._key(group_id)
+        buffer = self._groups.get(key)
+        if buffer is None or not buffer.entries:
+            return None
+
+        # Хвост покрывает разрыв, только если начинается не позже after_id
+        oldest_id = buffer.entries[0]["id"]
+        if buffer.has_older and (oldest_id is None or oldest_id > after_id):
+            return None
+
+        self._groups.move_to_end(key)
+        return [e for e in buffer.entries if e["id"] is None or e["id"] > after_id]
+
+    def _cached_page(self, group_id, before_id, limit):
+        key = self._key(group_id)
+        buffer = self._groups.get(key)
+        if buffer is None:
+            return None
+
+        entries = list(buffer.entries)
+        if before_id is not None:
+            entries = [e for e in entries if e["id"] is not None and e["id"] < before_id]
+
+        if len(entries) >= limit:
+            page = entries[-limit:]
+            has_more = len(entries) > limit or buffer.has_older
+        elif not buffer.has_older:
+            page, has_more = entries, False
+        else:
+            return None
+
+        # Курсор — id самого старого сообщения; у ещё не записанных его нет
+        if has_more and page[0]["id"] is None:
+            return None
+
+        self._groups.move_to_end(key)
+        return page, page[0]["id"] if has_more else None
+
+    # --- Запись ---
+    def append(self, group_id, entry):
+        """Добавляет новое сообщение в хвост группы (если группа уже в кэше)"""
+        if not self.enabled:
+            return
+        key = self._key(group_id)
+        buffer = self._groups.get(key)
+        if buffer is None:
+            # Параллельное заполнение из БД могло не увидеть это сообщение
+            self._generations[key] = self._generations.get(key, 0) + 1
+            return
+        self._bytes += buffer.append(entry)
+        self._groups.move_to_end(key)
+        self._evict()
+
+    def set_id(self, group_id, message_uuid, message_id):
+        """Проставляет id сообщению, записанному в БД позже рассылки (write-behind)"""
+        buffer = self._groups.get(self._key(group_id))
+        if buffer is None:
+            return
+        for entry in reversed(buffer.entries):
+            if entry["uuid"] == message_uuid:
+                entry["id"] = message_id
+                return
+
+    def invalidate(self, group_id):
+        """Удаляет группу из кэша (например, после записи системного сообщения)"""
+        key = self._key(group_id)
+        self._generations[key] = self._generations.get(key, 0) + 1
+        buffer = self._groups.pop(key, None)
+        if buffer is not None:
+            self._bytes -= buffer.bytes
+
+    def _fill(self, group_id, entries, has_older, generation):
+        key = self._key(group_id)
+        if key in self._groups or self._generations.get(key, 0) != generation:
+            return
+
+        buffer = _GroupBuffer(self.per_group)
+        for entry in entries[-self.per_group:]:
+            buffer.append(entry)
+        buffer.has_older = has_older or len(entries) > self.per_group
+
+        self._groups[key] = buffer
+        self._bytes += buffer.bytes
+        self._evict()
+
+    def _evict(self):
+        # Вытесняем группы целиком, начиная с давно не использованных
+        while self._bytes > self.max_bytes and self._groups:
+            _, buffer = self._groups.popitem(last=False)
+            self._bytes -= buffer.bytes
+            self.evictions += 1
+
+    @staticmethod
+    def _key(group_id):
+        # Тот же ключ, что у комнат и писателя: "7" и 7 — одна группа
+        return group_key(group_id)
+
+    # --- Статистика ---
+    def stats(self):
+        """Счётчики для подбора размера кэша"""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "groups": len(self._groups),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+        }
+
+
+message_cache = RecentMessageCache()
@@ -0,0 +1,183 @@
+"""
+message_writer.py — отложенная (write-behind) запись сообщений в БД.
+Сообщения сразу рассылаются клиентам, а в базу попадают пачками из фоновой задачи:
+каждые MESSAGE_FLUSH_INTERVAL_MS миллисекунд или MESSAGE_FLUSH_BATCH_SIZE строк.
+Сбой соединения или блокировка БД — пачка возвращается в очередь целиком. Любая другая
+ошибка — это ошибка данных какой-то строки: пачка пишется по одной строке, а строки,
+которые не записываются и поодиночке, уходят в dead_letters и больше не повторяются —
+одна плохая строка не останавливает запись остальных.
+"""
+
+import atexit
+from collections import Counter, deque
+from sqlalchemy import insert
+from sqlalchemy.exc import DBAPIError, OperationalError
+from extensions import db, socketio
+from models.message import Message
+from services.group_directory import group_key
+
+DEAD_LETTERS_KEPT = 1000
+
+
+def _is_transient(error):
+    """Сбой соединения или блокировка — повторяем позже; остальное — ошибка данных строки"""
+    return isinstance(error, OperationalError) or (
+        isinstance(error, DBAPIError) and error.connection_invalidated
+    )
+
+
+class MessageWriter:
+    """Очередь строк таблицы messages с пакетной записью в фоне."""
+
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+        self.flush_interval = 0.05
+        self.batch_size = 500
+
+        self._queue = deque()
+        self._pending_groups = Counter()  # group_key(group_id) -> строк группы в очереди
+        self.dead_letters = deque(maxlen=DEAD_LETTERS_KEPT)  # (строка, ошибка) последних отброшенных
+        self.dropped = 0
+        self._wakeup = None
+        self._task = None
+        self._stopped = False
+
+    def init_app(self, app):
+        """Читает настройки из конфигурации приложения"""
+        self.app = app
+        self.enabled = app.config.get("MESSAGE_WRITE_BEHIND", False)
+        self.flush_interval = app.config.get("MESSAGE_FLUSH_INTERVAL_MS", 50) / 1000
+        self.batch_size = app.config.get("MESSAGE_FLUSH_BATCH_SIZE", 500)
+
+        if self.enabled:
+            # Дописываем очередь при остановке процесса
+            atexit.register(self.shutdown)
+
+    @property
+    def pending(self):
+        """Количество сообщений, ещё не записанных в БД"""
+        return len(self._queue)
+
+    def has_pending(self, group_id):
+        """Есть ли у группы сообщения, ещё не записанные в БД"""
+        return self._pending_groups.get(group_key(group_id), 0) > 0
+
+    def enqueue(self, row, on_saved=None):
+        """
+        Поставить строку в очередь на запись.
+        on_saved(row, message_id) вызывается после commit пачки; message_id=None — строка
+        отброшена (не записывается из-за своих данных).
+        """
+        self._queue.append((row, on_saved))
+        self._pending_groups[group_key(row["group_id"])] += 1
+        self._ensure_started()
+
+        if len(self._queue) >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self):
+        """
+        Записывает одну пачку одним INSERT'ом. Возвращает число обработанных строк
+        (записанных и отброшенных); 0 — пачка возвращена в очередь.
+        """
+        if not self._queue:
+            return 0
+
+        batch = []
+        while self._queue and len(batch) < self.batch_size:
+            batch.append(self._queue.popleft())
+
+        with self.app.app_context():
+            try:
+                saved = self._insert([row for row, _ in batch])
+            except Exception as e:
+                db.session.rollback()
+                if _is_transient(e):
+                    # Возвращаем пачку в начало очереди — повторим на следующем тике
+                    self._queue.extendleft(reversed(batch))
+                    print(f"⚠️ Message flush failed ({len(batch)} rows): {e}")
+                    return 0
+                print(f"⚠️ Message flush failed ({len(batch)} rows), retrying row by row: {e}")
+                saved = self._insert_each(batch)
+
+        processed = 0
+        for row, on_saved in batch:
+            if row["uuid"] not in saved:
+                continue  # вернулась в очередь вместе с остатком пачки
+            processed += 1
+            key = group_key(row["group_id"])
+            self._pending_groups[key] -= 1
+            if self._pending_groups[key] <= 0:
+                del self._pending_groups[key]
+            if on_saved:
+                on_saved(row, saved[row["uuid"]])
+        return processed
+
+    @staticmethod
+    def _insert(rows):
+        """INSERT ... RETURNING и commit; uuid → id"""
+        result = db.session.execute(insert(Message).returning(Message.id, Message.uuid), rows)
+        saved = {message_uuid: message_id for message_id, message_uuid in result}
+        db.session.commit()
+        return saved
+
+    def _insert_each(self, batch):
+        """
+        Пачка по одной строке: uuid → id записанных и None отброшенных. При сбое соединения
+        остаток пачки возвращается в очередь.
+        """
+        saved = {}
+        for index, (row, _) in enumerate(batch):
+            try:
+                saved.update(self._insert([row]))
+            except Exception as e:
+                db.session.rollback()
+                if _is_transient(e):
+                    self._queue.extendleft(reversed(batch[index:]))
+                    break
+                saved[row["uuid"]] = None
+                self.dropped += 1
+                self.dead_letters.append((row, str(e)))
+                print(f"❌ Message {row['uuid']} dropped (group {row.get('group_id')!r}): "
+                      f"{str(e).splitlines()[0]}")
+        return saved
+
+    def stats(self):
+        return {"enabled": self.enabled, "pending": self.pending, "dropped": self.dropped}
+
+    def flush_all(self):
+        """Записывает всю очередь (несколько пачек подряд)"""
+        total = 0
+        while self._queue:
+            written = self.flush()
+            if not written:
+                break
+            total += written
+        return total
+
+    def shutdown(self):
+        """Останавливает фоновую задачу и сбрасывает остаток очереди"""
+        self._stopped = True
+        if self._wakeup:
+            self._wakeup.set()
+        if self._queue:
+            print(f"💾 Flushing {len(self._queue)} pending messages before shutdown")
+            self.flush_all()
+
+    # --- Фоновая задача ---
+    def _ensure_started(self):
+        if self._task is None:
+            self._wakeup = socketio.server.eio.create_event()
+            self._task = socketio.start_background_task(self._run)
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            # Если накопилось больше одной пачки — пишем без паузы
+            while self.flush() >= self.batch_size:
+                pass
+
+
+message_writer = MessageWriter()
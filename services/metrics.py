@@ -0,0 +1,374 @@
+"""
+metrics.py — метрики процесса в формате Prometheus (/metrics).
+Всегда включённый и дешёвый слой: гистограммы задержки каждого события Socket.IO
+(декоратор metrics.track в routes/chat.py) и каждого маршрута Flask (по шаблону
+url_rule, а не по пути), число и время SQL-запросов на единицу работы (запрос или
+событие), а при опросе — подключённые сокеты, размеры комнат и счётчики сервисов
+(кэш, рассылка, лимиты, хеширование, backpressure, превью). Те же счётчики единицы
+работы проверяются по бюджету запросов и дают лог медленных запросов (services/query_budget.py).
+
+Запись в гистограмму — поиск корзины bisect'ом и два сложения, без блокировок: под
+eventlet greenlet не прерывается посреди обычного Python-кода. Накопление по корзинам
+делается только при опросе /metrics. Метрики у каждого процесса свои — при нескольких
+воркерах опрашивается каждый. Без METRICS_TOKEN /metrics доступен только с localhost.
+"""
+
+import functools
+import hmac
+import math
+import time
+from bisect import bisect_left
+from flask import Response, g, has_app_context, request
+from services.query_budget import query_budget
+
+# Корзины задержки, секунды: от 0.5 мс до 10 с
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+ROOM_SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+# Без METRICS_TOKEN /metrics отдаётся только прямым запросам с этих адресов
+_LOOPBACK = {"127.0.0.1", "::1", "::ffff:127.0.0.1"}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+    return str(int(value))
+
+
+class Counter:
+    """Монотонный счётчик с метками"""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self._values = {}
+
+    def inc(self, labels=(), amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield self.name, _format_labels(self.labels, labels), value
+
+
+class Histogram:
+    """Гистограмма: счётчики по корзинам (не накопленные), сумма и число наблюдений"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self.bounds = tuple(buckets)
+        self._children = {}  # метки → [счётчики корзин..., +Inf, сумма]
+
+    def observe(self, value, labels=()):
+        child = self._children.get(labels)
+        if child is None:
+            child = self._children[labels] = [0] * (len(self.bounds) + 2)
+        child[bisect_left(self.bounds, value)] += 1
+        child[-1] += value
+
+    def samples(self):
+        for labels, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.bounds + (math.inf,), child):
+                cumulative += count
+                bucket = 'le="{}"'.format(_format_number(float(bound)))
+                yield f"{self.name}_bucket", _format_labels(self.labels, labels, bucket), cumulative
+            yield f"{self.name}_sum", _format_labels(self.labels, labels), child[-1]
+            yield f"{self.name}_count", _format_labels(self.labels, labels), cumulative
+
+
+class WorkUnit:
+    """Единица работы — HTTP-запрос или событие Socket.IO — и её SQL-запросы"""
+
+    __slots__ = ("kind", "name", "started", "queries", "query_seconds", "method", "status", "statements", "checked")
+
+    def __init__(self, kind, name):
+        self.kind, self.name = kind, name
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.method = None
+        self.status = 200
+        self.statements = [] if query_budget.collect else None
+        self.checked = False
+
+
+def current_unit():
+    """Текущая единица работы или None (вне запроса/события и в фоновых задачах)"""
+    if not has_app_context():
+        return None
+    return getattr(g._get_current_object(), "metrics_unit", None)
+
+
+class Metrics:
+    """Реестр метрик, инструментирование Flask, Socket.IO и SQLAlchemy, экспорт."""
+
+    def __init__(self):
+        self.enabled = True
+        self.token = None
+        self._collectors = []
+        self._socketio = None
+
+        self.event_seconds = self.histogram(
+            "chat_socket_event_duration_seconds", "Время обработки события Socket.IO", ("event",))
+        self.event_errors = self.counter(
+            "chat_socket_event_errors_total", "События Socket.IO, завершившиеся исключением", ("event",))
+        self.request_seconds = self.histogram(
+            "chat_http_request_duration_seconds", "Время обработки HTTP-запроса", ("method", "route"))
+        self.requests = self.counter(
+            "chat_http_requests_total", "HTTP-запросы по маршрутам и статусам", ("method", "route", "status"))
+        self.query_seconds = self.histogram(
+            "chat_db_query_duration_seconds", "Время одного SQL-запроса")
+        self.unit_queries = self.histogram(
+            "chat_db_queries_per_unit", "SQL-запросов на запрос или событие", ("kind", "name"),
+            buckets=QUERY_COUNT_BUCKETS)
+        self.unit_query_seconds = self.histogram(
+            "chat_db_time_per_unit_seconds", "Время в SQL на запрос или событие", ("kind", "name"))
+        self.slow_queries = self.counter(
+            "chat_db_slow_queries_total", "SQL-запросы дольше SLOW_QUERY_MS")
+        self.budget_exceeded = self.counter(
+            "chat_db_query_budget_exceeded_total", "Запросы и события сверх бюджета SQL-запросов",
+            ("kind", "name"))
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help_text, labels, buckets)
+        self._collectors.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        metric = Counter(name, help_text, labels)
+        self._collectors.append(metric)
+        return metric
+
+    def init_app(self, app, socketio=None):
+        """Читает настройки, подключает хуки Flask и события движка БД, регистрирует /metrics"""
+        self.enabled = app.config.get("METRICS_ENABLED", True)
+        self.token = app.config.get("METRICS_TOKEN") or None
+        self._socketio = socketio
+        if not self.enabled:
+            return
+
+        from sqlalchemy import event
+        from extensions import db
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        with app.app_context():
+            event.listen(db.engine, "before_cursor_execute", self._before_cursor_execute)
+            event.listen(db.engine, "after_cursor_execute", self._after_cursor_execute)
+        app.add_url_rule("/metrics", "metrics", self.view)
+
+    # --- Единица работы: HTTP-запрос или событие Socket.IO ---
+    @staticmethod
+    def _begin_unit(kind, name):
+        # g — LocalProxy; реальный объект берём один раз, дальше обычные атрибуты
+        unit = g._get_current_object().metrics_unit = WorkUnit(kind, name)
+        return unit
+
+    def _check_budget(self, unit):
+        """Бюджет SQL-запросов единицы; в режиме raise исключение уходит в обработчик"""
+        if unit.checked:  # ответ-ошибка после QueryBudgetExceeded снова идёт через after_request
+            return
+        unit.checked = True
+        limit = query_budget.limit(unit.name, unit.method)
+        if limit is not None and unit.queries > limit:
+            self.budget_exceeded.inc((unit.kind, unit.name))
+            query_budget.exceeded(unit, limit)
+
+    def _end_unit(self, unit):
+        labels = (unit.kind, unit.name)
+        self.unit_queries.observe(unit.queries, labels)
+        self.unit_query_seconds.observe(unit.query_seconds, labels)
+
+    # --- Flask ---
+    def _before_request(self):
+        req = request._get_current_object()
+        rule = req.url_rule
+        unit = self._begin_unit("http", rule.rule if rule is not None else "<unmatched>")
+        unit.method = req.method
+
+    def _after_request(self, response):
+        unit = getattr(g._get_current_object(), "metrics_unit", None)
+        if unit is not None:
+            unit.status = response.status_code
+            # До отправки ответа: QueryBudgetExceeded становится ошибкой 500 с трассировкой
+            self._check_budget(unit)
+        return response
+
+    def _teardown_request(self, exc=None):
+        unit = getattr(g._get_current_object(), "metrics_unit", None)
+        if unit is None or unit.kind != "http":
+            return
+        if exc is not None:
+            unit.status = 500
+        self.request_seconds.observe(time.perf_counter() - unit.started, (unit.method, unit.name))
+        self.requests.inc((unit.method, unit.name, str(unit.status)))
+        self._end_unit(unit)
+
+    # --- Socket.IO ---
+    def track(self, event):
+        """Декоратор обработчика: гистограмма задержки, ошибки и SQL события"""
+        def decorator(handler):
+            @functools.wraps(handler)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return handler(*args, **kwargs)
+                unit = self._begin_unit("socket", event)
+                try:
+                    result = handler(*args, **kwargs)
+                    self._check_budget(unit)
+                    return result
+                except Exception:
+                    self.event_errors.inc((event,))
+                    raise
+                finally:
+                    self.event_seconds.observe(time.perf_counter() - unit.started, (event,))
+                    self._end_unit(unit)
+            return wrapper
+        return decorator
+
+    # --- SQLAlchemy ---
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._metrics_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_metrics_started", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        self.query_seconds.observe(elapsed)
+        # Запросы фоновых задач (write-behind, presence) вне единицы работы не считаются
+        unit = current_unit()
+        if unit is not None:
+            unit.queries += 1
+            unit.query_seconds += elapsed
+            if unit.statements is not None:
+                unit.statements.append(statement)
+        if elapsed >= query_budget.slow_seconds:
+            self.slow_queries.inc()
+            query_budget.slow_query(statement, elapsed, unit, executemany)
+
+    # --- Экспорт ---
+    def _gauges(self):
+        """(имя, метки, значение, справка) текущего состояния — считаются при опросе"""
+        gauges = []
+        server = getattr(self._socketio, "server", None)
+        if server is not None:
+            rooms = server.manager.rooms.get("/", {})
+            gauges.append(("chat_socket_connections", "", len(rooms.get(None, ())), "Подключённые сокеты"))
+            # Личная комната каждого sid, комната None («все») и комнаты форматов — не комнаты групп
+            from extensions import wire
+            service_rooms = (None, wire.JSON_ROOM, wire.MSGPACK_ROOM)
+            sizes = [len(members) for room, members in rooms.items()
+                     if room not in service_rooms and room not in members]
+            gauges.append(("chat_socket_rooms", "", len(sizes), "Комнаты групп с подключёнными участниками"))
+            gauges.append(("chat_socket_room_members_max", "", max(sizes, default=0),
+                           "Участников в самой большой комнате"))
+            room_sizes = Histogram("chat_socket_room_members", "Распределение комнат по числу участников",
+                                   buckets=ROOM_SIZE_BUCKETS)
+            for size in sizes:
+                room_sizes.observe(size)
+        else:
+            room_sizes = None
+
+        from services.backpressure import outbound_guard
+        from services.codeword_hasher import codeword_hasher
+        from services.fanout import fanout
+        from services.group_directory import group_directory
+        from services.message_cache import message_cache
+        from services.message_writer import message_writer
+        from services.rate_limit import rate_limiter
+        from services.thumbnails import thumbnails
+
+        services = {
+            "message_writer": message_writer, "message_cache": message_cache, "fanout": fanout, "rate_limit": rate_limiter,
+            "codeword_hasher": codeword_hasher, "backpressure": outbound_guard, "thumbnails": thumbnails,
+            "query_budget": query_budget, "group_directory": group_directory,
+        }
+        for service, instance in services.items():
+            for key, value in instance.stats().items():
+                name = f"chat_{service}_{key}"
+                if isinstance(value, (bool, int, float)):
+                    gauges.append((name, "", float(value), f"{service}.stats()['{key}']"))
+                elif isinstance(value, dict):
+                    # Счётчики по событию (rate_limit allowed/rejected) — метка key;
+                    # вложенные словари (rate_limit limits) — по метрике на поле:
+                    # chat_rate_limit_limits_rate{key="send_message"}
+                    fields = {}  # образцы одной метрики в выводе должны идти подряд
+                    for item, number in value.items():
+                        labels = _format_labels(("key",), (item,))
+                        if isinstance(number, (bool, int, float)):
+                            gauges.append((name, labels, float(number), f"{service}.stats()['{key}']"))
+                        elif isinstance(number, dict):
+                            for field, inner in number.items():
+                                if isinstance(inner, (bool, int, float)):
+                                    fields.setdefault(field, []).append((
+                                        f"{name}_{field}", labels, float(inner),
+                                        f"{service}.stats()['{key}'][...]['{field}']",
+                                    ))
+                    for samples in fields.values():
+                        gauges.extend(samples)
+        return gauges, room_sizes
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus 0.0.4"""
+        lines = []
+        collectors = list(self._collectors)
+        gauges, room_sizes = self._gauges()
+        if room_sizes is not None:
+            collectors.append(room_sizes)
+        for metric in collectors:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_number(value)}")
+        described = set()
+        for name, labels, value, help_text in gauges:
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name}{labels} {_format_number(value)}")
+        return "\n".join(lines) + "\n"
+
+    def view(self):
+        if not self._authorized():
+            return Response("unauthorized\n", status=401, mimetype="text/plain")
+        return Response(self.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+    def _authorized(self):
+        """
+        С METRICS_TOKEN — только с заголовком Authorization: Bearer <token>. Без токена —
+        только прямые запросы с loopback: адрес берётся до ProxyFix, а запрос с
+        X-Forwarded-For пришёл через прокси, то есть снаружи.
+        """
+        if self.token:
+            supplied = request.headers.get("Authorization", "")
+            return hmac.compare_digest(supplied.encode(), f"Bearer {self.token}".encode())
+        if request.headers.get("X-Forwarded-For") or request.headers.get("Forwarded"):
+            return False
+        original = request.environ.get("werkzeug.proxy_fix.orig", {})
+        peer = original.get("REMOTE_ADDR", request.environ.get("REMOTE_ADDR"))
+        return peer in _LOOPBACK
+
+
+metrics = Metrics()
@@ -0,0 +1,136 @@
+"""
+presence.py — онлайн-статус пользователей в памяти процесса.
+Подключения, отключения и heartbeat меняют только состояние в памяти; раз в
+PRESENCE_FLUSH_INTERVAL секунд изменения last_seen/is_online пишутся в users одним
+пакетным UPDATE, а клиентам уходит один кадр presence с разницей статусов.
+"""
+
+import atexit
+from datetime import datetime
+from sqlalchemy import update
+from extensions import db, socketio, wire
+from models.user import User
+
+
+class PresenceTracker:
+    """Учёт активных соединений пользователей с отложенной записью в БД."""
+
+    def __init__(self):
+        self.app = None
+        self.flush_interval = 5.0
+
+        self._by_sid = {}      # sid -> (user_id, uuid)
+        self._sids = {}        # user_id -> {sid, ...}
+        self._dirty = {}       # user_id -> {"id", "last_seen"[, "is_online"]}
+        self._changes = {}     # uuid -> онлайн ли пользователь (для кадра presence)
+        self._task = None
+        self._stopped = False
+
+    def init_app(self, app):
+        """Читает настройки из конфигурации приложения"""
+        self.app = app
+        self.flush_interval = app.config.get("PRESENCE_FLUSH_INTERVAL", 5.0)
+        atexit.register(self.shutdown)
+
+    def is_online(self, user_id):
+        return bool(self._sids.get(user_id))
+
+    def online_count(self):
+        return len(self._sids)
+
+    # --- События соединений ---
+    def connect(self, identity, sid):
+        """Новое соединение пользователя (повторный вызов для того же sid безопасен)"""
+        if sid in self._by_sid:
+            return
+        self._by_sid[sid] = (identity.user_id, identity.uuid)
+        sids = self._sids.setdefault(identity.user_id, set())
+        was_online = bool(sids)
+        sids.add(sid)
+        self._mark(identity.user_id, is_online=True)
+        if not was_online:
+            self._changes[identity.uuid] = True
+        self._ensure_started()
+
+    def disconnect(self, sid):
+        """Соединение закрыто; последнее соединение переводит пользователя в офлайн"""
+        known = self._by_sid.pop(sid, None)
+        if known is None:
+            return
+        user_id, user_uuid = known
+        sids = self._sids.get(user_id, set())
+        sids.discard(sid)
+        if not sids:
+            self._sids.pop(user_id, None)
+            self._mark(user_id, is_online=False)
+            self._changes[user_uuid] = False
+
+    def heartbeat(self, identity):
+        """Клиент жив — обновим last_seen при следующем сбросе"""
+        self._mark(identity.user_id, is_online=self.is_online(identity.user_id))
+
+    def touch(self, user):
+        """Активность по HTTP (например, /auth/me): только last_seen, без смены статуса"""
+        entry = self._dirty.get(user.id)
+        if entry is None:
+            self._dirty[user.id] = {"id": user.id, "last_seen": datetime.utcnow()}
+        else:
+            entry["last_seen"] = datetime.utcnow()
+        self._ensure_started()
+
+    def _mark(self, user_id, is_online):
+        self._dirty[user_id] = {"id": user_id, "last_seen": datetime.utcnow(), "is_online": is_online}
+
+    # --- Сброс в БД и рассылка ---
+    def flush(self):
+        """Пишет накопленные изменения пакетными UPDATE и рассылает кадр presence"""
+        dirty, self._dirty = self._dirty, {}
+        changes, self._changes = self._changes, {}
+
+        if dirty:
+            # ORM bulk UPDATE по первичному ключу; строки с разным набором полей — отдельно
+            with_status = [row for row in dirty.values() if "is_online" in row]
+            seen_only = [row for row in dirty.values() if "is_online" not in row]
+            with self.app.app_context():
+                try:
+                    if with_status:
+                        db.session.execute(update(User), with_status)
+                    if seen_only:
+                        db.session.execute(update(User), seen_only)
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    # Новые отметки важнее старых — возвращаем только отсутствующие
+                    for user_id, row in dirty.items():
+                        self._dirty.setdefault(user_id, row)
+                    print(f"⚠️ Presence flush failed ({len(dirty)} users): {e}")
+
+        if changes:
+            wire.broadcast("presence", {
+                "online": [uuid for uuid, online in changes.items() if online],
+                "offline": [uuid for uuid, online in changes.items() if not online],
+            })
+        return len(dirty)
+
+    def shutdown(self):
+        """При остановке процесса его соединения пропадают — пользователи уходят в офлайн"""
+        self._stopped = True
+        for user_id in list(self._sids):
+            self._mark(user_id, is_online=False)
+        self._sids.clear()
+        self._by_sid.clear()
+        if self._dirty and self.app is not None:
+            self.flush()
+
+    # --- Фоновая задача ---
+    def _ensure_started(self):
+        if self._task is None:
+            self._task = socketio.start_background_task(self._run)
+
+    def _run(self):
+        while not self._stopped:
+            socketio.sleep(self.flush_interval)
+            self.flush()
+
+
+presence = PresenceTracker()
@@ -0,0 +1,192 @@
+"""
+query_budget.py — бюджет SQL-запросов на единицу работы и лог медленных запросов.
+Счёт запросов и времени в БД на HTTP-запрос и событие Socket.IO ведёт services/metrics.py
+(WorkUnit, слушатели курсора движка); здесь — что с этим счётом делать:
+  * запрос дольше SLOW_QUERY_MS пишется в логгер chat.sql одной JSON-строкой: время,
+    текст (без параметров — в них кодовые слова и тексты сообщений), единица работы
+    и место вызова в коде приложения (первые кадры стека вне SQLAlchemy);
+  * единица работы, сделавшая больше запросов, чем её бюджет (QUERY_BUDGETS по имени
+    события, «МЕТОД шаблон» или шаблону маршрута, иначе QUERY_BUDGET_DEFAULT), в
+    режиме log пишется в тот же лог, а в режиме raise (по умолчанию при разработке и
+    в тестах) падает с QueryBudgetExceeded и списком повторяющихся запросов — так N+1
+    (счётчик участников в Group.to_dict на каждую группу) виден до релиза, а не на графиках.
+Для тестов — assert_max_queries: считает запросы внутри блока независимо от метрик.
+"""
+
+import json
+import logging
+import os
+import sys
+from collections import Counter
+from contextlib import contextmanager
+
+logger = logging.getLogger("chat.sql")
+
+MODES = ("off", "log", "raise")
+
+# Бюджеты по умолчанию для горячих путей: текущее число запросов с небольшим запасом
+DEFAULT_BUDGETS = {
+    "GET /api/groups": 2,
+    "GET /api/groups/<uuid:group_uuid>": 3,
+    "GET /api/groups/<uuid:group_uuid>/messages": 4,
+    "GET /auth/me": 2,
+    "GET /api/user/check": 2,
+    "send_message": 4,
+    "join_group": 4,
+    "load_older": 4,
+    "sync_groups": 4,
+    "heartbeat": 1,
+}
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_SKIP_FILES = {os.path.abspath(__file__), os.path.join(_ROOT, "services", "metrics.py")}
+_CALL_SITE_DEPTH = 3
+_STATEMENT_MAX_LENGTH = 2000
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Обработчик сделал больше SQL-запросов, чем разрешает его бюджет"""
+
+
+def parse_budgets(spec):
+    """QUERY_BUDGETS: словарь или строка "send_message=3,GET /api/groups=2" → словарь"""
+    if isinstance(spec, dict):
+        return spec
+    budgets = {}
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        name, _, value = item.rpartition("=")
+        budgets[name.strip()] = int(value)
+    return budgets
+
+
+def call_site(depth=_CALL_SITE_DEPTH):
+    """Кадры стека кода приложения, ближайший первым: ["routes/groups.py:18 get_groups", ...]"""
+    frames = []
+    frame = sys._getframe(1)
+    while frame is not None and len(frames) < depth:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(_ROOT) and filename not in _SKIP_FILES
+                and "site-packages" not in filename and "dist-packages" not in filename):
+            path = os.path.relpath(filename, _ROOT)
+            frames.append(f"{path}:{frame.f_lineno} {frame.f_code.co_name}")
+        frame = frame.f_back
+    return frames
+
+
+def _repeated(statements, top=3):
+    """Самые частые запросы — при N+1 это один и тот же SELECT с разными параметрами"""
+    return [f"{count}× {' '.join(statement.split())[:200]}"
+            for statement, count in Counter(statements).most_common(top)]
+
+
+class QueryBudget:
+    """Настройки бюджетов и лог медленных запросов; вызывается из services/metrics.py."""
+
+    def __init__(self):
+        self.mode = "off"
+        self.default = None
+        self.budgets = {}
+        self.slow_seconds = float("inf")
+        self.collect = False  # сохранять тексты запросов единицы для "repeated" (режимы log и raise)
+        self.slow_logged = 0
+        self.exceeded_logged = 0
+
+    def init_app(self, app):
+        mode = str(app.config.get("QUERY_BUDGET_MODE") or "off").lower()
+        if mode not in MODES:
+            print(f"⚠️ QUERY_BUDGET_MODE={mode}: ожидается один из {', '.join(MODES)} — бюджеты выключены")
+            mode = "off"
+        self.mode = mode
+        self.default = app.config.get("QUERY_BUDGET_DEFAULT") or None
+        self.budgets = {**DEFAULT_BUDGETS, **parse_budgets(app.config.get("QUERY_BUDGETS"))}
+        slow_ms = app.config.get("SLOW_QUERY_MS", 100)
+        self.slow_seconds = slow_ms / 1000 if slow_ms and slow_ms > 0 else float("inf")
+        # Тексты — ссылки на строки из кэша компиляции SQLAlchemy, список единицы дешёвый
+        self.collect = mode != "off"
+
+    def limit(self, name, method=None):
+        """Бюджет события или маршрута (сначала «МЕТОД шаблон»); None — без ограничения"""
+        if self.mode == "off":
+            return None
+        if method is not None:
+            limit = self.budgets.get(f"{method} {name}")
+            if limit is not None:
+                return limit
+        return self.budgets.get(name, self.default)
+
+    # --- Медленные запросы ---
+    def slow_query(self, statement, elapsed, unit=None, executemany=False):
+        """Пишет медленный запрос в лог с местом вызова (стек снимается только здесь)"""
+        self.slow_logged += 1
+        record = {
+            "event": "slow_query",
+            "ms": round(elapsed * 1000, 2),
+            "kind": unit.kind if unit is not None else None,
+            "name": unit.name if unit is not None else None,
+            "call_site": call_site(),
+            "executemany": executemany,
+            "statement": " ".join(statement.split())[:_STATEMENT_MAX_LENGTH],
+        }
+        logger.warning(json.dumps(record, ensure_ascii=False))
+
+    # --- Бюджет ---
+    def exceeded(self, unit, limit):
+        """Единица работы вышла за бюджет: запись в лог, в режиме raise — исключение"""
+        self.exceeded_logged += 1
+        repeated = _repeated(unit.statements) if unit.statements else []
+        record = {
+            "event": "query_budget_exceeded",
+            "kind": unit.kind,
+            "name": unit.name,
+            "queries": unit.queries,
+            "budget": limit,
+            "db_ms": round(unit.query_seconds * 1000, 2),
+            "repeated": repeated,
+        }
+        logger.warning(json.dumps(record, ensure_ascii=False))
+        if self.mode == "raise":
+            details = "".join(f"\n  {line}" for line in repeated)
+            raise QueryBudgetExceeded(
+                f"{unit.kind} {unit.name}: {unit.queries} SQL-запросов при бюджете {limit}{details}"
+            )
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "slow_query_ms": None if self.slow_seconds == float("inf") else self.slow_seconds * 1000,
+            "default_budget": self.default,
+            "slow_logged": self.slow_logged,
+            "exceeded_logged": self.exceeded_logged,
+        }
+
+
+@contextmanager
+def assert_max_queries(limit, engine=None):
+    """
+    Для тестов: блок выполняет не больше limit SQL-запросов, иначе AssertionError со
+    списком запросов. Отдаёт список текстов выполненных запросов.
+        with assert_max_queries(2):
+            client.get("/api/groups")
+    """
+    from sqlalchemy import event
+    from extensions import db
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = engine if engine is not None else db.engine
+    event.listen(engine, "after_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "after_cursor_execute", record)
+    if len(statements) > limit:
+        listing = "".join(f"\n  {n}. {statement[:200]}" for n, statement in enumerate(statements, 1))
+        raise AssertionError(f"{len(statements)} SQL-запросов при бюджете {limit}:{listing}")
+
+
+query_budget = QueryBudget()
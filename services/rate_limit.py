@@ -0,0 +1,202 @@
+"""
+rate_limit.py — ограничение частоты Socket.IO-событий (token bucket).
+У каждого события своя пара (скорость в токенах/с, ёмкость); событие списывает по
+токену из двух вёдер — соединения (sid) и пользователя (все его вкладки вместе).
+Вёдра живут в памяти процесса — тогда ведро пользователя общее только для вкладок,
+подключённых к этому же воркеру, и при N воркерах пользователь получает до N лимитов, —
+или, при RATE_LIMIT_BACKEND=redis, в Redis (одна Lua-функция на проверку — лимит общий
+для всех воркеров). Отказ стоит одной проверки
+словаря: обработчик не вызывается, БД не трогается, а уведомление rate_limited
+отправляется не чаще раза в секунду на соединение и событие.
+"""
+
+import functools
+import time
+from collections import OrderedDict
+from flask import request
+from flask_socketio import emit
+from services.socket_identity import socket_registry
+
+try:
+    import redis
+except ImportError:  # redis необязателен — без него счётчики только в памяти процесса
+    redis = None
+
+# Лимиты по умолчанию: событие → (токенов в секунду, ёмкость ведра)
+DEFAULT_LIMITS = {
+    "send_message": (5, 20),
+    "create_group": (0.2, 3),
+    "join_group": (5, 30),
+    "sync_groups": (0.5, 5),
+    "load_older": (5, 20),
+    "user_connected": (1, 5),
+    "heartbeat": (1, 5),
+    "default": (10, 50),
+}
+_NOTICE_INTERVAL = 1.0
+
+# Проверка обоих вёдер атомарно: токен списывается, только если он есть в каждом
+_REDIS_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local ttl = math.ceil(burst / rate * 1000) + 1000
+local levels, wait = {}, 0
+for i, key in ipairs(KEYS) do
+    local state = redis.call('HMGET', key, 't', 'ts')
+    local tokens = tonumber(state[1]) or burst
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+    levels[i] = tokens
+    if tokens < 1 then wait = math.max(wait, (1 - tokens) / rate) end
+end
+for i, key in ipairs(KEYS) do
+    local tokens = levels[i]
+    if wait == 0 then tokens = tokens - 1 end
+    redis.call('HSET', key, 't', tostring(tokens), 'ts', tostring(now))
+    redis.call('PEXPIRE', key, ttl)
+end
+return tostring(wait)
+"""
+
+
+def parse_limits(spec):
+    """RATE_LIMITS: словарь или строка "send_message=5:20,create_group=0.2:3" → словарь"""
+    if isinstance(spec, dict):
+        return spec
+    limits = {}
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        event, _, value = item.partition("=")
+        rate, _, burst = value.partition(":")
+        limits[event.strip()] = (float(rate), float(burst or rate))
+    return limits
+
+
+class RateLimiter:
+    """Token bucket на событие для соединения и пользователя, со счётчиками отказов."""
+
+    def __init__(self):
+        self.enabled = False
+        self.limits = dict(DEFAULT_LIMITS)
+        self.max_buckets = 100_000
+        self.backend = "memory"
+        self._redis = None
+        self._script = None
+        self._buckets = OrderedDict()  # ключ → [токены, время обновления]
+        self._notified = {}            # sid → {событие: когда уведомили об отказе}
+        self._redis_retry_at = 0.0
+
+        self.allowed = {}
+        self.rejected = {}
+        self.redis_errors = 0
+
+    def init_app(self, app):
+        """Читает настройки из конфигурации приложения"""
+        self.enabled = app.config.get("RATE_LIMIT_ENABLED", True)
+        self.limits = {**DEFAULT_LIMITS, **parse_limits(app.config.get("RATE_LIMITS"))}
+        self.max_buckets = app.config.get("RATE_LIMIT_MAX_BUCKETS", 100_000)
+        self.backend = "memory"
+        redis_url = app.config.get("RATE_LIMIT_REDIS_URL")
+        if app.config.get("RATE_LIMIT_BACKEND") == "redis":
+            if redis is None or not redis_url:
+                print("⚠️ RATE_LIMIT_BACKEND=redis, но нет пакета redis или REDIS_URL — лимиты в памяти")
+            else:
+                self.use_redis(redis.Redis.from_url(redis_url, socket_timeout=0.05))
+
+    def use_redis(self, client):
+        self._redis = client
+        self._script = client.register_script(_REDIS_SCRIPT)
+        self.backend = "redis"
+
+    # --- Проверка ---
+    def hit(self, event, sid, user_uuid=None):
+        """Списывает токен; возвращает 0, если событие разрешено, иначе через сколько секунд повторить"""
+        # События без своего лимита делят ведро default
+        name = event if event in self.limits else "default"
+        rate, burst = self.limits[name]
+        keys = [f"rl:{name}:s:{sid}"]
+        if user_uuid:
+            keys.append(f"rl:{name}:u:{user_uuid}")
+
+        wait = None
+        if self._redis is not None and time.monotonic() >= self._redis_retry_at:
+            try:
+                wait = float(self._script(keys=keys, args=[rate, burst]))
+            except redis.RedisError:
+                # Redis недоступен — ограничиваем в пределах процесса и не ждём его таймаутов секунду
+                self.redis_errors += 1
+                self._redis_retry_at = time.monotonic() + 1.0
+        if wait is None:
+            wait = self._hit_local(keys, rate, burst)
+
+        counters = self.rejected if wait else self.allowed
+        counters[event] = counters.get(event, 0) + 1
+        return wait
+
+    def _hit_local(self, keys, rate, burst):
+        now = time.monotonic()
+        buckets, wait = [], 0.0
+        for key in keys:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [burst, now]
+                if len(self._buckets) > self.max_buckets:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            if bucket[0] < 1:
+                wait = max(wait, (1 - bucket[0]) / rate)
+            buckets.append(bucket)
+        if not wait:
+            for bucket in buckets:
+                bucket[0] -= 1
+        return wait
+
+    # --- Обработчики Socket.IO ---
+    def limit(self, event):
+        """Декоратор обработчика: при исчерпании лимита событие отбрасывается"""
+        def decorator(handler):
+            @functools.wraps(handler)
+            def wrapper(*args, **kwargs):
+                if self.enabled:
+                    sid = request.sid
+                    identity = socket_registry.get(sid)
+                    wait = self.hit(event, sid, identity.uuid if identity else None)
+                    if wait:
+                        self._notify(sid, event, wait)
+                        return None
+                return handler(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _notify(self, sid, event, wait):
+        now = time.monotonic()
+        notified = self._notified.setdefault(sid, {})
+        if now - notified.get(event, 0) < _NOTICE_INTERVAL:
+            return
+        notified[event] = now
+        emit("rate_limited", {"event": event, "retry_after": round(wait, 2)})
+
+    def forget(self, sid):
+        """Соединение закрыто: его вёдра больше не нужны"""
+        for name in self.limits:
+            self._buckets.pop(f"rl:{name}:s:{sid}", None)
+        self._notified.pop(sid, None)
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "backend": self.backend,
+            "buckets": len(self._buckets),
+            "limits": {event: {"rate": rate, "burst": burst} for event, (rate, burst) in self.limits.items()},
+            "allowed": dict(self.allowed),
+            "rejected": dict(self.rejected),
+            "redis_errors": self.redis_errors,
+        }
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,189 @@
+"""
+search_index.py — полнотекстовый индекс сообщений.
+SQLite: внешняя FTS5-таблица messages_fts, синхронизируемая триггерами.
+PostgreSQL: колонка messages.search_vector (tsvector), заполняемая триггером, и GIN-индекс.
+Триггеры обновляют индекс на любой вставке — и из send_message (включая пакетную
+запись), и из системных сообщений routes/groups.py. Уже существующие строки
+индексирует search_backfill.py.
+"""
+
+import html
+import re
+from sqlalchemy import text
+from extensions import db
+
+# Маркеры подсветки: текст экранируется уже после поиска, затем маркеры заменяются на <mark>
+_MARK_START = "\ue000"
+_MARK_END = "\ue001"
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+_SQLITE_INSTALL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+        content, content='messages', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+]
+
+_POSTGRES_INSTALL = [
+    "ALTER TABLE messages ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    """
+    CREATE OR REPLACE FUNCTION messages_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := to_tsvector('simple', coalesce(NEW.content, ''));
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS messages_search_vector_trigger ON messages",
+    """
+    CREATE TRIGGER messages_search_vector_trigger
+        BEFORE INSERT OR UPDATE OF content ON messages
+        FOR EACH ROW EXECUTE FUNCTION messages_search_vector_update()
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_messages_search_vector ON messages USING GIN (search_vector)",
+]
+
+# Доступные пользователю сообщения: открытые группы и группы, где он участник
+_VISIBLE_GROUPS = """
+    m.group_id IN (
+        SELECT g.id FROM groups g
+        WHERE COALESCE(g.is_private, false) = false
+           OR g.id IN (SELECT ug.group_id FROM user_groups ug WHERE ug.user_id = :user_id)
+    )
+"""
+
+
+class SearchIndex:
+    """Поиск по сообщениям поверх FTS5 (SQLite) или tsvector + GIN (PostgreSQL)."""
+
+    def __init__(self):
+        self.auto_install = True
+
+    def init_app(self, app):
+        """Читает настройки и (по умолчанию) создаёт структуры индекса"""
+        self.auto_install = app.config.get("SEARCH_INDEX_AUTO_INSTALL", True)
+
+    @property
+    def dialect(self):
+        return db.engine.dialect.name
+
+    def install(self):
+        """Создаёт индекс и триггеры (идемпотентно). Возвращает имя диалекта или None."""
+        statements = {"sqlite": _SQLITE_INSTALL, "postgresql": _POSTGRES_INSTALL}.get(self.dialect)
+        if statements is None:
+            return None
+        with db.engine.begin() as conn:
+            for statement in statements:
+                conn.execute(text(statement))
+        return self.dialect
+
+    def backfill(self, chunk_size=10_000, progress=None):
+        """
+        Индексирует уже существующие сообщения. PostgreSQL — диапазонами id, чтобы не держать
+        длинную транзакцию; SQLite — командой rebuild FTS5. Возвращает число строк.
+        """
+        with db.engine.connect() as conn:
+            bounds = conn.execute(text("SELECT MIN(id), MAX(id) FROM messages")).one()
+        if bounds[0] is None:
+            return 0
+
+        if self.dialect == "sqlite":
+            # FTS5 перестраивает внешний индекс целиком одной командой (без дублей токенов)
+            with db.engine.begin() as conn:
+                conn.execute(text("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')"))
+                total = conn.execute(text("SELECT COUNT(*) FROM messages")).scalar()
+            if progress:
+                progress(bounds[1], bounds[1])
+            return total
+
+        if self.dialect != "postgresql":
+            raise RuntimeError(f"Полнотекстовый поиск не поддерживается для {self.dialect}")
+
+        statement = text(
+            "UPDATE messages SET search_vector = to_tsvector('simple', coalesce(content, '')) "
+            "WHERE id BETWEEN :low AND :high AND search_vector IS NULL"
+        )
+        total = 0
+        low, last = bounds
+        while low <= last:
+            high = low + chunk_size - 1
+            with db.engine.begin() as conn:
+                total += conn.execute(statement, {"low": low, "high": high}).rowcount or 0
+            if progress:
+                progress(min(high, last), last)
+            low = high + 1
+        return total
+
+    def search(self, query, user_id, group_id=None, limit=20, offset=0):
+        """
+        Ищет сообщения по словам запроса (все слова, последнее — как префикс).
+        Возвращает список (id сообщения, фрагмент с подсветкой <mark>).
+        """
+        tokens = _TOKEN_RE.findall(query or "")
+        if not tokens:
+            return []
+
+        params = {"user_id": user_id, "limit": limit, "offset": offset}
+        scope = "AND m.group_id = :group_id" if group_id is not None else f"AND {_VISIBLE_GROUPS}"
+        if group_id is not None:
+            params["group_id"] = group_id
+
+        if self.dialect == "sqlite":
+            # Каждое слово — в кавычках, чтобы пользовательский ввод не стал синтаксисом FTS5
+            terms = [f'"{token}"' for token in tokens]
+            terms[-1] += "*"
+            params["match"] = " ".join(terms)
+            params["start"], params["end"] = _MARK_START, _MARK_END
+            statement = text(f"""
+                SELECT m.id, snippet(messages_fts, 0, :start, :end, '…', 16) AS fragment
+                FROM messages_fts
+                JOIN messages m ON m.id = messages_fts.rowid
+                WHERE messages_fts MATCH :match
+                  AND m.is_encrypted IS NOT 1
+                  {scope}
+                ORDER BY messages_fts.rank, m.id DESC
+                LIMIT :limit OFFSET :offset
+            """)
+        elif self.dialect == "postgresql":
+            params["tsquery"] = " & ".join(tokens[:-1] + [f"{tokens[-1]}:*"])
+            params["options"] = f"StartSel={_MARK_START}, StopSel={_MARK_END}, MaxFragments=2, MaxWords=20"
+            statement = text(f"""
+                SELECT m.id, ts_headline('simple', m.content, q, :options) AS fragment
+                FROM messages m, to_tsquery('simple', :tsquery) q
+                WHERE m.search_vector @@ q
+                  AND m.is_encrypted IS NOT TRUE
+                  {scope}
+                ORDER BY ts_rank(m.search_vector, q) DESC, m.id DESC
+                LIMIT :limit OFFSET :offset
+            """)
+        else:
+            raise RuntimeError(f"Полнотекстовый поиск не поддерживается для {self.dialect}")
+
+        rows = db.session.execute(statement, params).all()
+        return [(row[0], _highlight(row[1])) for row in rows]
+
+
+def _highlight(fragment):
+    """Экранирует фрагмент и превращает маркеры в <mark>"""
+    escaped = html.escape(fragment or "")
+    return escaped.replace(_MARK_START, "<mark>").replace(_MARK_END, "</mark>")
+
+
+search_index = SearchIndex()
@@ -0,0 +1,85 @@
+"""
+socket_identity.py — реестр пользователей активных Socket.IO-соединений.
+Пользователь определяется один раз при подключении, дальше обработчики
+берут компактную запись по request.sid без запроса к таблице users.
+"""
+
+from datetime import datetime
+
+
+class SocketIdentity:
+    """Компактная запись о пользователе соединения (совместима с User.to_dict)"""
+
+    __slots__ = ("user_id", "uuid", "username", "connected_at")
+
+    def __init__(self, user_id, uuid, username):
+        self.user_id = user_id
+        self.uuid = uuid
+        self.username = username
+        self.connected_at = datetime.utcnow()
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(user.id, user.uuid, user.username)
+
+    def to_dict(self):
+        """Те же поля, что у User.to_dict(): соединение активно, значит пользователь онлайн"""
+        return {
+            'uuid': self.uuid,
+            'username': self.username,
+            'is_online': True,
+            'last_seen': self.connected_at.isoformat(),
+        }
+
+    def __repr__(self):
+        return f"<SocketIdentity {self.username} ({self.uuid})>"
+
+
+class SocketRegistry:
+    """Соответствие sid → SocketIdentity с обратным индексом uuid → sid'ы"""
+
+    def __init__(self):
+        self._by_sid = {}
+        self._sids_by_uuid = {}
+
+    def __len__(self):
+        return len(self._by_sid)
+
+    def get(self, sid, user_uuid=None):
+        """Запись соединения; если указан user_uuid — только при совпадении"""
+        identity = self._by_sid.get(sid)
+        if identity is None or (user_uuid and identity.uuid != user_uuid):
+            return None
+        return identity
+
+    def register(self, sid, user):
+        """Запоминает пользователя соединения (User или SocketIdentity)"""
+        identity = user if isinstance(user, SocketIdentity) else SocketIdentity.from_user(user)
+        self.remove(sid)
+        self._by_sid[sid] = identity
+        self._sids_by_uuid.setdefault(identity.uuid, set()).add(sid)
+        return identity
+
+    def remove(self, sid):
+        """Забывает соединение (при disconnect)"""
+        identity = self._by_sid.pop(sid, None)
+        if identity is None:
+            return None
+        sids = self._sids_by_uuid.get(identity.uuid)
+        if sids:
+            sids.discard(sid)
+            if not sids:
+                del self._sids_by_uuid[identity.uuid]
+        return identity
+
+    def sids_for(self, user_uuid):
+        """Все соединения пользователя в этом процессе"""
+        return set(self._sids_by_uuid.get(user_uuid, ()))
+
+    def invalidate_user(self, user_uuid):
+        """Сбрасывает записи пользователя — следующий обработчик перечитает его из БД"""
+        for sid in self.sids_for(user_uuid):
+            self.remove(sid)
+
+
+socket_registry = SocketRegistry()
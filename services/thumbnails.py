@@ -0,0 +1,135 @@
+"""
+thumbnails.py — превью и размеры изображений из хранилища.
+После загрузки файл ставится в очередь (schedule), а декодирование и сжатие в WebP
+выполняет пул процессов THUMBNAIL_WORKERS (utils/images.py) — ни запрос загрузки, ни
+хаб eventlet на это время не занимаются. Когда превью готово, в StoredFile записываются
+размеры и путь превью, кэш истории затронутых групп сбрасывается, а в их комнаты уходит
+событие thumbnail_ready. Без Pillow сервис выключен, сообщения отдаются без превью.
+"""
+
+import atexit
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy import select
+from extensions import db, socketio, wire
+from models.message import Message
+from models.upload import StoredFile
+from services.file_store import file_store
+from services.group_directory import group_key
+from services.message_cache import message_cache
+from utils.images import Image, make_thumbnail
+
+# Опрос готовности превью: от 10 мс с удвоением до 200 мс
+_POLL_MIN = 0.01
+_POLL_MAX = 0.2
+
+
+class Thumbnailer:
+    """Фоновое создание превью изображений в пуле процессов."""
+
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+        self.max_size = 320
+        self.quality = 75
+        self.workers = 2
+        self._pool = None
+        self._pending = set()  # id файлов, для которых превью уже считается
+
+        self.created = 0
+        self.failed = 0
+
+    def init_app(self, app):
+        """Читает настройки из конфигурации приложения"""
+        self.app = app
+        self.max_size = app.config.get("THUMBNAIL_MAX_SIZE", 320)
+        self.quality = app.config.get("THUMBNAIL_QUALITY", 75)
+        self.workers = app.config.get("THUMBNAIL_WORKERS", 2)
+        self.enabled = app.config.get("THUMBNAILS_ENABLED", True) and Image is not None
+        if app.config.get("THUMBNAILS_ENABLED", True) and Image is None:
+            print("⚠️ Pillow не установлен — превью изображений отключены")
+
+    def _executor(self):
+        if self._pool is None:
+            # spawn: дочерние процессы не наследуют хаб eventlet и соединения с БД.
+            # Они импортируют главный модуль: под gunicorn это сам gunicorn, при
+            # python app.py — app.py (лишний create_app() на процесс пула, только в разработке)
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+            atexit.register(self.shutdown)
+        return self._pool
+
+    # --- Очередь ---
+    def schedule(self, stored):
+        """Ставит изображение в очередь на превью (повторные вызовы ничего не делают)"""
+        if (not self.enabled or stored is None or stored.thumbnail_path
+                or stored.id in self._pending or file_store.message_type_for(stored) != "image"):
+            return False
+        self._pending.add(stored.id)
+        target = file_store.thumbnail_relative_path(stored, self.max_size)
+        future = self._executor().submit(
+            make_thumbnail, file_store.full_path(stored),
+            file_store.full_path(stored, target), self.max_size, self.quality,
+        )
+        socketio.start_background_task(self._complete, stored.id, target, future)
+        return True
+
+    def _complete(self, file_id, target, future):
+        """Ждёт результат пула и сохраняет его (в фоновой задаче, не в запросе)"""
+        # future.result() заблокировал бы весь хаб eventlet: опрашиваем, уступая управление
+        delay = _POLL_MIN
+        while not future.done():
+            socketio.sleep(delay)
+            delay = min(delay * 2, _POLL_MAX)
+        try:
+            (width, height), _ = future.result()
+        except Exception as e:
+            self.failed += 1
+            print(f"⚠️ Превью для файла {file_id} не создано: {e}")
+            return
+        finally:
+            self._pending.discard(file_id)
+
+        with self.app.app_context():
+            stored = db.session.get(StoredFile, file_id)
+            if stored is None:
+                return
+            stored.width, stored.height, stored.thumbnail_path = width, height, target
+            db.session.commit()
+            self.created += 1
+            self._announce(stored)
+
+    def _announce(self, stored):
+        """Сбрасывает кэш истории групп с этим файлом и сообщает клиентам о превью"""
+        group_ids = db.session.execute(
+            select(Message.group_id).where(Message.file_id == stored.id).distinct()
+        ).scalars().all()
+        payload = {
+            "file_url": file_store.url_for(stored),
+            "thumbnail_url": file_store.thumbnail_url_for(stored),
+            "width": stored.width,
+            "height": stored.height,
+        }
+        for group_id in map(group_key, group_ids):
+            if group_id is None:
+                continue
+            # Комнаты и кэш адресуются тем же group_key, что и в join_group / send_message
+            message_cache.invalidate(group_id)
+            wire.emit_to_room("thumbnail_ready", {"group_id": group_id, **payload}, group_id)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "pending": len(self._pending),
+            "created": self.created,
+            "failed": self.failed,
+        }
+
+
+thumbnails = Thumbnailer()
@@ -20,6 +20,13 @@ document.addEventListener("DOMContentLoaded", () => {
 
     let currentGroupId = null;
 
+    // Группы, в которые вошли, и id последнего полученного в каждой сообщения (null — ещё
+    // неизвестен). По ним после resync (сервер выбросил кадры перегруженного соединения)
+    // и после переподключения запрашиваются пропущенные сообщения — sync_groups.
+    const lastIds = new Map();
+    // uuid уже показанных сообщений: дельта истории может повторить полученные вживую
+    const seenMessages = new Set();
+
     // === Подключение ===
     socket.on("connect", () => {
         console.log("✅ Connected to chat server");
@@ -27,17 +34,68 @@ document.addEventListener("DOMContentLoaded", () => {
             uuid: userData.uuid,
             username: userData.username
         });
+        // Переподключение: комнаты на сервере потеряны — входим заново и догружаем пропущенное
+        syncGroups();
     });
 
+    // === Догрузка пропущенного после перегрузки соединения ===
+    socket.on("resync", () => syncGroups());
+
+    function syncGroups() {
+        if (!lastIds.size) return;
+        const groups = [...lastIds].map(([group_id, last_id]) =>
+            last_id == null ? { group_id } : { group_id, last_id });
+        socket.emit("sync_groups", { groups });
+    }
+
+    function rememberId(groupId, id) {
+        if (id == null || !lastIds.has(groupId)) return;
+        const last = lastIds.get(groupId);
+        if (last == null || id > last) lastIds.set(groupId, id);
+    }
+
     socket.on("disconnect", () => {
         console.log("⚠️ Disconnected from server");
     });
 
     // === Обработка новых сообщений ===
-    socket.on("new_message", (msg) => {
-        appendMessage(msg);
+    socket.on("new_message", (msg) => receiveMessage(msg));
+    socket.on("new_messages", (batch) => batch.messages.forEach(receiveMessage));
+
+    // При write-behind id приходит отправителю позже, отдельным кадром
+    socket.on("message_saved", (saved) => rememberId(saved.group_id, saved.id));
+
+    // === История: страница при входе или дельта после sync_groups (delta: true) ===
+    socket.on("chat_history", (page) => {
+        // gap: пропущено слишком много — пришла только последняя страница, рисуем её заново
+        if (page.gap && String(page.group_id) === String(currentGroupId)) {
+            chatBox.innerHTML = "";
+            seenMessages.clear();
+        }
+        page.messages.forEach((entry) => {
+            const user = page.users[entry.user_uuid] || {};
+            receiveMessage({
+                id: entry.id,
+                message_uuid: entry.uuid,
+                group_id: page.group_id,
+                text: entry.content,
+                sender: user.username,
+                uuid: entry.user_uuid,
+                timestamp: entry.created_at
+            });
+        });
     });
 
+    function receiveMessage(msg) {
+        rememberId(msg.group_id, msg.id);
+        if (msg.message_uuid) {
+            if (seenMessages.has(msg.message_uuid)) return;
+            if (seenMessages.size > 5000) seenMessages.clear();
+            seenMessages.add(msg.message_uuid);
+        }
+        if (String(msg.group_id) === String(currentGroupId)) appendMessage(msg);
+    }
+
     // === Обновление списка групп ===
     socket.on("group_list", (groups) => {
         updateGroupList(groups);
@@ -85,13 +143,20 @@ document.addEventListener("DOMContentLoaded", () => {
 
         const time = new Date(msg.timestamp).toLocaleTimeString([], { hour: "2-digit", minute: "2-digit" });
 
-        msgEl.innerHTML = `
-            <div class="message-header">
-                <span class="message-user">${msg.sender}</span>
-                <span class="message-time">${time}</span>
-            </div>
-            <div class="message-body">${msg.text}</div>
-        `;
+        // textContent, а не innerHTML: текст и имя приходят от других пользователей
+        const header = document.createElement("div");
+        header.classList.add("message-header");
+        const user = document.createElement("span");
+        user.classList.add("message-user");
+        user.textContent = msg.sender || "";
+        const timeEl = document.createElement("span");
+        timeEl.classList.add("message-time");
+        timeEl.textContent = time;
+        header.append(user, timeEl);
+        const body = document.createElement("div");
+        body.classList.add("message-body");
+        body.textContent = msg.text || "";
+        msgEl.append(header, body);
 
         chatBox.appendChild(msgEl);
         chatBox.scrollTop = chatBox.scrollHeight;
@@ -111,8 +176,11 @@ document.addEventListener("DOMContentLoaded", () => {
         li.addEventListener("click", () => {
             currentGroupId = group.id;
             currentGroupName.textContent = group.name;
-            socket.emit("join_group", { group_id: group.id });
+            if (!lastIds.has(group.id)) lastIds.set(group.id, null);
             chatBox.innerHTML = "";
+            // История придёт целиком — показанные раньше сообщения рисуем заново
+            seenMessages.clear();
+            socket.emit("join_group", { group_id: group.id });
         });
 
         groupList.appendChild(li);
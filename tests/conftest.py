@@ -0,0 +1,94 @@
+"""
+conftest.py — общие фикстуры тестов: приложение на временной SQLite-БД и синтетические данные.
+DATABASE_URL выставляется до импорта app: модуль создаёт приложение при импорте.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_TMP_DIR = tempfile.mkdtemp(prefix="chat-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP_DIR, 'test.db')}"
+# Бюджеты SQL-запросов работают поверх метрик; в тестах превышение — ошибка
+os.environ["METRICS_ENABLED"] = "true"
+os.environ["QUERY_BUDGET_MODE"] = "raise"
+
+
+@pytest.fixture(scope="session")
+def app():
+    from app import app
+    from services.file_store import file_store
+
+    app.config.update(TESTING=True)
+    # Загрузки — во временный каталог, а не в static/uploads репозитория
+    file_store.root = os.path.join(_TMP_DIR, "uploads")
+    os.makedirs(file_store.root, exist_ok=True)
+    return app
+
+
+@pytest.fixture
+def seed_chat(app):
+    """
+    seed_chat(groups, users=None, messages=0) — заполняет пустую БД генератором
+    utils/synthetic.py и возвращает SyntheticChat; прежние данные удаляются.
+    """
+    from seed_data import TABLES
+    from extensions import db
+    from services.bulk_loader import BulkLoader
+    from utils.synthetic import SyntheticChat
+
+    def seed(groups, users=None, messages=0):
+        with app.app_context():
+            for name in ("messages", "user_groups", "groups", "users"):
+                db.session.execute(TABLES[name].delete())
+            db.session.commit()
+            db.session.remove()
+            chat = SyntheticChat(users or groups * 2, groups, messages)
+            with BulkLoader() as loader:
+                for name, rows in chat.tables():
+                    loader.load(TABLES[name], rows)
+        return chat
+
+    return seed
+
+
+@pytest.fixture
+def login(app):
+    """login(client, user_id) — сессия пользователя без проверки кодового слова; возвращает uuid"""
+    from extensions import db
+    from models.user import User
+
+    def log_in(client, user_id):
+        with app.app_context():
+            user = db.session.get(User, user_id)
+            uuid = user.uuid
+        with client.session_transaction() as session:
+            session["user_uuid"] = uuid
+            session["user_id"] = user_id
+        return uuid
+
+    return log_in
+
+
+@pytest.fixture
+def history_cache():
+    """Включённый и пустой кэш истории (services/message_cache.py); после теста — как был"""
+    from services.message_cache import message_cache
+
+    def reset():
+        message_cache._groups.clear()
+        message_cache._generations.clear()
+        message_cache._bytes = 0
+        message_cache.hits = message_cache.misses = message_cache.evictions = 0
+
+    enabled = message_cache.enabled
+    reset()
+    message_cache.enabled = True
+    yield message_cache
+    message_cache.enabled = enabled
+    reset()
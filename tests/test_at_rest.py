@@ -0,0 +1,112 @@
+"""
+Шифрование сообщений в БД (extensions.EncryptionManager, utils/aead.py):
+активная версия ключа и её перечитывание из keyring, перешифровка при ротации
+(services/key_rotation.py) и вывод старой версии только после льготного периода.
+"""
+
+import uuid
+from datetime import timedelta
+
+import pytest
+
+import extensions
+from extensions import db, encryption
+from models.message import Message
+from services.key_rotation import key_rotation
+from utils.aead import AeadEngine, Keyring
+
+
+@pytest.fixture
+def keyring(tmp_path, monkeypatch):
+    keyring = Keyring(str(tmp_path / "keyring.json"))
+    keyring.add_key("aes-gcm")
+    monkeypatch.setattr(encryption, "engine", AeadEngine(keyring))
+    monkeypatch.setattr(encryption, "at_rest", True)
+    monkeypatch.setattr(encryption, "_next_refresh", 0.0)
+    return keyring
+
+
+def test_seal_checks_keyring_at_most_once_per_interval(keyring, monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(extensions.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(encryption, "refresh_interval", 1.0)
+    refreshes = []
+    original = keyring.refresh
+    monkeypatch.setattr(keyring, "refresh", lambda: refreshes.append(1) or original())
+
+    for _ in range(50):
+        sealed = encryption.seal("привет")
+    assert len(refreshes) == 1
+    assert encryption.open(sealed["content"]) == "привет"
+
+    clock[0] += 1.5
+    encryption.seal("ещё")
+    assert len(refreshes) == 2
+
+
+def test_seal_picks_up_key_rotated_elsewhere(keyring, monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(extensions.time, "monotonic", lambda: clock[0])
+    first = encryption.seal("до ротации")["encryption_key"]
+
+    # Другой процесс (rotate_keys.py) добавил версию в тот же файл
+    other = Keyring(keyring.path)
+    version = other.add_key("aes-gcm")
+
+    assert encryption.seal("в пределах интервала")["encryption_key"] == first
+    clock[0] += encryption.refresh_interval
+    assert encryption.seal("после")["encryption_key"] == encryption.key_tag(version)
+
+
+@pytest.fixture
+def sealed_messages(app, seed_chat, keyring, monkeypatch):
+    """Пять сообщений группы 1, зашифрованных первой версией ключа"""
+    seed_chat(1, users=1)
+    monkeypatch.setattr(key_rotation, "pause", 0)
+    monkeypatch.setattr(key_rotation, "batch_size", 2)
+    with app.app_context():
+        for index in range(5):
+            db.session.add(Message(uuid=str(uuid.uuid4()), group_id=1, user_id=1,
+                                   **encryption.seal(f"сообщение {index}")))
+        db.session.commit()
+    return [f"сообщение {index}" for index in range(5)]
+
+
+def _contents(app):
+    with app.app_context():
+        rows = Message.query.order_by(Message.id).all()
+        return [row.encryption_key for row in rows], [encryption.open(row.content) for row in rows]
+
+
+def test_rotation_reencrypts_and_retires_old_key(app, keyring, sealed_messages, monkeypatch):
+    old = keyring.active
+    new = key_rotation.rotate(background=False)
+
+    tags, texts = _contents(app)
+    assert set(tags) == {encryption.key_tag(new)}
+    assert texts == sealed_messages
+    # Старая версия выведена, но ещё расшифровывает — строки могли остаться в очереди
+    assert old in keyring.retired and old in keyring.versions()
+
+    monkeypatch.setattr(key_rotation, "retire_grace", timedelta(0))
+    key_rotation.reencrypt()
+    assert old not in keyring.versions()
+
+
+def test_retired_key_kept_while_rows_still_use_it(app, keyring, sealed_messages):
+    old = keyring.active
+    key_rotation.rotate(background=False)
+    assert old in keyring.retired
+
+    # Строка, запечатанная старым ключом, записалась после ротации (write-behind)
+    token = encryption.engine.encrypt("из очереди", old)
+    with app.app_context():
+        db.session.add(Message(uuid=str(uuid.uuid4()), group_id=1, user_id=1, content=token,
+                               is_encrypted=True, encryption_key=encryption.key_tag(old)))
+        db.session.commit()
+
+    key_rotation._retire_unused()
+    assert old not in keyring.retired
+    key_rotation.reencrypt()
+    assert _contents(app)[1][-1] == "из очереди"
+    assert old in keyring.retired
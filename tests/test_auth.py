@@ -0,0 +1,54 @@
+"""
+Вход по UUID и кодовому слову (routes/auth.py): миграция хешей старого формата.
+"""
+
+import hashlib
+
+from services.codeword_hasher import HasherBusy, codeword_hasher
+
+CODEWORD = "correct horse"
+
+
+def _legacy_user(app, seed_chat):
+    """Пользователь с несолёным SHA-256 кодового слова — формат до миграции"""
+    from extensions import db
+    from models.user import User
+
+    seed_chat(1, users=1)
+    with app.app_context():
+        user = db.session.get(User, 1)
+        user.codeword_hash = hashlib.sha256(CODEWORD.encode()).hexdigest()
+        db.session.commit()
+        return user.uuid, user.codeword_hash
+
+
+def _stored_hash(app):
+    from extensions import db
+    from models.user import User
+
+    with app.app_context():
+        return db.session.get(User, 1).codeword_hash
+
+
+def test_legacy_hash_is_upgraded_on_login(app, seed_chat):
+    user_uuid, legacy = _legacy_user(app, seed_chat)
+
+    response = app.test_client().post("/auth/join", json={"uuid": user_uuid, "codeword": CODEWORD})
+
+    assert response.status_code == 200
+    assert _stored_hash(app) != legacy
+    assert not codeword_hasher.needs_rehash(_stored_hash(app))
+
+
+def test_busy_hasher_skips_upgrade_but_logs_in(app, seed_chat, monkeypatch):
+    user_uuid, legacy = _legacy_user(app, seed_chat)
+
+    def busy(codeword):
+        raise HasherBusy()
+
+    monkeypatch.setattr(codeword_hasher, "hash", busy)
+    response = app.test_client().post("/auth/join", json={"uuid": user_uuid, "codeword": CODEWORD})
+
+    assert response.status_code == 200
+    assert response.get_json()["success"]
+    assert _stored_hash(app) == legacy
@@ -0,0 +1,153 @@
+"""
+Защита исходящей очереди (services/backpressure.py): встраивание в send_packet
+текущего сервера Engine.IO, сброс и схлопывание кадров перегруженного соединения,
+resync после разгрузки и отключение медленного клиента.
+"""
+
+import queue
+
+import pytest
+from engineio import packet as eio_packet
+from socketio import packet as sio_packet
+
+from extensions import socketio
+from services.backpressure import OutboundGuard, _event_of, outbound_guard
+
+
+class FakeSocket:
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.closed = False
+        self.aborted = False
+
+    def close(self, wait=True, abort=False):
+        self.closed, self.aborted = True, abort
+
+
+class FakeEngineIO:
+    """Сервер Engine.IO без сети: send_packet кладёт пакет в очередь соединения"""
+
+    def __init__(self):
+        self.sockets = {}
+        self.sent = []
+        self.tasks = []
+
+    def send_packet(self, eio_sid, pkt):
+        self.sent.append((eio_sid, pkt))
+        if eio_sid in self.sockets:
+            self.sockets[eio_sid].queue.put(pkt)
+
+    def start_background_task(self, target):
+        self.tasks.append(target)  # проверку тест вызывает сам (check)
+        return target
+
+
+def _frame(event, size=100):
+    data = sio_packet.Packet(sio_packet.EVENT, namespace="/", data=[event, "x" * size]).encode()
+    return eio_packet.Packet(eio_packet.MESSAGE, data=data)
+
+
+def _queued(socket):
+    return [_event_of(pkt)[0] for pkt in socket.queue.queue]
+
+
+@pytest.fixture
+def slow_client():
+    guard = OutboundGuard()
+    guard.enabled = True
+    guard.min_packets = 2
+    guard.high_watermark = 1000
+    guard.low_watermark = 300
+    guard.max_bytes = 5000
+    eio = FakeEngineIO()
+    socket = eio.sockets["sid"] = FakeSocket()
+    guard.attach(eio)
+    return guard, eio, socket
+
+
+def _congest(guard, eio):
+    """Ответы на запросы клиента (не сбрасываются) копятся выше верхнего знака"""
+    for _ in range(12):
+        eio.send_packet("sid", _frame("chat_history"))
+    assert guard.stats()["congested"] == 1
+
+
+@pytest.fixture
+def guard(app):
+    yield outbound_guard
+    outbound_guard.attach(socketio.server.eio)
+
+
+def test_attached_to_current_server(app):
+    assert outbound_guard._eio is socketio.server.eio
+    assert socketio.server.eio.send_packet == outbound_guard._send_packet
+
+
+def test_reattach_moves_to_new_server(guard):
+    first, second = FakeEngineIO(), FakeEngineIO()
+    guard.attach(first)
+    guard.attach(second)  # новый create_app() — новый сервер
+
+    assert second.send_packet == guard._send_packet
+    assert "send_packet" not in vars(first) or first.send_packet != guard._send_packet
+
+    second.send_packet("sid", "pkt")
+    first.send_packet("sid", "other")
+    assert second.sent == [("sid", "pkt")]
+    assert first.sent == [("sid", "other")]
+
+    guard.attach(second)  # повторно тот же сервер — обёртка не наслаивается
+    second.send_packet("sid", "again")
+    assert second.sent[-1] == ("sid", "again") and len(second.sent) == 2
+
+
+def test_congested_connection_drops_and_resyncs(slow_client):
+    guard, eio, socket = slow_client
+    eio.send_packet("sid", _frame("new_message"))
+    eio.send_packet("sid", _frame("presence"))
+    _congest(guard, eio)
+    # Уже стоящие в очереди presence/new_message вычищены при переходе знака
+    assert set(_queued(socket)) == {"chat_history"}
+
+    eio.send_packet("sid", _frame("typing"))
+    eio.send_packet("sid", _frame("new_message"))
+    eio.send_packet("sid", _frame("group_list"))
+    assert _queued(socket)[-1] == "group_list" and "new_message" not in _queued(socket)
+    assert guard.stats()["collapsed"] == 1 and guard.stats()["dropped"] >= 3
+
+    guard.check()  # ещё выше нижнего знака — ждём
+    assert guard.stats()["congested"] == 1 and guard.stats()["resyncs"] == 0
+
+    while not socket.queue.empty():  # клиент вычитал очередь
+        socket.queue.get_nowait()
+        socket.queue.task_done()
+    guard.check()
+    assert _queued(socket) == ["resync"]
+    assert guard.stats()["congested"] == 0 and guard.stats()["resyncs"] == 1
+    assert not socket.closed
+
+    eio.send_packet("sid", _frame("new_message"))
+    assert _queued(socket)[-1] == "new_message"
+
+
+def test_slow_client_evicted_over_byte_limit(slow_client):
+    guard, eio, socket = slow_client
+    _congest(guard, eio)
+    for _ in range(20):
+        eio.send_packet("sid", _frame("chat_history", size=500))
+        if "sid" not in eio.sockets:
+            break
+
+    assert socket.closed and socket.aborted
+    assert socket.queue.empty() and socket.queue.unfinished_tasks == 0
+    assert guard.stats()["evictions"] == 1 and guard.stats()["congested"] == 0
+
+
+def test_slow_client_evicted_after_timeout(slow_client):
+    guard, eio, socket = slow_client
+    _congest(guard, eio)
+    guard._congested["sid"].since -= guard.evict_after + 1
+
+    guard.check()
+    assert socket.closed and "sid" not in eio.sockets
+    assert guard.stats()["evictions"] == 1
@@ -0,0 +1,125 @@
+"""
+Загрузка по частям (routes/upload.py, services/chunked_upload.py): докачка с
+подтверждённого смещения, отказ устаревшим повторам и параллельной записи части,
+проверка Content-Range, чужие и отменённые сессии, хеш собранного файла.
+"""
+
+import fcntl
+import hashlib
+import os
+
+import pytest
+
+from services import chunked_upload
+from services.chunked_upload import chunked_uploads
+from services.file_store import file_store
+
+DATA = bytes(range(256)) * 40  # 10 240 байт
+
+
+@pytest.fixture
+def client(app, seed_chat, login):
+    seed_chat(1, users=2)
+    client = app.test_client()
+    login(client, 1)
+    return client
+
+
+def _start(client, size=len(DATA), filename="archive.zip"):
+    response = client.post("/upload/sessions", json={"filename": filename, "size": size})
+    assert response.status_code == 201
+    return response.get_json()["upload_id"]
+
+
+def _put(client, upload_id, start, chunk, size=len(DATA)):
+    return client.put(f"/upload/sessions/{upload_id}", data=chunk, headers={
+        "Content-Range": f"bytes {start}-{start + len(chunk) - 1}/{size}",
+    })
+
+
+def _offset(client, upload_id):
+    return client.get(f"/upload/sessions/{upload_id}").get_json()["offset"]
+
+
+def test_resume_from_confirmed_offset(client):
+    upload_id = _start(client)
+    half = len(DATA) // 2
+    assert _put(client, upload_id, 0, DATA[:half]).get_json()["offset"] == half
+    assert _offset(client, upload_id) == half
+
+    # Повтор уже принятой части и «перескок» вперёд — 409 с текущим смещением
+    for start in (0, half + 1):
+        response = _put(client, upload_id, start, DATA[start:start + 100])
+        assert response.status_code == 409 and response.get_json()["offset"] == half
+
+    response = client.post(f"/upload/sessions/{upload_id}/finalize")
+    assert response.status_code == 409 and response.get_json()["offset"] == half
+
+    assert _put(client, upload_id, half, DATA[half:]).get_json()["offset"] == len(DATA)
+    body = client.post(f"/upload/sessions/{upload_id}/finalize").get_json()
+    relative = body["url"][len(file_store.url_prefix) + 1:]
+    with open(os.path.join(file_store.root, relative), "rb") as f:
+        assert f.read() == DATA
+
+    # Повторное завершение возвращает тот же файл
+    again = client.post(f"/upload/sessions/{upload_id}/finalize").get_json()
+    assert again["url"] == body["url"] and again["deduplicated"]
+    assert _put(client, upload_id, 0, DATA[:10]).status_code == 409
+
+
+@pytest.mark.parametrize("headers", [
+    {},
+    {"Content-Range": "bytes 0-9/99"},                          # не тот размер файла
+    {"Content-Range": f"bytes 0-{len(DATA)}/{len(DATA)}"},      # за концом файла
+    {"Content-Range": "bytes 9-0/%d" % len(DATA)},              # конец раньше начала
+])
+def test_bad_content_range(client, headers):
+    upload_id = _start(client)
+    response = client.put(f"/upload/sessions/{upload_id}", data=DATA[:10], headers=headers)
+    assert response.status_code == 416 and response.get_json()["offset"] == 0
+
+
+def test_concurrent_part_is_refused(client):
+    upload_id = _start(client)
+    with open(os.path.join(chunked_uploads.partial_dir, f"{upload_id}.part"), "r+b") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)  # часть пишет другой запрос
+        response = _put(client, upload_id, 0, DATA[:100])
+        assert response.status_code == 409 and response.get_json()["offset"] == 0
+    assert _put(client, upload_id, 0, DATA[:100]).get_json()["offset"] == 100
+
+
+def test_session_private_and_abortable(app, client, login):
+    upload_id = _start(client)
+    other = app.test_client()
+    login(other, 2)
+    assert other.get(f"/upload/sessions/{upload_id}").status_code == 404
+    assert _put(other, upload_id, 0, DATA[:10]).status_code == 404
+
+    assert client.delete(f"/upload/sessions/{upload_id}").status_code == 200
+    assert not os.path.exists(os.path.join(chunked_uploads.partial_dir, f"{upload_id}.part"))
+    assert client.get(f"/upload/sessions/{upload_id}").status_code == 404
+
+
+def test_finalize_hashes_off_the_hub(client, monkeypatch):
+    offloaded = []
+
+    class FakeTpool:
+        @staticmethod
+        def execute(fn, *args):
+            offloaded.append(fn.__name__)
+            return fn(*args)
+
+    class FakePatcher:
+        @staticmethod
+        def is_monkey_patched(module):
+            return True
+
+    monkeypatch.setattr(chunked_upload, "tpool", FakeTpool)
+    monkeypatch.setattr(chunked_upload, "patcher", FakePatcher)
+
+    upload_id = _start(client)
+    assert _put(client, upload_id, 0, DATA).status_code == 200
+    body = client.post(f"/upload/sessions/{upload_id}/finalize").get_json()
+
+    assert offloaded == ["file_sha256"]
+    assert body["sha256"] == hashlib.sha256(DATA).hexdigest()
@@ -0,0 +1,68 @@
+"""
+Перенос старых загрузок (dedupe_uploads.py) и сборка мусора хранилища
+(FileStore.collect_garbage): перенесённые файлы не удаляются, даже если ни одно
+сообщение на них не ссылается.
+"""
+
+import io
+import os
+from datetime import timedelta
+
+import pytest
+
+import dedupe_uploads
+from extensions import db
+from models.message import Message
+from models.upload import StoredFile
+from services.file_store import file_store
+
+
+@pytest.fixture
+def store(app, seed_chat):
+    seed_chat(1, users=1)
+    with app.app_context():
+        StoredFile.query.delete()
+        db.session.commit()
+    for name in os.listdir(file_store.root):
+        path = os.path.join(file_store.root, name)
+        if os.path.isfile(path):
+            os.remove(path)
+    return file_store
+
+
+def _legacy(name, data):
+    with open(os.path.join(file_store.root, name), "wb") as f:
+        f.write(data)
+    return f"/static/uploads/{name}"
+
+
+def test_migrated_uploads_survive_garbage_collection(app, store):
+    unreferenced = _legacy("0b5c8f9e.pdf", b"old report")
+    referenced = _legacy("7d1e2a44.txt", b"old note")
+    with app.app_context():
+        db.session.add(Message(content="file", user_id=1, group_id=1, file_url=referenced))
+        db.session.commit()
+
+        dedupe_uploads.dedupe(dry_run=False)
+        removed = store.collect_garbage(older_than=timedelta(0))
+        files = {f.sha256: f for f in StoredFile.query}
+
+    assert removed == 0
+    assert len(files) == 2 and all(f.pinned for f in files.values())
+    assert all(os.path.exists(store.full_path(f)) for f in files.values())
+    assert not os.path.exists(os.path.join(store.root, unreferenced.rsplit("/", 1)[1]))
+    with app.app_context():
+        message = Message.query.filter_by(content="file").one()
+        assert message.file_url.startswith(store.url_prefix + "/")
+        assert db.session.get(StoredFile, message.file_id).ref_count == 1
+
+
+def test_unreferenced_new_uploads_are_collected(app, store):
+    client = app.test_client()
+    uploaded = client.post("/upload", data={"file": (io.BytesIO(b"draft"), "draft.txt")},
+                           content_type="multipart/form-data").get_json()
+
+    with app.app_context():
+        assert store.collect_garbage(older_than=timedelta(hours=1)) == 0
+        assert store.collect_garbage(older_than=timedelta(0)) == 1
+        assert store.find(uploaded["sha256"]) is None
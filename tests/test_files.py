@@ -0,0 +1,97 @@
+"""
+Отдача файлов хранилища (routes/files.py): Range/206, сильный ETag по SHA-256,
+условные запросы, тип содержимого по расширению и режим X-Accel-Redirect.
+"""
+
+import hashlib
+import os
+
+import pytest
+
+from services.file_store import file_store
+
+DATA = bytes(range(256)) * 8  # 2 048 байт
+
+
+def _store(data, ext):
+    digest = hashlib.sha256(data + ext.encode()).hexdigest()
+    relative = file_store.relative_path(digest, ext)
+    path = os.path.join(file_store.root, *relative.split("/"))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return digest, f"/files/{relative}"
+
+
+@pytest.fixture
+def client(app, seed_chat, login):
+    seed_chat(1, users=1)
+    client = app.test_client()
+    login(client, 1)
+    return client
+
+
+@pytest.fixture
+def stored():
+    return _store(DATA, "bin")
+
+
+def test_full_response_is_cacheable(client, stored):
+    digest, url = stored
+    response = client.get(url)
+    assert response.status_code == 200 and response.data == DATA
+    assert response.headers["ETag"] == f'"{digest}"'
+    assert response.headers["Accept-Ranges"] == "bytes"
+    assert "immutable" in response.headers["Cache-Control"]
+    assert response.headers["X-Content-Type-Options"] == "nosniff"
+    assert response.headers["Content-Disposition"].startswith("attachment")
+
+
+@pytest.mark.parametrize("header, content_range, body", [
+    ("bytes=10-19", "bytes 10-19/2048", DATA[10:20]),
+    ("bytes=-5", "bytes 2043-2047/2048", DATA[-5:]),
+    ("bytes=2040-", "bytes 2040-2047/2048", DATA[2040:]),
+])
+def test_range_requests(client, stored, header, content_range, body):
+    response = client.get(stored[1], headers={"Range": header})
+    assert response.status_code == 206
+    assert response.headers["Content-Range"] == content_range
+    assert response.data == body
+
+
+def test_conditional_requests(client, stored):
+    digest, url = stored
+    assert client.get(url, headers={"Range": "bytes=5000-"}).status_code == 416
+    assert client.get(url, headers={"If-None-Match": f'"{digest}"'}).status_code == 304
+
+    # If-Range с чужим ETag — файл целиком, а не кусок
+    response = client.get(url, headers={"Range": "bytes=0-9", "If-Range": '"other"'})
+    assert response.status_code == 200 and response.data == DATA
+
+
+def test_type_comes_from_stored_extension(client):
+    _, url = _store(b"\x89PNG fake", "png")
+    response = client.get(url, query_string={"name": "photo.html"})
+    assert response.mimetype == "image/png"
+    disposition = response.headers["Content-Disposition"]
+    assert disposition.startswith("inline") and "photo.html.png" in disposition
+
+    _, svg = _store(b"<svg/>", "svg")
+    assert client.get(svg).headers["Content-Disposition"].startswith("attachment")
+
+
+def test_unknown_or_mismatched_paths(client, stored):
+    digest, url = stored
+    assert client.get(f"/files/00/00/{digest}.bin").status_code == 404
+    assert client.get(url.replace(".bin", ".txt")).status_code == 404
+    assert client.get("/files/../config.py").status_code == 404
+
+
+def test_x_accel_mode_delegates_to_proxy(app, client, stored, monkeypatch):
+    digest, url = stored
+    monkeypatch.setitem(app.config, "FILES_SENDFILE_MODE", "x-accel")
+    response = client.get(url)
+    assert response.status_code == 200 and response.data == b""
+    assert response.headers["X-Accel-Redirect"] == "/protected-uploads/" + url[len("/files/"):]
+    assert response.headers["ETag"] == f'"{digest}"'
+    assert client.get(url, headers={"If-None-Match": f'"{digest}"'}).status_code == 304
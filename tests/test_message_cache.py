@@ -0,0 +1,97 @@
+"""
+Кэш хвоста истории (services/message_cache.py): попадания, дописывание новых
+сообщений, сброс, вытеснение и отказ от заполнения при незаписанных сообщениях.
+"""
+
+import pytest
+
+from services.message_writer import message_writer
+
+MESSAGES = 30
+
+
+@pytest.fixture
+def chat(app, seed_chat, history_cache):
+    seed_chat(1, users=2, messages=MESSAGES)
+    with app.app_context():
+        yield history_cache
+
+
+def _entry(id_, uuid):
+    return {"id": id_, "uuid": uuid, "group_id": 1, "content": "новое"}
+
+
+def test_last_page_is_served_from_cache_after_first_miss(chat):
+    page, cursor = chat.history_page(1, limit=10)
+    assert chat.misses == 1 and chat.hits == 0
+    assert len(page) == 10 and cursor == page[0]["id"]
+    assert [m["id"] for m in page] == sorted(m["id"] for m in page)
+
+    cached, cached_cursor = chat.history_page("1", limit=10)
+    assert chat.hits == 1
+    assert cached == page and cached_cursor == cursor
+
+    # Весь хвост в буфере: история помещается целиком, курсора нет
+    full, full_cursor = chat.history_page(1, limit=MESSAGES)
+    assert len(full) == MESSAGES and full_cursor is None
+    assert chat.hits == 2
+
+
+def test_append_and_set_id_update_cached_tail(chat):
+    page, _ = chat.history_page(1, limit=5)
+    last_id = page[-1]["id"]
+
+    chat.append(1, _entry(None, "pending-uuid"))
+    tail, _ = chat.history_page(1, limit=5)
+    assert tail[-1]["uuid"] == "pending-uuid" and tail[-1]["id"] is None
+
+    chat.set_id("1", "pending-uuid", last_id + 1)
+    tail, _ = chat.history_page(1, limit=5)
+    assert tail[-1]["id"] == last_id + 1
+
+    since, complete = chat.history_since(1, last_id, limit=10)
+    assert complete and [m["uuid"] for m in since] == ["pending-uuid"]
+    assert chat.history_since(1, page[0]["id"], limit=2) == ([], False)
+
+
+def test_append_to_uncached_group_blocks_stale_fill(chat, monkeypatch):
+    from models.message import Message
+
+    original = Message.history_page
+
+    def history_page_racing_with_send(*args, **kwargs):
+        result = original(*args, **kwargs)
+        chat.append(1, _entry(None, "sent-meanwhile"))  # сообщение ушло, пока шло чтение
+        return result
+
+    monkeypatch.setattr(Message, "history_page", history_page_racing_with_send)
+    chat.history_page(1, limit=10)
+    assert chat.stats()["groups"] == 0
+
+
+def test_invalidate_drops_group(chat):
+    chat.history_page(1, limit=10)
+    assert chat.stats()["groups"] == 1
+
+    chat.invalidate("1")
+    assert chat.stats()["groups"] == 0 and chat.stats()["bytes"] == 0
+    chat.history_page(1, limit=10)
+    assert chat.misses == 2
+
+
+def test_groups_evicted_over_byte_limit(chat, monkeypatch):
+    chat.history_page(1, limit=10)
+    monkeypatch.setattr(chat, "max_bytes", chat.stats()["bytes"])
+
+    chat.append(1, _entry(None, "overflow"))
+    assert chat.evictions == 1
+    assert chat.stats()["groups"] == 0 and chat.stats()["bytes"] == 0
+
+
+def test_tail_not_cached_while_group_has_unwritten_messages(chat, monkeypatch):
+    monkeypatch.setattr(message_writer, "enabled", True)
+    monkeypatch.setattr(message_writer, "has_pending", lambda group_id: True)
+
+    page, _ = chat.history_page(1, limit=10)
+    assert len(page) == 10
+    assert chat.stats()["groups"] == 0
@@ -0,0 +1,100 @@
+"""
+Отложенная запись сообщений (services/message_writer.py): пачка одним INSERT,
+повтор при сбое соединения и отбрасывание строк с ошибкой данных по одной.
+"""
+
+import threading
+import uuid
+from datetime import datetime
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from services.message_writer import MessageWriter
+
+
+def _row(text, **columns):
+    return {
+        "uuid": str(uuid.uuid4()),
+        "group_id": 1,
+        "user_id": 1,
+        "message_type": "text",
+        "file_id": None,
+        "file_url": None,
+        "file_name": None,
+        "created_at": datetime.utcnow(),
+        "content": text,
+        "is_encrypted": False,
+        "encryption_key": None,
+        **columns,
+    }
+
+
+@pytest.fixture
+def writer(app, seed_chat, monkeypatch):
+    seed_chat(2, users=2)
+    writer = MessageWriter()
+    writer.app = app
+    writer.enabled = True
+    writer.batch_size = 10
+    # Фоновую задачу не запускаем — пачки пишет сам тест
+    writer._wakeup = threading.Event()
+    monkeypatch.setattr(writer, "_ensure_started", lambda: None)
+    return writer
+
+
+def _stored(app):
+    from models.message import Message
+
+    with app.app_context():
+        return [(m.content, m.group_id) for m in Message.query.order_by(Message.id)]
+
+
+def test_batch_written_and_confirmed(app, writer):
+    saved = []
+
+    def on_saved(row, message_id):
+        saved.append((row["content"], message_id))
+
+    for text, group_id in (("a", 1), ("b", "2"), ("c", 1)):
+        writer.enqueue(_row(text, group_id=group_id), on_saved=on_saved)
+    assert writer.pending == 3 and writer.has_pending("1") and writer.has_pending(2)
+
+    assert writer.flush() == 3
+    assert writer.pending == 0 and not writer.has_pending(1) and not writer.has_pending(2)
+    assert [text for text, _ in saved] == ["a", "b", "c"] and all(id_ for _, id_ in saved)
+    assert _stored(app) == [("a", 1), ("b", 2), ("c", 1)]
+
+
+def test_transient_failure_keeps_batch_in_order(app, writer, monkeypatch):
+    writer.enqueue(_row("first"))
+    writer.enqueue(_row("second"))
+    original = writer._insert
+
+    def locked(rows):
+        raise OperationalError("INSERT", {}, Exception("database is locked"))
+
+    monkeypatch.setattr(writer, "_insert", locked)
+    assert writer.flush() == 0
+    assert writer.pending == 2 and writer.has_pending(1)
+
+    monkeypatch.setattr(writer, "_insert", original)
+    assert writer.flush_all() == 2
+    assert _stored(app) == [("first", 1), ("second", 1)]
+
+
+def test_bad_row_dropped_without_blocking_others(app, writer):
+    results = {}
+
+    def on_saved(row, message_id):
+        results[row["content"] or "<none>"] = message_id
+
+    writer.enqueue(_row("ok-1"), on_saved=on_saved)
+    writer.enqueue(_row(None), on_saved=on_saved)  # content NOT NULL
+    writer.enqueue(_row("ok-2"), on_saved=on_saved)
+
+    assert writer.flush() == 3
+    assert results["<none>"] is None and results["ok-1"] and results["ok-2"]
+    assert writer.dropped == 1 and len(writer.dead_letters) == 1
+    assert writer.pending == 0 and not writer.has_pending(1)
+    assert _stored(app) == [("ok-1", 1), ("ok-2", 1)]
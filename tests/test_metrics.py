@@ -0,0 +1,36 @@
+"""
+Доступ к /metrics (services/metrics.py): без METRICS_TOKEN — только прямые запросы
+с localhost, с токеном — только с Authorization: Bearer.
+"""
+
+import pytest
+
+from services.metrics import metrics
+
+REMOTE = {"REMOTE_ADDR": "203.0.113.7"}
+
+
+@pytest.mark.parametrize("environ, headers, status", [
+    ({}, {}, 200),
+    ({"REMOTE_ADDR": "::1"}, {}, 200),
+    (REMOTE, {}, 401),
+    ({}, {"X-Forwarded-For": "203.0.113.7"}, 401),
+    (REMOTE, {"X-Forwarded-For": "127.0.0.1"}, 401),
+])
+def test_without_token_only_localhost(app, environ, headers, status):
+    response = app.test_client().get("/metrics", environ_base=environ, headers=headers)
+    assert response.status_code == status
+    if status == 200:
+        assert b"# TYPE" in response.data
+
+
+@pytest.mark.parametrize("authorization, status", [
+    (None, 401),
+    ("Bearer wrong", 401),
+    ("Bearer s3cret", 200),
+])
+def test_token_required_when_configured(app, monkeypatch, authorization, status):
+    monkeypatch.setattr(metrics, "token", "s3cret")
+    headers = {"Authorization": authorization} if authorization else {}
+    response = app.test_client().get("/metrics", environ_base=REMOTE, headers=headers)
+    assert response.status_code == status
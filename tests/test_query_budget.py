@@ -0,0 +1,75 @@
+"""
+Бюджет SQL-запросов (services/query_budget.py): регрессия N+1 в Group.to_dict —
+счётчик участников запросом на каждую группу — и список повторяющихся запросов в логе.
+"""
+
+import json
+import logging
+
+import pytest
+
+from services.query_budget import QueryBudgetExceeded, assert_max_queries, query_budget
+
+
+def _count_members(self):
+    """Старый Group.to_dict: member_count считался отдельным запросом на каждую группу"""
+    return {"uuid": self.uuid, "name": self.name, "member_count": self.members.count()}
+
+
+def test_group_to_dict_does_not_query_members(app, seed_chat):
+    from models.message import Group
+
+    seed_chat(30)
+    with app.app_context():
+        groups = Group.query.all()
+        with assert_max_queries(0):
+            payload = [group.to_dict() for group in groups]
+
+    assert all(item["member_count"] > 0 for item in payload)
+
+
+def test_group_to_dict_n_plus_one_is_caught(app, seed_chat):
+    from models.message import Group
+
+    seed_chat(30)
+    with app.app_context():
+        groups = Group.query.all()
+        with pytest.raises(AssertionError, match="30 SQL-запросов при бюджете 0"):
+            with assert_max_queries(0):
+                [_count_members(group) for group in groups]
+
+
+def test_group_list_over_budget_raises(app, seed_chat, login, monkeypatch):
+    from models.message import Group
+
+    seed_chat(30)
+    monkeypatch.setattr(Group, "to_dict", _count_members)
+    client = app.test_client()
+    login(client, 1)
+
+    with pytest.raises(QueryBudgetExceeded, match="при бюджете 2"):
+        client.get("/api/groups")
+
+
+def test_log_mode_reports_repeated_statements(app, seed_chat, login, monkeypatch, caplog):
+    from models.message import Group
+
+    seed_chat(30)
+    monkeypatch.setattr(Group, "to_dict", _count_members)
+    monkeypatch.setitem(app.config, "QUERY_BUDGET_MODE", "log")
+    client = app.test_client()
+    login(client, 1)
+
+    query_budget.init_app(app)
+    try:
+        with caplog.at_level(logging.WARNING, logger="chat.sql"):
+            response = client.get("/api/groups")
+    finally:
+        monkeypatch.undo()
+        query_budget.init_app(app)
+
+    assert response.status_code == 200
+    records = [json.loads(r.getMessage()) for r in caplog.records if r.name == "chat.sql"]
+    exceeded = [r for r in records if r["event"] == "query_budget_exceeded"]
+    assert exceeded and exceeded[0]["queries"] > 30
+    assert exceeded[0]["repeated"][0].startswith("30× SELECT")
@@ -0,0 +1,47 @@
+"""
+Число SQL-запросов горячих REST-эндпоинтов не зависит от числа групп и участников:
+одни и те же бюджеты при N и 10·N группах (N+1 в Group.to_dict или members ломает тест).
+"""
+
+import pytest
+
+from services.query_budget import assert_max_queries
+
+N = 20
+
+
+def _largest_group(app):
+    from models.message import Group
+
+    with app.app_context():
+        group = Group.query.order_by(Group.member_count.desc()).first()
+        return group.uuid, group.member_count
+
+
+@pytest.mark.parametrize("groups", [N, 10 * N])
+def test_group_list_queries(app, seed_chat, login, groups):
+    seed_chat(groups)
+    client = app.test_client()
+    login(client, 1)
+
+    with app.app_context(), assert_max_queries(2):
+        response = client.get("/api/groups")
+
+    assert response.status_code == 200
+    assert len(response.get_json()["groups"]) == groups
+
+
+@pytest.mark.parametrize("groups", [N, 10 * N])
+def test_group_detail_queries(app, seed_chat, login, groups):
+    seed_chat(groups)
+    client = app.test_client()
+    login(client, 1)
+    group_uuid, member_count = _largest_group(app)
+
+    with app.app_context(), assert_max_queries(3):
+        response = client.get(f"/api/groups/{group_uuid}")
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert len(body["members"]) == member_count
+    assert body["group"]["member_count"] == member_count
@@ -0,0 +1,107 @@
+"""
+Ограничение частоты Socket.IO-событий (services/rate_limit.py): вёдра соединения
+и пользователя, пополнение со временем, запасной режим без Redis и отказ в обработчике.
+"""
+
+from collections import OrderedDict
+
+import pytest
+
+from extensions import socketio
+from services import rate_limit
+from services.rate_limit import RateLimiter, parse_limits, rate_limiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def limiter():
+    limiter = RateLimiter()
+    limiter.limits = {"send_message": (1, 3), "default": (2, 2)}
+    return limiter
+
+
+def test_parse_limits():
+    assert parse_limits("send_message=5:20, create_group=0.2:3,bad,heartbeat=2") == {
+        "send_message": (5.0, 20.0), "create_group": (0.2, 3.0), "heartbeat": (2.0, 2.0),
+    }
+    assert parse_limits("") == {}
+
+
+def test_bucket_refills_over_time(limiter, clock):
+    assert [limiter.hit("send_message", "sid") for _ in range(3)] == [0, 0, 0]
+    assert limiter.hit("send_message", "sid") == pytest.approx(1.0)
+
+    clock[0] += 0.5
+    assert limiter.hit("send_message", "sid") == pytest.approx(0.5)
+    clock[0] += 0.5
+    assert limiter.hit("send_message", "sid") == 0
+    assert limiter.allowed == {"send_message": 4} and limiter.rejected == {"send_message": 2}
+
+
+def test_user_bucket_shared_by_connections(limiter, clock):
+    for _ in range(3):
+        assert limiter.hit("send_message", "tab-1", "user") == 0
+    # Вторая вкладка того же пользователя — ведро пользователя уже пусто
+    assert limiter.hit("send_message", "tab-2", "user") > 0
+    assert limiter.hit("send_message", "tab-2", "other") == 0
+
+    # События без своего лимита делят ведро default
+    assert limiter.hit("typing", "tab-1") == 0 and limiter.hit("presence", "tab-1") == 0
+    assert limiter.hit("typing", "tab-1") > 0
+
+    limiter.forget("tab-1")
+    assert limiter.hit("send_message", "tab-1") == 0
+
+
+def test_redis_failure_falls_back_to_memory(limiter, clock):
+    calls = []
+
+    class BrokenRedis:
+        def register_script(self, script):
+            def run(keys, args):
+                calls.append(keys)
+                raise rate_limit.redis.ConnectionError("down")
+            return run
+
+    limiter.use_redis(BrokenRedis())
+    assert limiter.hit("send_message", "sid", "user") == 0
+    assert limiter.hit("send_message", "sid", "user") == 0
+    # Redis не опрашивается до конца паузы, лимит всё равно действует в памяти процесса
+    assert len(calls) == 1 and limiter.redis_errors == 1
+    assert limiter.hit("send_message", "sid", "user") == 0
+    assert limiter.hit("send_message", "sid", "user") > 0
+
+    clock[0] += 1.0
+    limiter.hit("send_message", "sid", "user")
+    assert len(calls) == 2
+
+
+def test_handler_skipped_over_limit(app, seed_chat, login, monkeypatch):
+    from models.message import Message
+
+    seed_chat(1, users=1)
+    client = app.test_client()
+    user_uuid = login(client, 1)
+    monkeypatch.setattr(rate_limiter, "enabled", True)
+    monkeypatch.setattr(rate_limiter, "limits", {**rate_limiter.limits, "send_message": (0.001, 2)})
+    # Вёдра пользователя 1 могли опустеть в других тестах
+    monkeypatch.setattr(rate_limiter, "_buckets", OrderedDict())
+    monkeypatch.setattr(rate_limiter, "_notified", {})
+    socket_client = socketio.test_client(app, flask_test_client=client)
+    socket_client.get_received()
+
+    for text in ("one", "two", "three", "four"):
+        socket_client.emit("send_message", {"group_id": 1, "text": text, "uuid": user_uuid})
+    notices = [e["args"][0] for e in socket_client.get_received() if e["name"] == "rate_limited"]
+    socket_client.disconnect()
+
+    assert [n["event"] for n in notices] == ["send_message"]  # не чаще раза в секунду
+    assert notices[0]["retry_after"] > 0
+    with app.app_context():
+        assert [m.content for m in Message.query.order_by(Message.id)] == ["one", "two"]
@@ -0,0 +1,78 @@
+"""
+Полнотекстовый поиск (routes/search.py, services/search_index.py): FTS5-индекс
+через триггеры, подсветка, видимость закрытых групп и постраничная выдача.
+"""
+
+import pytest
+
+from extensions import db
+from models.message import Group, Message, user_groups
+
+
+def _add(group_id, content, **columns):
+    message = Message(group_id=group_id, user_id=2, content=content, **columns)
+    db.session.add(message)
+    return message
+
+
+@pytest.fixture
+def client(app, seed_chat, login):
+    seed_chat(2, users=2)
+    with app.app_context():
+        # Группа 2 — закрытая, пользователь 1 в ней не состоит
+        db.session.get(Group, 2).is_private = True
+        db.session.execute(user_groups.delete().where(user_groups.c.user_id == 1))
+        _add(1, "Встречаемся у <b>фонтана</b> в полдень")
+        _add(1, "фонтан закрыт на ремонт")
+        _add(2, "секретный фонтан")
+        _add(1, "зашифрованный фонтан", is_encrypted=True, encryption_key="at-rest:v1")
+        db.session.commit()
+    client = app.test_client()
+    login(client, 1)
+    return client
+
+
+def _search(client, **params):
+    response = client.get("/api/search", query_string=params)
+    return response.status_code, response.get_json()
+
+
+def test_prefix_match_with_escaped_highlight(client):
+    status, body = _search(client, q="фонт")
+    assert status == 200
+    texts = sorted(m["content"] for m in body["messages"])
+    assert texts == ["Встречаемся у <b>фонтана</b> в полдень", "фонтан закрыт на ремонт"]
+
+    highlight = next(m["highlight"] for m in body["messages"] if "полдень" in m["content"])
+    assert "<mark>фонтана</mark>" in highlight
+    assert "&lt;b&gt;" in highlight and "<b>" not in highlight
+
+
+def test_private_group_requires_membership(client):
+    with client.application.app_context():
+        group_uuid = db.session.get(Group, 2).uuid
+
+    assert _search(client, q="секретный")[1]["messages"] == []
+    assert _search(client, q="фонтан", group=group_uuid)[0] == 403
+
+    with client.application.app_context():
+        db.session.execute(user_groups.insert().values(user_id=1, group_id=2))
+        db.session.commit()
+    status, body = _search(client, q="фонтан", group=group_uuid)
+    assert status == 200 and [m["content"] for m in body["messages"]] == ["секретный фонтан"]
+
+
+def test_pages_and_query_syntax(client):
+    status, body = _search(client, q="фонтан", per_page=1)
+    assert status == 200 and len(body["messages"]) == 1 and body["has_more"]
+    status, body = _search(client, q="фонтан", per_page=1, page=2)
+    assert len(body["messages"]) == 1 and not body["has_more"]
+
+    # Операторы FTS5 в запросе — просто слова
+    status, body = _search(client, q='фонтан OR "NEAR(* ')
+    assert status == 200 and body["messages"] == []
+
+
+def test_requires_session_and_query(app, client):
+    assert _search(client, q="  ")[0] == 400
+    assert _search(app.test_client(), q="фонтан")[0] in (302, 401)
@@ -0,0 +1,78 @@
+"""
+send_message (routes/chat.py): проверка group_id до записи без запроса к groups на
+каждое сообщение — существование группы берётся из services/group_directory.py.
+"""
+
+import pytest
+
+from extensions import socketio
+from services.group_directory import group_directory, group_key
+from services.query_budget import assert_max_queries
+
+
+@pytest.fixture
+def sender(app, seed_chat, login):
+    seed_chat(3)
+    client = app.test_client()
+    user_uuid = login(client, 1)
+    socket_client = socketio.test_client(app, flask_test_client=client)
+    socket_client.get_received()
+    yield socket_client, user_uuid
+    socket_client.disconnect()
+
+
+def _errors(socket_client):
+    return [event["args"][0]["error"] for event in socket_client.get_received() if event["name"] == "error"]
+
+
+def _stored_texts(app, group_id):
+    from models.message import Message
+
+    with app.app_context():
+        return [m.content for m in Message.query.filter_by(group_id=group_id).order_by(Message.id)]
+
+
+@pytest.mark.parametrize("value, key", [(7, 7), ("7", 7), (" 7", 7), ("x", None), (0, None), (True, None), (None, None)])
+def test_group_key(value, key):
+    assert group_key(value) == key
+
+
+def test_rejects_bad_and_unknown_groups(app, sender):
+    socket_client, user_uuid = sender
+
+    socket_client.emit("send_message", {"group_id": "abc", "text": "hi", "uuid": user_uuid})
+    assert _errors(socket_client) == ["Некорректный ID группы"]
+    socket_client.emit("send_message", {"group_id": 999, "text": "hi", "uuid": user_uuid})
+    assert _errors(socket_client) == ["Группа не найдена"]
+
+
+def test_group_checked_once_per_process(app, sender):
+    socket_client, user_uuid = sender
+    group_directory.discard(1)
+
+    socket_client.emit("send_message", {"group_id": 1, "text": "first", "uuid": user_uuid})
+    with app.app_context(), assert_max_queries(10) as statements:
+        socket_client.emit("send_message", {"group_id": "1", "text": "second", "uuid": user_uuid})
+
+    assert not [s for s in statements if "FROM groups" in s]
+    assert _errors(socket_client) == []
+    assert _stored_texts(app, 1) == ["first", "second"]
+
+
+def test_deleted_group_is_forgotten(app, sender, login):
+    from extensions import db
+    from models.message import Group
+
+    socket_client, user_uuid = sender
+    socket_client.emit("send_message", {"group_id": 2, "text": "hi", "uuid": user_uuid})
+    assert _errors(socket_client) == []
+
+    with app.app_context():
+        group = db.session.get(Group, 2)
+        group_uuid, creator = group.uuid, group.created_by
+    owner = app.test_client()
+    login(owner, creator)
+    assert owner.delete(f"/api/groups/{group_uuid}").status_code == 200
+
+    socket_client.emit("send_message", {"group_id": 2, "text": "again", "uuid": user_uuid})
+    assert _errors(socket_client) == ["Группа не найдена"]
@@ -0,0 +1,61 @@
+"""
+Контракт клиента static/js/app.js: группа из /api/groups → join_group → sync_groups
+с тем group_id, который клиент берёт из полученного списка групп.
+"""
+
+from extensions import socketio
+
+
+def _connect(app, client):
+    return socketio.test_client(app, flask_test_client=client)
+
+
+def _events(socket_client, name):
+    return [event["args"][0] for event in socket_client.get_received() if event["name"] == name]
+
+
+def _send(app, login, group_id, text):
+    """Сообщение от другого участника (пользователь 2) — через сокет, как из интерфейса"""
+    sender = app.test_client()
+    user_uuid = login(sender, 2)
+    socket_client = _connect(app, sender)
+    socket_client.emit("send_message", {"group_id": group_id, "text": text, "uuid": user_uuid})
+    socket_client.disconnect()
+
+
+def test_join_and_sync_with_group_list_payload(app, seed_chat, login):
+    seed_chat(3)
+    client = app.test_client()
+    login(client, 1)
+
+    groups = client.get("/api/groups").get_json()["groups"]
+    group = groups[0]
+    assert isinstance(group["id"], int)
+
+    socket_client = _connect(app, client)
+    socket_client.get_received()
+
+    socket_client.emit("join_group", {"group_id": group["id"]})
+    history = _events(socket_client, "chat_history")
+    assert history and history[0]["group_id"] == group["id"]
+
+    _send(app, login, group["id"], "first")
+    live = _events(socket_client, "new_message")
+    assert [m["text"] for m in live] == ["first"]
+    last_id = live[0]["id"]
+
+    # Обрыв: пока клиента нет, в группе пишут; после переподключения — sync_groups
+    socket_client.disconnect()
+    _send(app, login, group["id"], "missed")
+
+    socket_client = _connect(app, client)
+    socket_client.get_received()
+    socket_client.emit("sync_groups", {"groups": [{"group_id": group["id"], "last_id": last_id}]})
+    delta = _events(socket_client, "chat_history")
+    assert len(delta) == 1 and delta[0]["delta"] is True
+    assert [m["content"] for m in delta[0]["messages"]] == ["missed"]
+
+    # Новые сообщения снова приходят вживую: sync_groups вернул соединение в комнату
+    _send(app, login, group["id"], "after")
+    assert [m["text"] for m in _events(socket_client, "new_message")] == ["after"]
+    socket_client.disconnect()
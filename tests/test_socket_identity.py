@@ -0,0 +1,54 @@
+"""
+Пользователь соединения (services/socket_identity.py): определяется при connect,
+дальше обработчики берут его по sid без запроса к users.
+"""
+
+from extensions import socketio
+from services.query_budget import assert_max_queries
+from services.socket_identity import SocketIdentity, SocketRegistry, socket_registry
+
+
+def test_registry_matches_uuid_and_forgets_user():
+    registry = SocketRegistry()
+    alice = registry.register("sid-1", SocketIdentity(1, "uuid-a", "alice"))
+    registry.register("sid-2", SocketIdentity(1, "uuid-a", "alice"))
+    registry.register("sid-3", SocketIdentity(2, "uuid-b", "bob"))
+
+    assert registry.get("sid-1") is alice
+    assert registry.get("sid-1", "uuid-a") is alice
+    assert registry.get("sid-1", "uuid-b") is None  # соединение выдаёт себя за другого
+    assert registry.sids_for("uuid-a") == {"sid-1", "sid-2"}
+
+    # sid переиспользован другим пользователем — из обратного индекса прежний убран
+    registry.register("sid-2", SocketIdentity(2, "uuid-b", "bob"))
+    assert registry.sids_for("uuid-a") == {"sid-1"}
+
+    registry.invalidate_user("uuid-b")
+    assert len(registry) == 1 and registry.sids_for("uuid-b") == set()
+    assert registry.remove("sid-1") is alice and len(registry) == 0
+
+
+def test_messages_do_not_query_users(app, seed_chat, login):
+    seed_chat(1, users=2)
+    client = app.test_client()
+    user_uuid = login(client, 1)
+    socket_client = socketio.test_client(app, flask_test_client=client)
+    socket_client.get_received()
+    (sid,) = socket_registry.sids_for(user_uuid)
+
+    identity = socket_registry.get(sid, user_uuid)
+    assert identity is not None and identity.user_id == 1
+
+    socket_client.emit("join_group", {"group_id": 1})
+    socket_client.get_received()
+    with app.app_context(), assert_max_queries(20) as statements:
+        for text in ("one", "two", "three"):
+            socket_client.emit("send_message", {"group_id": 1, "text": text, "uuid": user_uuid})
+
+    assert not [s for s in statements if "FROM users" in s]
+    live = [e["args"][0] for e in socket_client.get_received() if e["name"] == "new_message"]
+    assert [m["text"] for m in live] == ["one", "two", "three"]
+    assert {m["uuid"] for m in live} == {user_uuid}
+
+    socket_client.disconnect()
+    assert socket_registry.get(sid) is None
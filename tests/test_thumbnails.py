@@ -0,0 +1,59 @@
+"""
+Превью изображений (services/thumbnails.py): thumbnail_ready доходит до участников,
+вошедших в группу с group_id строкой, и сбрасывает тот же ключ кэша истории.
+"""
+
+import io
+import time
+
+import pytest
+
+from extensions import socketio
+from services.thumbnails import thumbnails
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def _jpeg():
+    buffer = io.BytesIO()
+    Image.effect_noise((640, 480), 40).convert("RGB").save(buffer, "JPEG")
+    buffer.seek(0)
+    return buffer
+
+
+def _wait_thumbnails(timeout=30):
+    deadline = time.monotonic() + timeout
+    while thumbnails.stats()["pending"] and time.monotonic() < deadline:
+        socketio.sleep(0.05)
+    assert not thumbnails.stats()["pending"], "превью не готово"
+
+
+def test_thumbnail_ready_reaches_string_group_room(app, seed_chat, login, history_cache):
+    if not thumbnails.enabled:
+        pytest.skip("превью выключены")
+    seed_chat(2)
+    client = app.test_client()
+    user_uuid = login(client, 1)
+    socket_client = socketio.test_client(app, flask_test_client=client)
+    socket_client.emit("join_group", {"group_id": "1"})
+    socket_client.get_received()
+
+    uploaded = client.post("/upload", data={"file": (_jpeg(), "photo.jpg")},
+                           content_type="multipart/form-data").get_json()
+    socket_client.emit("send_message", {"group_id": "1", "text": "photo", "uuid": user_uuid,
+                                        "file_url": uploaded["url"]})
+    # История группы закэширована по тому же ключу, который сбросит превью
+    assert history_cache.stats()["groups"] == 1
+    _wait_thumbnails()
+
+    received = socket_client.get_received()
+    ready = [e["args"][0] for e in received if e["name"] == "thumbnail_ready"]
+    assert len(ready) == 1 and ready[0]["group_id"] == 1
+    assert ready[0]["width"] == 640 and ready[0]["height"] == 480
+    live = [e["args"][0] for e in received if e["name"] == "new_message"]
+    assert [m["group_id"] for m in live] == [1]
+
+    socket_client.emit("join_group", {"group_id": "1"})
+    history = [e["args"][0] for e in socket_client.get_received() if e["name"] == "chat_history"]
+    assert history[0]["messages"][-1]["thumbnail_url"] == ready[0]["thumbnail_url"]
+    socket_client.disconnect()
@@ -1,11 +1,7 @@
 # Пакет утилит
 from .helpers import generate_user_code, validate_username, sanitize_input
-from .crypto import encrypt_message, decrypt_message, generate_key, hash_codeword
+from .crypto import encrypt_message, decrypt_message, encrypt_many, decrypt_many, generate_key, hash_codeword, verify_codeword
 from .validators import validate_message, validate_file_upload, validate_group_data
-from utils.debugger import init_debugger
-
-if app.config.get("DEBUG", True):
-    init_debugger(app)
 
 __all__ = [
     'generate_user_code',
@@ -13,8 +9,11 @@ __all__ = [
     'sanitize_input',
     'encrypt_message',
     'decrypt_message', 
+    'encrypt_many',
+    'decrypt_many',
     'generate_key',
     'hash_codeword',
+    'verify_codeword',
     'validate_message',
     'validate_file_upload',
     'validate_group_data'
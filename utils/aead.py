@@ -0,0 +1,223 @@
+"""
+aead.py — версионированное шифрование данных на сервере (at-rest).
+Шифртекст: 2 байта версии ключа + nonce + данные с тегом аутентификации (AES-GCM или
+ChaCha20-Poly1305), в тексте — urlsafe base64 без паддинга. Ключи лежат в keyring-файле
+(JSON): активная версия шифрует, остальные только расшифровывают, пока ротация
+(services/key_rotation.py) не перешифрует их данные.
+"""
+
+import base64
+import json
+import os
+import struct
+import time
+from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+
+from utils.crypto import run_batch
+
+_VERSION = struct.Struct(">H")
+NONCE_SIZE = 12
+
+
+class _AeadCipher:
+    """AES-GCM / ChaCha20-Poly1305: случайный 96-битный nonce перед шифртекстом"""
+
+    def __init__(self, aead_class, key):
+        self.aead = aead_class(key)
+
+    def encrypt(self, data: bytes) -> bytes:
+        nonce = os.urandom(NONCE_SIZE)
+        return nonce + self.aead.encrypt(nonce, data, None)
+
+    def decrypt(self, blob: bytes) -> bytes:
+        return self.aead.decrypt(blob[:NONCE_SIZE], blob[NONCE_SIZE:], None)
+
+
+class _FernetCipher:
+    """Fernet в том же версионированном формате (двоичный токен без base64)"""
+
+    def __init__(self, key):
+        self.fernet = Fernet(base64.urlsafe_b64encode(key))
+
+    def encrypt(self, data: bytes) -> bytes:
+        return base64.urlsafe_b64decode(self.fernet.encrypt(data))
+
+    def decrypt(self, blob: bytes) -> bytes:
+        return self.fernet.decrypt(base64.urlsafe_b64encode(blob))
+
+
+ALGORITHMS = {
+    "aes-gcm": lambda key: _AeadCipher(AESGCM, key),
+    "chacha20-poly1305": lambda key: _AeadCipher(ChaCha20Poly1305, key),
+    "fernet": _FernetCipher,
+}
+
+
+class Keyring:
+    """
+    Версии ключей в JSON-файле: {"active": N, "keys": {"N": {"algorithm", "key"}},
+    "retired": {"N": время вывода}}. Выведенная версия только расшифровывает и удаляется
+    из файла отдельно (remove), после льготного периода.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.active = None
+        self._keys = {}     # версия -> (алгоритм, ключ)
+        self._ciphers = {}  # версия -> объект шифра
+        self.retired = {}   # версия -> time.time() вывода из оборота
+        self._mtime = None
+        self.load()
+
+    def load(self):
+        """Перечитывает файл (другой процесс мог добавить версию при ротации)"""
+        if not os.path.exists(self.path):
+            return
+        self._mtime = os.stat(self.path).st_mtime_ns
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self._keys = {
+            int(version): (entry["algorithm"], base64.urlsafe_b64decode(entry["key"]))
+            for version, entry in data.get("keys", {}).items()
+        }
+        self._ciphers = {}
+        self.active = data.get("active")
+        self.retired = {int(version): when for version, when in data.get("retired", {}).items()}
+
+    def refresh(self):
+        """Перечитывает файл, только если он изменился (по stat; seal зовёт не чаще раза в интервал)"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return
+        if mtime != self._mtime:
+            self.load()
+
+    def save(self):
+        data = {
+            "active": self.active,
+            "keys": {
+                str(version): {"algorithm": algorithm, "key": base64.urlsafe_b64encode(key).decode()}
+                for version, (algorithm, key) in sorted(self._keys.items())
+            },
+            "retired": {str(version): when for version, when in sorted(self.retired.items())},
+        }
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self.path)
+        self._mtime = os.stat(self.path).st_mtime_ns
+
+    def versions(self):
+        return sorted(self._keys)
+
+    def algorithm(self, version):
+        return self._keys[version][0]
+
+    def add_key(self, algorithm):
+        """Создаёт новую версию ключа и делает её активной"""
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Неизвестный алгоритм шифрования: {algorithm}")
+        self.load()
+        version = max(self._keys, default=0) + 1
+        if version > 0xFFFF:
+            raise ValueError("Исчерпаны версии ключей")
+        key = AESGCM.generate_key(bit_length=256) if algorithm != "fernet" else os.urandom(32)
+        self._keys[version] = (algorithm, key)
+        self.active = version
+        self.save()
+        return version
+
+    def retire(self, version):
+        """Помечает неактивную версию выведенной: ключ остаётся для расшифровки"""
+        if version == self.active:
+            raise ValueError("Нельзя вывести активный ключ")
+        self.load()
+        if version in self._keys and version not in self.retired:
+            self.retired[version] = time.time()
+            self.save()
+
+    def unretire(self, version):
+        """Снимает пометку: данные этой версией всё-таки нашлись"""
+        self.load()
+        if self.retired.pop(version, None) is not None:
+            self.save()
+
+    def remove(self, version):
+        """Удаляет ключ из файла — только выведенный; данные им больше не расшифровать"""
+        if version == self.active or version not in self.retired:
+            raise ValueError("Удалить можно только выведенную неактивную версию")
+        self.load()
+        self.retired.pop(version, None)
+        if self._keys.pop(version, None) is not None:
+            self._ciphers.pop(version, None)
+        self.save()
+
+    def cipher(self, version):
+        cipher = self._ciphers.get(version)
+        if cipher is None:
+            if version not in self._keys:
+                self.load()
+            if version not in self._keys:
+                raise KeyError(f"Нет ключа версии {version}")
+            algorithm, key = self._keys[version]
+            cipher = self._ciphers[version] = ALGORITHMS[algorithm](key)
+        return cipher
+
+
+class AeadEngine:
+    """Шифрование строк активным ключом keyring'а и расшифровка любой известной версией."""
+
+    def __init__(self, keyring):
+        self.keyring = keyring
+
+    # --- Двоичный формат ---
+    def encrypt_bytes(self, data: bytes, version=None) -> bytes:
+        version = self.keyring.active if version is None else version
+        if version is None:
+            raise ValueError("В keyring нет активного ключа")
+        return _VERSION.pack(version) + self.keyring.cipher(version).encrypt(data)
+
+    def decrypt_bytes(self, blob: bytes) -> bytes:
+        (version,) = _VERSION.unpack_from(blob)
+        return self.keyring.cipher(version).decrypt(blob[_VERSION.size:])
+
+    # --- Текстовый формат (колонки Text) ---
+    def encrypt(self, text: str, version=None) -> str:
+        return _b64encode(self.encrypt_bytes(text.encode(), version))
+
+    def decrypt(self, token: str) -> str:
+        return self.decrypt_bytes(_b64decode(token)).decode()
+
+    @staticmethod
+    def version_of(token: str) -> int:
+        return _VERSION.unpack_from(_b64decode(token[:4]))[0]
+
+    def encrypt_many(self, texts, version=None) -> list:
+        return run_batch(lambda: [self.encrypt(text, version) for text in texts], len(texts))
+
+    def decrypt_many(self, tokens, default=None) -> list:
+        """Пакетная расшифровка; при заданном default ошибочные токены заменяются им"""
+
+        def work():
+            result = []
+            for token in tokens:
+                try:
+                    result.append(self.decrypt(token))
+                except Exception:
+                    if default is None:
+                        raise
+                    result.append(default)
+            return result
+
+        return run_batch(work, len(tokens))
+
+
+def _b64encode(blob: bytes) -> str:
+    return base64.urlsafe_b64encode(blob).rstrip(b"=").decode()
+
+
+def _b64decode(token: str) -> bytes:
+    return base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
@@ -1,10 +1,29 @@
 import base64
+import hmac
 import os
 import hashlib
+from functools import lru_cache
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 
+try:
+    from eventlet import patcher, tpool
+except ImportError:  # eventlet не обязателен (например, в скриптах)
+    patcher = tpool = None
+
+# Число закэшированных объектов Fernet (по одному на ключ)
+CIPHER_CACHE_SIZE = 256
+# С какого размера пакет шифруется/расшифровывается в потоке tpool, а не в хабе eventlet
+TPOOL_BATCH_THRESHOLD = 200
+
+# Формат хеша кодового слова и число итераций PBKDF2 по умолчанию
+CODEWORD_SCHEME = "pbkdf2_sha256"
+CODEWORD_ITERATIONS = 100_000
+
+# Все токены Fernet начинаются с версии 0x80 — в base64 это "gAAAAA"
+_FERNET_PREFIX = "gAAAAA"
+
 
 class CryptoManager:
     """Менеджер шифрования для E2E сообщений (серверная часть)."""
@@ -38,11 +57,10 @@ class CryptoManager:
         if not message:
             return ""
 
-        encrypted = self.fernet.encrypt(message.encode())
-        return base64.urlsafe_b64encode(encrypted).decode()
+        return self.fernet.encrypt(message.encode()).decode()
 
     def decrypt_message(self, encrypted_message: str) -> str:
-        """Дешифрование сообщения (base64)."""
+        """Дешифрование сообщения (токен Fernet или старый формат с двойным base64)."""
         if not self.fernet:
             raise ValueError("Fernet not initialized. Call initialize_fernet first.")
 
@@ -50,9 +68,7 @@ class CryptoManager:
             return ""
 
         try:
-            encrypted_bytes = base64.urlsafe_b64decode(encrypted_message.encode())
-            decrypted = self.fernet.decrypt(encrypted_bytes)
-            return decrypted.decode()
+            return self.fernet.decrypt(_token_bytes(encrypted_message)).decode()
         except Exception as e:
             raise ValueError(f"Decryption failed: {str(e)}")
 
@@ -70,55 +86,130 @@ def generate_key() -> str:
     return Fernet.generate_key().decode()
 
 
+def get_cipher(key) -> Fernet:
+    """Объект Fernet для ключа (str или bytes) из LRU-кэша."""
+    return _cached_cipher(key.encode() if isinstance(key, str) else key)
+
+
+@lru_cache(maxsize=CIPHER_CACHE_SIZE)
+def _cached_cipher(key: bytes) -> Fernet:
+    return Fernet(key)
+
+
+def _token_bytes(token: str) -> bytes:
+    """
+    Байты токена Fernet. Раньше токены дополнительно заворачивались в base64 —
+    такие значения из БД тоже принимаются.
+    """
+    if token.startswith(_FERNET_PREFIX):
+        return token.encode()
+    return base64.urlsafe_b64decode(token.encode())
+
+
 def encrypt_message(message: str, key: str = None) -> tuple[str, str]:
     """Шифрование сообщения с заданным ключом (или новым)."""
     if not key:
         key = generate_key()
 
-    fernet = Fernet(key.encode())
-    encrypted = fernet.encrypt(message.encode())
-    return base64.urlsafe_b64encode(encrypted).decode(), key
+    return get_cipher(key).encrypt(message.encode()).decode(), key
 
 
 def decrypt_message(encrypted_message: str, key: str) -> str:
     """Дешифрование сообщения."""
     try:
-        fernet = Fernet(key.encode())
-        encrypted_bytes = base64.urlsafe_b64decode(encrypted_message.encode())
-        decrypted = fernet.decrypt(encrypted_bytes)
-        return decrypted.decode()
+        return get_cipher(key).decrypt(_token_bytes(encrypted_message)).decode()
     except Exception as e:
         raise ValueError(f"Decryption failed: {str(e)}")
 
 
-def hash_codeword(codeword: str) -> str:
-    """Хеширование кодового слова (для хранения в БД)."""
-    salt = os.urandom(32)
-    key = hashlib.pbkdf2_hmac(
-        'sha256',
-        codeword.encode('utf-8'),
-        salt,
-        100_000
-    )
-    return base64.b64encode(salt + key).decode('utf-8')
+def encrypt_many(messages, key: str) -> list[str]:
+    """Шифрование пакета сообщений одним ключом."""
+    cipher = get_cipher(key)
+    return run_batch(lambda: [cipher.encrypt(m.encode()).decode() for m in messages], len(messages))
+
+
+def decrypt_many(tokens, key: str, default=None) -> list:
+    """
+    Дешифрование пакета сообщений одним ключом. Пустые токены дают "".
+    Если задан default, нерасшифровываемые токены заменяются им, иначе — ValueError.
+    """
+    cipher = get_cipher(key)
+
+    def work():
+        result = []
+        for token in tokens:
+            if not token:
+                result.append("")
+                continue
+            try:
+                result.append(cipher.decrypt(_token_bytes(token)).decode())
+            except Exception as e:
+                if default is None:
+                    raise ValueError(f"Decryption failed: {str(e)}")
+                result.append(default)
+        return result
+
+    return run_batch(work, len(tokens))
+
+
+def run_batch(work, size: int):
+    """
+    Выполняет work(). Большие пакеты под eventlet уходят в пул потоков tpool,
+    чтобы криптография не блокировала хаб (и остальные соединения) на время пакета.
+    """
+    if size >= TPOOL_BATCH_THRESHOLD and tpool is not None and patcher.is_monkey_patched("thread"):
+        return tpool.execute(work)
+    return work()
+
+
+def hash_codeword(codeword: str, iterations: int = CODEWORD_ITERATIONS) -> str:
+    """Хеширование кодового слова (для хранения в БД): pbkdf2_sha256$итерации$соль$хеш."""
+    salt = os.urandom(16)
+    key = hashlib.pbkdf2_hmac('sha256', codeword.encode('utf-8'), salt, iterations)
+    return "$".join((
+        CODEWORD_SCHEME,
+        str(iterations),
+        base64.b64encode(salt).decode('ascii'),
+        base64.b64encode(key).decode('ascii'),
+    ))
 
 
 def verify_codeword(codeword: str, hashed: str) -> bool:
-    """Проверка кодового слова против хеша."""
+    """
+    Проверка кодового слова против хеша. Понимает и старые форматы:
+    несолёный SHA-256 (hex) и base64(соль 32 байта + PBKDF2 100k).
+    """
     try:
-        decoded = base64.b64decode(hashed.encode('utf-8'))
-        salt, stored_key = decoded[:32], decoded[32:]
-        new_key = hashlib.pbkdf2_hmac(
-            'sha256',
-            codeword.encode('utf-8'),
-            salt,
-            100_000
-        )
-        return new_key == stored_key
+        if hashed.startswith(CODEWORD_SCHEME + "$"):
+            _, iterations, salt, stored_key = hashed.split("$")
+            salt, stored_key, iterations = base64.b64decode(salt), base64.b64decode(stored_key), int(iterations)
+        elif _is_legacy_sha256(hashed):
+            candidate = hashlib.sha256(codeword.encode()).hexdigest()
+            return hmac.compare_digest(candidate, hashed.lower())
+        else:
+            decoded = base64.b64decode(hashed.encode('utf-8'))
+            salt, stored_key, iterations = decoded[:32], decoded[32:], 100_000
+
+        new_key = hashlib.pbkdf2_hmac('sha256', codeword.encode('utf-8'), salt, iterations)
+        return hmac.compare_digest(new_key, stored_key)
     except Exception:
         return False
 
 
+def codeword_needs_rehash(hashed: str, iterations: int = CODEWORD_ITERATIONS) -> bool:
+    """Хеш в старом формате или с меньшим числом итераций — пересчитать при входе"""
+    if not hashed or not hashed.startswith(CODEWORD_SCHEME + "$"):
+        return True
+    try:
+        return int(hashed.split("$")[1]) < iterations
+    except (IndexError, ValueError):
+        return True
+
+
+def _is_legacy_sha256(hashed: str) -> bool:
+    return len(hashed) == 64 and all(c in "0123456789abcdefABCDEF" for c in hashed)
+
+
 def generate_shared_secret() -> str:
     """Генерация общего секрета для E2E-шифрования между клиентами."""
     return base64.urlsafe_b64encode(os.urandom(32)).decode()
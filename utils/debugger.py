@@ -59,10 +59,15 @@ def init_socket_debugger(socketio):
 
 # === ЛОГИРОВАНИЕ SQLAlchemy ===
 def init_db_debugger(app):
-    """Включает подробный SQL-лог"""
-    logging.getLogger('sqlalchemy.engine').setLevel(logging.INFO)
-    logging.getLogger('sqlalchemy.engine').addHandler(console)
-    logger.info("🧩 SQLAlchemy query logging enabled")
+    """
+    Включает подробный SQL-лог: каждый запрос — JSON-строка лога chat.sql с временем,
+    запросом/событием и местом вызова (services/query_budget.py, порог SLOW_QUERY_MS = 0)
+    вместо сплошного дампа sqlalchemy.engine
+    """
+    from services.query_budget import query_budget
+    query_budget.slow_seconds = 0.0
+    logging.getLogger('chat.sql').addHandler(console)
+    logger.info("🧩 SQL query logging enabled (chat.sql)")
 
 
 # === ГЛАВНАЯ ТОЧКА ИНИЦИАЛИЗАЦИИ ===
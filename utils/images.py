@@ -0,0 +1,44 @@
+"""
+images.py — превью изображений (выполняется в процессах пула services/thumbnails.py).
+Модуль не зависит от Flask, чтобы дочерние процессы импортировали только Pillow.
+"""
+
+import os
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow необязателен — без него превью не создаются
+    Image = ImageOps = None
+
+# Теги EXIF-ориентации, при которых изображение повёрнуто на 90°
+_ROTATED_ORIENTATIONS = {5, 6, 7, 8}
+_EXIF_ORIENTATION = 0x0112
+
+
+def make_thumbnail(source, target, max_size, quality=75):
+    """
+    Пишет в target превью source в WebP, вписанное в квадрат max_size.
+    Возвращает (ширина, высота) оригинала с учётом EXIF-поворота и (ширина, высота) превью.
+    """
+    with Image.open(source) as image:
+        width, height = image.size
+        if image.getexif().get(_EXIF_ORIENTATION) in _ROTATED_ORIENTATIONS:
+            width, height = height, width
+
+        # JPEG декодируется сразу в уменьшенном масштабе (1/2…1/8) — в разы быстрее
+        image.draft("RGB", (max_size, max_size))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.mode or "transparency" in image.info else "RGB")
+        image.thumbnail((max_size, max_size), Image.LANCZOS, reducing_gap=3.0)
+
+        # Запись во временный файл и переименование: читатели не увидят недописанное превью
+        partial = f"{target}.{os.getpid()}.tmp"
+        try:
+            image.save(partial, "WEBP", quality=quality, method=4)
+            os.replace(partial, target)
+        except Exception:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        return (width, height), image.size
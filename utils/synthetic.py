@@ -0,0 +1,149 @@
+"""
+synthetic.py — детерминированный генератор данных чата для нагрузочных тестов.
+Строки — словари колонок таблиц users, groups, user_groups и messages с явными id,
+чтобы их можно было грузить пакетами мимо ORM (services/bulk_loader.py).
+Распределения близки к живому чату:
+  * популярность групп — степенной закон: несколько «горячих» групп собирают большую
+    часть участников и сообщений;
+  * число групп у пользователя — распределение Парето (большинство в 1–3 группах);
+  * авторы — тоже степенной закон: в каждой группе пишут в основном самые активные
+    участники (с меньшими id), остальные — изредка.
+Одинаковый seed даёт одинаковые данные. UUID строк зависят от seed, таблицы и id строки,
+поэтому повторный запуск с first_ids после уже загруженных строк не повторяет их uuid.
+"""
+
+import bisect
+import random
+import uuid
+from datetime import datetime, timedelta
+
+_WORDS = (
+    "привет как дела сегодня завтра вечером встреча проект релиз сервер база данных "
+    "ошибка исправил проверь посмотри ссылка файл фото готово спасибо отлично хорошо "
+    "давай потом сейчас минут часов deploy review merge build test docker redis chat "
+    "message group user latency cache index query ok да нет может быть конечно"
+).split()
+
+
+_UUID_NAMESPACE = uuid.UUID("8f1c2a6e-3b1d-5e8a-9c4f-2d7b6a0e1f35")
+
+
+def uuid_for(seed, table, row_id):
+    """UUID5 от (seed, таблица, id): воспроизводимо и уникально для каждого id строки"""
+    return str(uuid.uuid5(_UUID_NAMESPACE, f"{seed}:{table}:{row_id}"))
+
+
+class SyntheticChat:
+    """Генерирует пользователей, группы, участие и сообщения с реалистичным перекосом."""
+
+    def __init__(self, users, groups, messages, seed=42, codeword_hash="",
+                 first_ids=None, start=None, days=365,
+                 group_skew=1.1, author_skew=2.5, private_share=0.1):
+        self.users = users
+        self.groups = groups
+        self.messages = messages
+        self.seed = seed
+        self.codeword_hash = codeword_hash
+        # Первые id каждой таблицы — чтобы дописывать данные в непустую БД
+        first_ids = first_ids or {}
+        self.first_user = first_ids.get("users", 1)
+        self.first_group = first_ids.get("groups", 1)
+        self.first_message = first_ids.get("messages", 1)
+        self.start = start or datetime(2024, 1, 1)
+        self.days = days
+        self.group_skew = group_skew
+        self.author_skew = author_skew
+        self.private_share = private_share
+
+        # Веса групп ~ 1 / rank^skew; «горячие» группы разбросаны по id
+        rng = self._rng("groups")
+        ranks = list(range(groups))
+        rng.shuffle(ranks)
+        self._group_weights = [1.0 / (rank + 1) ** group_skew for rank in ranks]
+        self._group_cum = []
+        total = 0.0
+        for weight in self._group_weights:
+            total += weight
+            self._group_cum.append(total)
+        self._members = None
+
+    def _rng(self, stream):
+        """Отдельный генератор на каждую таблицу: таблицы можно создавать независимо"""
+        return random.Random(f"{self.seed}:{stream}")
+
+    def _pick_groups(self, rng, count):
+        total = self._group_cum[-1]
+        return [bisect.bisect_left(self._group_cum, rng.random() * total) for _ in range(count)]
+
+    # --- Таблицы ---
+    def user_rows(self):
+        rng = self._rng("users")
+        for n in range(self.users):
+            user_id = self.first_user + n
+            created = self.start + timedelta(seconds=rng.random() * self.days * 86400)
+            yield {
+                "id": user_id, "uuid": uuid_for(self.seed, "users", user_id), "username": f"user{user_id}",
+                "codeword_hash": self.codeword_hash, "created_at": created, "last_seen": created,
+                "is_online": False,
+            }
+
+    def members(self):
+        """group index → отсортированный список id участников (считается один раз)"""
+        if self._members is None:
+            rng = self._rng("members")
+            members = [set() for _ in range(self.groups)]
+            for n in range(self.users):
+                joined = min(self.groups, int(rng.paretovariate(1.2)))
+                for index in self._pick_groups(rng, joined):
+                    members[index].add(self.first_user + n)
+            # В пустой группе остаётся хотя бы её создатель
+            for index, ids in enumerate(members):
+                if not ids:
+                    ids.add(self.first_user + rng.randrange(self.users))
+            self._members = [sorted(ids) for ids in members]
+        return self._members
+
+    def group_rows(self):
+        rng = self._rng("group-rows")
+        for index, ids in enumerate(self.members()):
+            group_id = self.first_group + index
+            yield {
+                "id": group_id, "uuid": uuid_for(self.seed, "groups", group_id), "name": f"group-{group_id}",
+                "description": None, "created_at": self.start, "created_by": ids[0],
+                "is_private": rng.random() < self.private_share, "member_count": len(ids),
+            }
+
+    def membership_rows(self):
+        for index, ids in enumerate(self.members()):
+            for user_id in ids:
+                yield {"user_id": user_id, "group_id": self.first_group + index, "joined_at": self.start}
+
+    def message_rows(self):
+        rng = self._rng("messages")
+        members = self.members()
+        step = self.days * 86400 / max(1, self.messages)
+        batch = 10_000
+        for offset in range(0, self.messages, batch):
+            count = min(batch, self.messages - offset)
+            for n, index in enumerate(self._pick_groups(rng, count), offset):
+                ids = members[index]
+                # Степенной закон внутри группы: участники с меньшими id пишут чаще
+                author = ids[int(len(ids) * rng.random() ** self.author_skew)]
+                created = self.start + timedelta(seconds=n * step)
+                message_id = self.first_message + n
+                yield {
+                    "id": message_id, "uuid": uuid_for(self.seed, "messages", message_id),
+                    "content": " ".join(rng.choices(_WORDS, k=rng.randint(2, 16))),
+                    "is_encrypted": False, "message_type": "text",
+                    "created_at": created, "updated_at": created,
+                    "user_id": author, "group_id": self.first_group + index,
+                }
+
+    def tables(self):
+        """(имя таблицы, строки) в порядке внешних ключей"""
+        return [
+            ("users", self.user_rows()),
+            ("groups", self.group_rows()),
+            ("user_groups", self.membership_rows()),
+            ("messages", self.message_rows()),
+        ]